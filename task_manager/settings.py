@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+from decouple import Csv, config
 from django.contrib.messages import constants as messages
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -66,6 +66,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'tasks.context_processors.notifications',
+                'tasks.context_processors.live_updates',
             ],
         },
     },
@@ -82,6 +84,95 @@ DATABASES = {
     }
 }
 
+# Cache
+# Local-memory cache by default; point this at a shared backend (Redis,
+# Memcached) when running several worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'task-manager',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Dashboard statistics cache: entries are invalidated on writes, the timeout
+# bounds staleness of time-based buckets (overdue, due this week)
+DASHBOARD_STATS_CACHE_TIMEOUT = config('DASHBOARD_STATS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Reports dashboard/export aggregates are cached per filter set (seconds)
+REPORT_CACHE_TIMEOUT = config('REPORT_CACHE_TIMEOUT', default=300, cast=int)
+
+# Project critical-path forecasts: effort assumed for tasks without an
+# estimate, working hours per day, and how long a schedule stays cached
+SCHEDULE_DEFAULT_TASK_HOURS = config('SCHEDULE_DEFAULT_TASK_HOURS', default=8, cast=float)
+SCHEDULE_HOURS_PER_DAY = config('SCHEDULE_HOURS_PER_DAY', default=8, cast=float)
+SCHEDULE_CACHE_TIMEOUT = config('SCHEDULE_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Maintain the TaskDependencyPath closure table so transitive dependency
+# lookups are single indexed queries; run `manage.py rebuild_dependency_paths`
+# after switching this on for an existing database
+DEPENDENCY_CLOSURE_TABLE = config('DEPENDENCY_CLOSURE_TABLE', default=True, cast=bool)
+
+# TaskHistory/ActivityLog rows older than this (rounded down to whole months)
+# are moved to gzipped JSONL files under MEDIA_ROOT by `manage.py archive_logs`
+ARCHIVE_RETENTION_DAYS = config('ARCHIVE_RETENTION_DAYS', default=180, cast=int)
+
+# ActivityLog events are queued in-process and written in batches by a
+# background thread; when the queue is full, events wait up to the enqueue
+# timeout (seconds) and are then dropped. ACTIVITY_LOG_ASYNC=False writes inline.
+ACTIVITY_LOG_ASYNC = config('ACTIVITY_LOG_ASYNC', default=True, cast=bool)
+ACTIVITY_LOG_QUEUE_SIZE = config('ACTIVITY_LOG_QUEUE_SIZE', default=10000, cast=int)
+ACTIVITY_LOG_BATCH_SIZE = config('ACTIVITY_LOG_BATCH_SIZE', default=200, cast=int)
+ACTIVITY_LOG_FLUSH_INTERVAL = config('ACTIVITY_LOG_FLUSH_INTERVAL', default=1.0, cast=float)
+ACTIVITY_LOG_ENQUEUE_TIMEOUT = config('ACTIVITY_LOG_ENQUEUE_TIMEOUT', default=0.0, cast=float)
+
+# Notifications: repeats of the same event for a user within the window are
+# skipped; users with at least this many pending notifications get a digest
+NOTIFICATION_COALESCE_MINUTES = config('NOTIFICATION_COALESCE_MINUTES', default=10, cast=int)
+NOTIFICATION_DIGEST_MIN_COUNT = config('NOTIFICATION_DIGEST_MIN_COUNT', default=5, cast=int)
+# Cached unread counters are kept up to date on writes; the timeout bounds drift
+NOTIFICATION_UNREAD_CACHE_TIMEOUT = config('NOTIFICATION_UNREAD_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Deadline reminders: hours before the due date at which assignees are
+# reminded (comma separated), and the span of each indexed sweep window
+DEADLINE_REMINDER_HOURS = config('DEADLINE_REMINDER_HOURS', default='24', cast=Csv(int))
+DEADLINE_REMINDER_WINDOW_MINUTES = config('DEADLINE_REMINDER_WINDOW_MINUTES', default=60, cast=int)
+
+# Live updates (server-sent events, /events/): pages only open the stream when
+# LIVE_UPDATES is on, which needs the site served through asgi.py by a single
+# process. Keep-alive comment interval, events kept for reconnecting browsers,
+# and events buffered per connection
+LIVE_UPDATES = config('LIVE_UPDATES', default=False, cast=bool)
+EVENT_STREAM_KEEPALIVE_SECONDS = config('EVENT_STREAM_KEEPALIVE_SECONDS', default=15, cast=int)
+EVENT_STREAM_HISTORY_SIZE = config('EVENT_STREAM_HISTORY_SIZE', default=500, cast=int)
+EVENT_STREAM_QUEUE_SIZE = config('EVENT_STREAM_QUEUE_SIZE', default=100, cast=int)
+
+# Route the dashboard, task/project lists and division admin lookup to the
+# async views (tasks/async_views.py) when served through asgi.py. Their queries
+# still run one at a time, so expect no throughput gain over the sync views
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Use keyset (cursor) pagination on the task and user lists instead of page
+# numbers; either way a "?cursor=" query parameter switches a request over
+CURSOR_PAGINATION = config('CURSOR_PAGINATION', default=False, cast=bool)
+
+# Text search configuration used for the PostgreSQL full-text index
+SEARCH_CONFIG = config('SEARCH_CONFIG', default='english')
+
+# Rows fetched per database round trip by the streaming Excel export
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Generate PDF/Excel reports with the export worker (`manage.py run_export_worker`)
+# instead of inside the request; only turn this on where the worker runs, or
+# exports stay queued. Result files are deleted after the TTL
+EXPORT_BACKGROUND_JOBS = config('EXPORT_BACKGROUND_JOBS', default=False, cast=bool)
+EXPORT_JOB_TTL_HOURS = config('EXPORT_JOB_TTL_HOURS', default=24, cast=int)
+# The worker refreshes a running job's heartbeat every EXPORT_JOB_HEARTBEAT_SECONDS;
+# jobs whose heartbeat is older than EXPORT_JOB_STALE_MINUTES were left behind
+# by a crashed worker and are queued again
+EXPORT_JOB_HEARTBEAT_SECONDS = config('EXPORT_JOB_HEARTBEAT_SECONDS', default=30, cast=int)
+EXPORT_JOB_STALE_MINUTES = config('EXPORT_JOB_STALE_MINUTES', default=5, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -189,7 +280,7 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 # Email Configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', cast=int, default=587)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', cast=bool, default=True)
@@ -197,6 +288,12 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Email outbox: messages sent per SMTP connection by `manage.py send_emails`,
+# and retries (the delay doubles after every failed attempt, in seconds)
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=100, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', default=60, cast=int)
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -0,0 +1,190 @@
+"""
+Asynchronous ActivityLog ingestion.
+
+Views call ``log_activity()``, which only builds an unsaved ``ActivityLog``
+and puts it on a bounded in-process queue. A daemon thread drains the queue
+and writes rows with ``bulk_create`` in batches of ``ACTIVITY_LOG_BATCH_SIZE``
+(or every ``ACTIVITY_LOG_FLUSH_INTERVAL`` seconds), so requests never wait on
+the INSERT or on SQLite's write lock. (``timestamp`` is set when the row is
+written, normally within a flush interval of the event.)
+
+When the queue is full, ``log_activity`` waits up to
+``ACTIVITY_LOG_ENQUEUE_TIMEOUT`` seconds for room and then drops the event;
+drops, write failures and throughput are exposed by ``get_activity_stats()``.
+Pending events are flushed when the process exits. Set
+``ACTIVITY_LOG_ASYNC=False`` to write each event inline instead.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .history import get_client_ip
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogBuffer:
+    """Bounded queue of ActivityLog rows written by a background thread"""
+
+    def __init__(self, max_size=10000, batch_size=200, flush_interval=1.0, enqueue_timeout=0.0):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.counters = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, pending=self.queue.qsize())
+
+    def put(self, entry):
+        """Queue an unsaved ActivityLog; returns False if it had to be dropped"""
+        self._ensure_thread()
+        try:
+            if self.enqueue_timeout > 0:
+                self.queue.put(entry, timeout=self.enqueue_timeout)
+            else:
+                self.queue.put_nowait(entry)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self._thread.start()
+
+    def _take_batch(self, block):
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=self.flush_interval) if block else self.queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        close_old_connections()
+        try:
+            ActivityLog.objects.bulk_create(batch, batch_size=self.batch_size)
+            self._count('written', len(batch))
+        except Exception as e:
+            self._count('failed', len(batch))
+            logger.error(f"Activity log write failed for {len(batch)} event(s): {str(e)}")
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                self._write(self._take_batch(block=True))
+            self.drain()
+        finally:
+            connections.close_all()
+
+    def drain(self):
+        """Write everything currently queued from the calling thread"""
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the writer thread after it flushed the queue"""
+        thread = self._thread
+        self._stopping.set()
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self._thread = None
+        # Anything queued after the thread stopped (or if it never started)
+        self.drain()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_activity_buffer():
+    """Get the process-wide activity buffer, creating it from settings on first use"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ActivityLogBuffer(
+                    max_size=settings.ACTIVITY_LOG_QUEUE_SIZE,
+                    batch_size=settings.ACTIVITY_LOG_BATCH_SIZE,
+                    flush_interval=settings.ACTIVITY_LOG_FLUSH_INTERVAL,
+                    enqueue_timeout=settings.ACTIVITY_LOG_ENQUEUE_TIMEOUT,
+                )
+                atexit.register(_buffer.shutdown)
+    return _buffer
+
+
+def get_activity_stats():
+    """Counters of the activity pipeline: queued, written, dropped, failed and pending"""
+    return get_activity_buffer().stats()
+
+
+def flush_activity_log(timeout=5.0):
+    """Write every pending event now and stop the writer thread"""
+    if _buffer is not None:
+        _buffer.shutdown(timeout)
+
+
+def log_activity(request, action, obj=None, description='', object_type=None, object_id=None,
+                 object_name=None, extra_data=None, user=None):
+    """
+    Record an ActivityLog event for a request without waiting for the INSERT.
+
+    The object fields default to the given model instance (``obj``); the
+    user defaults to the request user. Returns False if the event was dropped.
+    """
+    user = user or getattr(request, 'user', None)
+    if obj is not None:
+        object_type = object_type or obj._meta.model_name
+        object_id = object_id if object_id is not None else obj.pk
+        object_name = object_name if object_name is not None else str(obj)
+    session = getattr(request, 'session', None)
+
+    entry = ActivityLog(
+        user=user if user is not None and user.is_authenticated else None,
+        action=action,
+        description=description,
+        object_type=object_type or '',
+        object_id=object_id or 0,
+        object_name=(object_name or '')[:255],
+        ip_address=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        session_key=session.session_key if session is not None else None,
+        extra_data=extra_data or {},
+    )
+
+    if not settings.ACTIVITY_LOG_ASYNC:
+        try:
+            entry.save()
+        except Exception as e:
+            logger.error(f"Activity log write failed: {str(e)}")
+            return False
+        return True
+    return get_activity_buffer().put(entry)
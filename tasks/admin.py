@@ -1,7 +1,16 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.utils.html import format_html
-from .models import User, Division, Task, Comment, TaskAttachment, TaskHistory, Project, ProjectFile
+from django.utils.html import format_html, format_html_join
+from .models import (
+    User, Division, Task, Comment, TaskAttachment, TaskHistory, Project, ProjectFile, ExportJob, ArchiveSegment,
+    OutboundEmail, Notification, ActivityLog, resolve_related_objects,
+)
+from .archive import get_records
+from .dependencies import propagate_blocked_status
+from .history import HistoryRecorder
+from .scheduling import invalidate_project_schedules
+from .stats import invalidate_dashboard_stats
 
 
 @admin.register(Division)
@@ -44,12 +53,6 @@ class TaskAttachmentInline(admin.TabularInline):
     readonly_fields = ['uploaded_at', 'file_size']
 
 
-class TaskHistoryInline(admin.TabularInline):
-    model = TaskHistory
-    extra = 0
-    readonly_fields = ['timestamp']
-
-
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     # FIXED: Removed 'assigned_to' from list_display and added custom method
@@ -78,14 +81,17 @@ class TaskAdmin(admin.ModelAdmin):
         ('Time Tracking', {
             'fields': ('estimated_hours', 'actual_hours')
         }),
+        ('History', {
+            'fields': ('history_display',)
+        }),
     )
     
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'history_display']
     
     # ADDED: Better widget for many-to-many field
     filter_horizontal = ['assigned_to']
     
-    inlines = [CommentInline, TaskAttachmentInline, TaskHistoryInline]
+    inlines = [CommentInline, TaskAttachmentInline]
     
     # ADDED: Custom method to display multiple assignees
     def get_assignees_display(self, obj):
@@ -114,21 +120,63 @@ class TaskAdmin(admin.ModelAdmin):
         return format_html('<span style="color: green;">✓ No</span>')
     is_overdue_display.short_description = 'Overdue'
     
+    def history_display(self, obj):
+        """Latest history entries, including ones moved to the archive"""
+        if obj.pk is None:
+            return '-'
+        records = get_records('task_history', {'task_id': obj.pk}, since=obj.created_at, limit=20)
+        if not records:
+            return '-'
+        return format_html(
+            '<table><tbody>{}</tbody></table>',
+            format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>', (
+                (
+                    record.timestamp.strftime('%Y-%m-%d %H:%M'),
+                    # Archived rows can outlive their user
+                    getattr(record, 'user', None) or '',
+                    record.action,
+                    record.new_value or '',
+                    '(archived)' if getattr(record, 'is_archived', False) else '',
+                )
+                for record in records
+            ))
+        )
+    history_display.short_description = 'Latest history'
+    
     # ADDED: Custom actions for bulk operations
     actions = ['mark_as_completed', 'mark_as_in_progress', 'mark_as_pending']
     
+    def _bulk_update_status(self, request, queryset, status):
+        """Update status in bulk, re-block or unblock dependents and resync the rollups, schedules and cached stats it affects"""
+        task_ids = list(queryset.values_list('pk', flat=True))
+        project_ids = set(queryset.exclude(project__isnull=True).values_list('project_id', flat=True))
+        division_ids = set(queryset.values_list('division_id', flat=True))
+        # queryset.update() sends no signals, so the project schedules and the
+        # dashboard stats of the assignees, their divisions and super admins
+        # are invalidated here
+        user_ids = set(Task.assigned_to.through.objects.filter(
+            task_id__in=queryset.values('pk')
+        ).values_list('user_id', flat=True))
+        with HistoryRecorder.for_request(request) as history:
+            updated = queryset.update(status=status)
+            propagate_blocked_status(task_ids, history, include_tasks=True)
+            Project.sync_task_rollups(project_ids=project_ids)
+            invalidate_project_schedules(project_ids)
+            invalidate_dashboard_stats(user_ids=user_ids, division_ids=division_ids)
+        return updated
+    
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(status='completed')
+        updated = self._bulk_update_status(request, queryset, 'completed')
         self.message_user(request, f'{updated} task(s) marked as completed.')
     mark_as_completed.short_description = "Mark selected tasks as completed"
     
     def mark_as_in_progress(self, request, queryset):
-        updated = queryset.update(status='in_progress')
+        updated = self._bulk_update_status(request, queryset, 'in_progress')
         self.message_user(request, f'{updated} task(s) marked as in progress.')
     mark_as_in_progress.short_description = "Mark selected tasks as in progress"
     
     def mark_as_pending(self, request, queryset):
-        updated = queryset.update(status='pending')
+        updated = self._bulk_update_status(request, queryset, 'pending')
         self.message_user(request, f'{updated} task(s) marked as pending.')
     mark_as_pending.short_description = "Mark selected tasks as pending"
 
@@ -216,6 +264,74 @@ class ProjectFileAdmin(admin.ModelAdmin):
     file_size_display.short_description = 'File Size'
 
 
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'export_format', 'requested_by', 'status', 'row_count', 'created_at', 'expires_at']
+    list_filter = ['export_format', 'status', 'created_at']
+    search_fields = ['requested_by__username']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'started_at', 'heartbeat_at', 'completed_at', 'expires_at', 'row_count', 'error']
+
+
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'month', 'row_count', 'first_timestamp', 'last_timestamp', 'created_at']
+    list_filter = ['kind']
+    ordering = ['-month']
+    readonly_fields = ['kind', 'month', 'file', 'row_count', 'first_timestamp', 'last_timestamp', 'created_at']
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['to_email', 'subject']
+    ordering = ['-created_at']
+    readonly_fields = ['notification', 'attempts', 'last_attempt_at', 'last_error', 'created_at', 'sent_at']
+
+
+class RelatedObjectChangeList(ChangeList):
+    """Changelist that resolves the related objects of a page in one query per type"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = resolve_related_objects(self.result_list)
+
+
+def related_object_display(obj):
+    """The object a notification or activity log points at, or '-' once deleted"""
+    related = obj.get_related_object()
+    return str(related) if related is not None else '-'
+related_object_display.short_description = 'Related Object'
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['title', 'recipient', 'notification_type', related_object_display, 'is_read', 'is_sent', 'created_at']
+    list_filter = ['notification_type', 'is_read', 'is_sent', 'created_at']
+    search_fields = ['title', 'recipient__username']
+    ordering = ['-created_at']
+    list_select_related = ['recipient']
+    readonly_fields = ['created_at', 'read_at']
+
+    def get_changelist(self, request, **kwargs):
+        return RelatedObjectChangeList
+
+
+@admin.register(ActivityLog)
+class ActivityLogAdmin(admin.ModelAdmin):
+    list_display = ['timestamp', 'user', 'action', 'object_type', related_object_display, 'ip_address']
+    list_filter = ['action', 'object_type', 'timestamp']
+    search_fields = ['object_name', 'description', 'user__username']
+    ordering = ['-timestamp']
+    list_select_related = ['user']
+    readonly_fields = ['timestamp']
+
+    def get_changelist(self, request, **kwargs):
+        return RelatedObjectChangeList
+
+
 # Custom admin site configuration
 admin.site.site_header = "Task Manager Administration"
 admin.site.site_title = "Task Manager Admin"
@@ -0,0 +1,231 @@
+"""
+Monthly archival for the append-only TaskHistory and ActivityLog tables.
+
+Whole months older than ``ARCHIVE_RETENTION_DAYS`` are written to gzipped
+JSONL files under ``MEDIA_ROOT/archive/`` (one ``ArchiveSegment`` per month
+and run) and deleted from the hot table, so it stays small however long the
+site runs.
+
+``get_records`` reads both: the hot table first, then archive segments from
+newest to oldest, stopping as soon as ``limit`` records were found. Archived
+rows come back as unsaved model instances with ``is_archived = True``. The task
+page, the task admin and ``Project.get_recent_activity`` read history through
+it, so archived months still show up there.
+"""
+
+import gzip
+import io
+import itertools
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityLog, ArchiveSegment, TaskHistory
+
+
+ARCHIVE_MODELS = {
+    'task_history': TaskHistory,
+    'activity_log': ActivityLog,
+}
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """Keep full microsecond precision (DjangoJSONEncoder rounds to milliseconds)"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def get_archive_cutoff(retention_days=None, now=None):
+    """Start of the month holding the retention boundary; older rows get archived"""
+    if retention_days is None:
+        retention_days = settings.ARCHIVE_RETENTION_DAYS
+    boundary = timezone.localtime(now or timezone.now()) - timedelta(days=retention_days)
+    return boundary.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month_start):
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+def _datetime_fields(model):
+    return [field.attname for field in model._meta.concrete_fields if isinstance(field, models.DateTimeField)]
+
+
+# ----------------------------
+# Writing
+# ----------------------------
+
+def archive_month(kind, month_start, chunk_size=2000):
+    """
+    Move one month of rows into a new archive segment.
+
+    The file is written before anything is deleted, and only rows that made
+    it into the file are removed. Returns the segment, or None if the month
+    had no rows.
+    """
+    model = ARCHIVE_MODELS[kind]
+    month_end = _next_month(month_start)
+    fields = [field.attname for field in model._meta.concrete_fields]
+    rows = model.objects.filter(
+        timestamp__gte=month_start, timestamp__lt=month_end
+    ).order_by('pk').values(*fields)
+
+    row_count, max_pk = 0, None
+    first_timestamp = last_timestamp = None
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+            writer = io.TextIOWrapper(gz, encoding='utf-8')
+            for row in rows.iterator(chunk_size=chunk_size):
+                writer.write(json.dumps(row, cls=ArchiveJSONEncoder) + '\n')
+                row_count += 1
+                max_pk = row['id']
+                first_timestamp = min(first_timestamp or row['timestamp'], row['timestamp'])
+                last_timestamp = max(last_timestamp or row['timestamp'], row['timestamp'])
+            writer.flush()
+            writer.detach()
+
+        if not row_count:
+            return None
+
+        tmp.seek(0)
+        segment = ArchiveSegment(
+            kind=kind,
+            month=month_start.date(),
+            row_count=row_count,
+            first_timestamp=first_timestamp,
+            last_timestamp=last_timestamp,
+        )
+        segment.file.save(f'{kind}/{month_start:%Y-%m}.jsonl.gz', File(tmp), save=False)
+
+    with transaction.atomic():
+        segment.save()
+        model.objects.filter(
+            timestamp__gte=month_start, timestamp__lt=month_end, pk__lte=max_pk
+        ).delete()
+    return segment
+
+
+def get_archivable_months(kind, cutoff):
+    """Month starts (aware datetimes) that still have hot rows before the cutoff"""
+    model = ARCHIVE_MODELS[kind]
+    return list(model.objects.filter(timestamp__lt=cutoff).datetimes('timestamp', 'month'))
+
+
+def archive_logs(kinds=None, retention_days=None, chunk_size=2000, dry_run=False):
+    """Archive every whole month before the retention cutoff; returns {kind: rows archived}"""
+    cutoff = get_archive_cutoff(retention_days)
+    counts = {}
+    for kind in kinds or ARCHIVE_MODELS:
+        if dry_run:
+            counts[kind] = ARCHIVE_MODELS[kind].objects.filter(timestamp__lt=cutoff).count()
+            continue
+        counts[kind] = 0
+        for month_start in get_archivable_months(kind, cutoff):
+            segment = archive_month(kind, month_start, chunk_size=chunk_size)
+            if segment:
+                counts[kind] += segment.row_count
+    return counts
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+
+def read_segment(segment):
+    """Iterate over the raw row dicts of an archive segment"""
+    with segment.file.open('rb') as f, gzip.open(f, 'rt', encoding='utf-8') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def _matches(row, filters):
+    for lookup, value in filters.items():
+        if lookup.endswith('__in'):
+            if row.get(lookup[:-4]) not in value:
+                return False
+        elif row.get(lookup) != value:
+            return False
+    return True
+
+
+def _build_instance(model, row, datetime_fields):
+    for attname in datetime_fields:
+        if row.get(attname):
+            row[attname] = parse_datetime(row[attname])
+    instance = model(**row)
+    instance._state.adding = False
+    instance.is_archived = True
+    return instance
+
+
+def _attach_related(model, instances):
+    """Load foreign keys of archived instances in one query per relation"""
+    for field in model._meta.concrete_fields:
+        if not field.is_relation:
+            continue
+        ids = {getattr(instance, field.attname) for instance in instances} - {None}
+        related = field.related_model.objects.in_bulk(ids)
+        for instance in instances:
+            obj = related.get(getattr(instance, field.attname))
+            if obj is not None:
+                setattr(instance, field.name, obj)
+
+
+def get_records(kind, filters=None, since=None, until=None, limit=None):
+    """
+    Get TaskHistory/ActivityLog records from the hot table and the archive, newest first.
+
+    ``filters`` holds exact or ``__in`` lookups on concrete columns (e.g.
+    ``{'task_id': 5}`` or ``{'object_type': 'task', 'object_id__in': ids}``)
+    so it can be applied to archived rows as well.
+    """
+    model = ARCHIVE_MODELS[kind]
+    filters = dict(filters or {})
+
+    hot = model.objects.filter(**filters).select_related(
+        *[field.name for field in model._meta.concrete_fields if field.is_relation]
+    ).order_by('-timestamp', '-pk')
+    if since:
+        hot = hot.filter(timestamp__gte=since)
+    if until:
+        hot = hot.filter(timestamp__lt=until)
+    records = list(hot[:limit] if limit else hot)
+    if limit and len(records) >= limit:
+        return records
+
+    segments = ArchiveSegment.objects.filter(kind=kind)
+    if since:
+        segments = segments.filter(last_timestamp__gte=since)
+    if until:
+        segments = segments.filter(first_timestamp__lt=until)
+
+    datetime_fields = _datetime_fields(model)
+    # Several runs can archive the same month, so merge them before sorting
+    for month, month_segments in itertools.groupby(segments.order_by('-month'), key=lambda segment: segment.month):
+        archived = []
+        for segment in month_segments:
+            for row in read_segment(segment):
+                if not _matches(row, filters):
+                    continue
+                instance = _build_instance(model, row, datetime_fields)
+                if (since and instance.timestamp < since) or (until and instance.timestamp >= until):
+                    continue
+                archived.append(instance)
+        archived.sort(key=lambda instance: (instance.timestamp, instance.pk), reverse=True)
+        if limit:
+            archived = archived[:limit - len(records)]
+        _attach_related(model, archived)
+        records.extend(archived)
+        if limit and len(records) >= limit:
+            break
+    return records
@@ -0,0 +1,250 @@
+"""
+Async versions of the read-heavy views, for serving the site under ASGI.
+
+Each view reads through Django's async ORM (``acount``, ``aget``, async
+iteration). This does not make queries run concurrently: Django runs every
+async ORM call through thread-sensitive ``sync_to_async``, so a request's
+queries still run one after another on a single thread, and gathering them
+gains nothing. The views therefore await their queries in turn. Templates are
+rendered through ``sync_to_async`` too, because context processors and lazy
+attributes such as ``request.user`` or form choices may query.
+
+The URLconf routes to these views when ``ASYNC_VIEWS`` is enabled. Otherwise
+it routes to their sync counterparts in ``views``, which return the same
+pages. ``manage.py benchmark_views`` compares the two; on SQLite the async
+views serve about as many requests per second as the sync ones, not more.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect, render
+
+from .forms import TaskFilterForm
+from .models import Project, Task, User, get_dashboard_stats
+from .pagination import CursorPaginator, use_cursor_pagination
+from .permissions import resolve_task_permissions
+from .search import search_projects, search_tasks
+
+logger = logging.getLogger(__name__)
+
+
+async def _alist(queryset):
+    """Evaluate a queryset (with its prefetches) without blocking the event loop"""
+    return [obj async for obj in queryset]
+
+
+async def _arender(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@login_required
+async def dashboard(request):
+    """Async version of views.dashboard"""
+    user = await request.auser()
+
+    try:
+        if user.is_super_admin():
+            all_tasks = Task.objects.all()
+            managed_projects = Project.objects.select_related('division')[:5]
+        elif user.is_admin():
+            if user.division_id:
+                all_tasks = Task.objects.filter(division_id=user.division_id)
+                managed_projects = Project.objects.filter(
+                    Q(assigned_to_admin=user) | Q(division_id=user.division_id)
+                ).select_related('division').distinct()[:5]
+            else:
+                all_tasks = Task.objects.none()
+                managed_projects = Project.objects.none()
+        else:
+            all_tasks = Task.objects.filter(assigned_to=user)
+            managed_projects = Project.objects.none()
+
+        recent_tasks = all_tasks.select_related('created_by', 'division', 'project').prefetch_related('assigned_to').order_by('-created_at')[:5]
+        my_tasks = Task.objects.filter(assigned_to=user).select_related('project').prefetch_related('assigned_to').order_by('-created_at')[:5]
+
+        # The statistics come from the per-user stats cache
+        task_stats = (await sync_to_async(get_dashboard_stats)(user))['tasks']
+        recent_tasks = await _alist(recent_tasks)
+        my_tasks = await _alist(my_tasks)
+        managed_projects = await _alist(managed_projects)
+
+        context = {
+            'total_tasks': task_stats['total'],
+            'pending_tasks': task_stats['pending'],
+            'in_progress_tasks': task_stats['in_progress'],
+            'completed_tasks': task_stats['completed'],
+            'overdue_tasks': task_stats['overdue'],
+            'recent_tasks': recent_tasks,
+            'my_tasks': my_tasks,
+            'managed_projects': managed_projects,
+        }
+        return await _arender(request, 'tasks/dashboard.html', context)
+
+    except Exception as e:
+        logger.error(f"Dashboard error for user {user}: {str(e)}")
+        messages.error(request, 'An error occurred loading the dashboard. Please contact support.')
+        return redirect('home')
+
+
+@login_required
+async def task_list(request):
+    """Async version of views.task_list"""
+    user = await request.auser()
+
+    try:
+        if user.is_admin():
+            if user.is_super_admin():
+                tasks = Task.objects.all()
+            else:
+                tasks = Task.objects.filter(division_id=user.division_id)
+        else:
+            tasks = Task.objects.filter(assigned_to=user)
+
+        project_id = request.GET.get("project")
+        project = None
+        if project_id:
+            tasks = tasks.filter(project__id=project_id)
+            try:
+                project = await Project.objects.aget(id=project_id)
+            except Project.DoesNotExist:
+                raise Http404("No Project matches the given query.")
+
+        # Validating the assignee choice queries, so the form runs in a thread
+        def build_filter_form():
+            form = TaskFilterForm(request.GET, user=user)
+            form.is_valid()
+            return form
+
+        filter_form = await sync_to_async(build_filter_form)()
+        if filter_form.is_valid():
+            if filter_form.cleaned_data['status']:
+                tasks = tasks.filter(status=filter_form.cleaned_data['status'])
+            if filter_form.cleaned_data['priority']:
+                tasks = tasks.filter(priority=filter_form.cleaned_data['priority'])
+            if filter_form.cleaned_data['assigned_to']:
+                tasks = tasks.filter(assigned_to=filter_form.cleaned_data['assigned_to'])
+            if filter_form.cleaned_data['date_from']:
+                tasks = tasks.filter(created_at__date__gte=filter_form.cleaned_data['date_from'])
+            if filter_form.cleaned_data['date_to']:
+                tasks = tasks.filter(created_at__date__lte=filter_form.cleaned_data['date_to'])
+
+        search_query = request.GET.get('search')
+        ordering = ['-created_at']
+        if search_query:
+            tasks = search_tasks(tasks, search_query)
+            ordering = ['-search_rank', '-created_at']
+
+        tasks = tasks.select_related('created_by', 'division', 'project').prefetch_related('assigned_to')
+
+        if use_cursor_pagination(request):
+            paginator = CursorPaginator(tasks, (*ordering, 'id'), 10, estimate_total=True)
+            page_obj = await sync_to_async(paginator.get_page)(request.GET.get('cursor'))
+        else:
+            # Paginator counts lazily and synchronously, so count first
+            paginator = Paginator(tasks.order_by(*ordering), 10)
+            paginator.count = await paginator.object_list.acount()
+            page_obj = paginator.get_page(request.GET.get('page'))
+            page_obj.object_list = await _alist(page_obj.object_list)
+
+        await sync_to_async(resolve_task_permissions)(page_obj, user)
+
+        context = {
+            'page_obj': page_obj,
+            'filter_form': filter_form,
+            'search_query': search_query,
+            'project': project,
+        }
+        return await _arender(request, 'tasks/task_list.html', context)
+
+    except Exception as e:
+        logger.error(f"Task list error for user {user}: {str(e)}")
+        messages.error(request, f'An error occurred loading tasks: {str(e)}')
+        return redirect('dashboard')
+
+
+@login_required
+async def project_list(request):
+    """Async version of views.project_list"""
+    user = await request.auser()
+
+    try:
+        if user.is_super_admin():
+            projects = Project.objects.all()
+        elif user.is_admin():
+            projects = Project.objects.filter(
+                Q(assigned_to_admin=user) | Q(division_id=user.division_id)
+            ).distinct()
+        else:
+            projects = Project.objects.filter(tasks__assigned_to=user).distinct()
+
+        search_query = request.GET.get("search")
+        if search_query:
+            projects = search_projects(projects, search_query).order_by('-search_rank', '-created_at')
+
+        projects = projects.select_related('division', 'assigned_to_admin')
+        if not user.is_super_admin():
+            my_tasks_count = Task.objects.filter(
+                project=OuterRef('pk'), assigned_to=user
+            ).order_by().values('project').annotate(count=Count('pk')).values('count')
+            projects = projects.annotate(my_tasks_count=Coalesce(Subquery(my_tasks_count), 0))
+
+        projects_list = await _alist(projects)
+        for project in projects_list:
+            project.total_tasks = project.task_count
+            project.completed_tasks = project.completed_task_count
+            project.my_tasks = getattr(project, 'my_tasks_count', 0)
+            project.progress = project.get_progress_percentage()
+
+        paginator = Paginator(projects_list, 12)
+        page_obj = paginator.get_page(request.GET.get("page"))
+
+        context = {
+            "page_obj": page_obj,
+            "search_query": search_query,
+            "user_role": user.role,
+        }
+        return await _arender(request, "tasks/project_list.html", context)
+
+    except Exception as e:
+        messages.error(request, f"Error loading projects: {str(e)}")
+        return redirect("dashboard")
+
+
+@login_required
+async def get_division_admins(request):
+    """Async version of views.get_division_admins"""
+    user = await request.auser()
+    if not user.is_super_admin():
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    division_id = request.GET.get('division_id')
+    if not division_id:
+        return JsonResponse({'admins': []})
+
+    try:
+        admins = User.objects.filter(
+            division_id=division_id,
+            role__in=['admin', 'super_admin'],
+            is_active=True
+        ).values('id', 'username', 'first_name', 'last_name')
+
+        admin_list = [
+            {
+                'id': admin['id'],
+                'name': f"{admin['first_name']} {admin['last_name']} ({admin['username']})"
+                       if admin['first_name'] and admin['last_name']
+                       else admin['username']
+            }
+            async for admin in admins.aiterator()
+        ]
+        return JsonResponse({'admins': admin_list})
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
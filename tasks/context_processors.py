@@ -0,0 +1,22 @@
+from functools import partial
+
+from django.conf import settings
+
+from .notifications import get_recent_notifications, get_unread_count
+
+
+def notifications(request):
+    """Expose the user's unread notification count (cached) and latest unread notifications"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {
+        'unread_notification_count': get_unread_count(user),
+        # A callable, so templates only query it when they render the list
+        'recent_notifications': partial(get_recent_notifications, user),
+    }
+
+
+def live_updates(request):
+    """Tell templates whether to open the live update stream (/events/)"""
+    return {'live_updates': settings.LIVE_UPDATES}
@@ -0,0 +1,445 @@
+"""
+Dependency graph engine for ``Task.depends_on``.
+
+Edges are stored by Django as rows of the ``depends_on`` through table, where
+``from_task`` depends on ``to_task``. ``DependencyGraph`` loads a whole edge
+set at once into adjacency sets and answers graph questions in memory:
+cycles, transitive blockers and dependents, topological order and which tasks
+are ready to start.
+
+For a single task in a large graph, the ``*_ids`` helpers and
+``DependencyGraph.for_task`` answer from the ``TaskDependencyPath`` closure
+table when ``DEPENDENCY_CLOSURE_TABLE`` is on, and otherwise follow the edges
+with a recursive CTE instead of loading the whole project.
+
+The closure table stores a path count per (ancestor, descendant, depth).
+Adding the edge X -> Y creates, for every ancestor A of Y and descendant D of
+X, count(A..Y) * count(X..D) new paths A..D; removing it subtracts the same
+amounts. Both stay exact because the graph is kept acyclic.
+"""
+
+import heapq
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .events import publish_status_changes
+from .models import Task, TaskDependencyPath
+from .stats import invalidate_dashboard_stats
+
+
+# Statuses a task can be "ready to start" from
+STARTABLE_STATUSES = ['pending', 'blocked']
+
+
+class DependencyCycleError(ValidationError):
+    """Raised when a dependency would make a task (transitively) depend on itself"""
+
+    def __init__(self, cycle):
+        self.cycle = list(cycle)
+        path = ' -> '.join(f'#{task_id}' for task_id in self.cycle)
+        super().__init__(f'Task dependencies cannot form a cycle ({path}).', code='dependency_cycle')
+
+
+def _edge_table():
+    through = Task.depends_on.through
+    return (
+        through._meta.db_table,
+        through._meta.get_field('from_task').column,
+        through._meta.get_field('to_task').column,
+    )
+
+
+def closure_enabled():
+    """Check if the TaskDependencyPath closure table is maintained and used"""
+    return settings.DEPENDENCY_CLOSURE_TABLE
+
+
+def _closure_ids(task_ids, upstream):
+    """Follow dependency edges from task_ids (excluding the start ids)"""
+    task_ids = [int(task_id) for task_id in set(task_ids)]
+    if not task_ids:
+        return set()
+
+    if closure_enabled():
+        if upstream:
+            paths = TaskDependencyPath.objects.filter(descendant_id__in=task_ids).values_list('ancestor_id', flat=True)
+        else:
+            paths = TaskDependencyPath.objects.filter(ancestor_id__in=task_ids).values_list('descendant_id', flat=True)
+        return set(paths.distinct())
+
+    table, from_column, to_column = _edge_table()
+    source, target = (from_column, to_column) if upstream else (to_column, from_column)
+    placeholders = ', '.join(['%s'] * len(task_ids))
+    quote = connection.ops.quote_name
+    # UNION (not UNION ALL) discards rows already seen, so the recursion
+    # terminates even if the stored graph contains a cycle
+    sql = (
+        f'WITH RECURSIVE closure(task_id) AS ('
+        f'SELECT {quote(target)} FROM {quote(table)} WHERE {quote(source)} IN ({placeholders}) '
+        f'UNION '
+        f'SELECT edge.{quote(target)} FROM {quote(table)} edge '
+        f'JOIN closure ON edge.{quote(source)} = closure.task_id'
+        f') SELECT task_id FROM closure'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, task_ids)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def get_upstream_ids(task_ids):
+    """Ids of every task the given tasks transitively depend on"""
+    return _closure_ids(task_ids, upstream=True)
+
+
+def get_downstream_ids(task_ids):
+    """Ids of every task that transitively depends on the given tasks"""
+    return _closure_ids(task_ids, upstream=False)
+
+
+def check_new_dependencies(task_id, depends_on_ids):
+    """
+    Raise DependencyCycleError if making task_id depend on depends_on_ids
+    would create a cycle. Costs a single recursive query.
+    """
+    depends_on_ids = set(depends_on_ids)
+    if task_id in depends_on_ids:
+        raise DependencyCycleError([task_id, task_id])
+
+    # A cycle appears if any new dependency already (transitively) depends on the task
+    if task_id in get_upstream_ids(depends_on_ids):
+        graph = DependencyGraph.for_tasks(depends_on_ids | {task_id})
+        for depends_on_id in depends_on_ids:
+            path = graph.find_path(depends_on_id, task_id)
+            if path:
+                raise DependencyCycleError([task_id] + path)
+        raise DependencyCycleError([task_id, task_id])
+
+
+def propagate_blocked_status(task_ids, history, include_tasks=False):
+    """
+    Block or unblock the tasks downstream of task_ids after a status change.
+
+    A pending task with an incomplete dependency becomes blocked; a blocked
+    task whose dependencies are all completed goes back to pending. Tasks
+    without dependencies, and tasks in progress, completed or cancelled, are
+    left alone. With ``include_tasks`` the given tasks are re-evaluated too.
+
+    Flipping between pending and blocked never changes whether a task counts
+    as done, so the whole downstream set settles in one wave: at most one
+    UPDATE per direction. The status changes are queued on ``history`` (a
+    HistoryRecorder) and written with the rest of the request's entries.
+    Returns {task_id: (old_status, new_status)}.
+    """
+    candidate_ids = get_downstream_ids(task_ids)
+    if include_tasks:
+        candidate_ids |= set(task_ids)
+    if not candidate_ids:
+        return {}
+
+    dependencies = Task.depends_on.through.objects.filter(from_task_id=OuterRef('pk'))
+    has_dependencies = Exists(dependencies)
+    has_incomplete = Exists(dependencies.exclude(to_task__status='completed'))
+    transitions = [
+        ('pending', 'blocked', has_incomplete),
+        ('blocked', 'pending', has_dependencies & ~has_incomplete),
+    ]
+
+    changes = {}
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = Task.objects.select_for_update().filter(id__in=candidate_ids)
+        for old_status, new_status, condition in transitions:
+            ids = list(candidates.filter(condition, status=old_status).values_list('id', flat=True))
+            if ids:
+                Task.objects.filter(id__in=ids).update(status=new_status, updated_at=now)
+                changes.update(dict.fromkeys(ids, (old_status, new_status)))
+
+        if changes:
+            for task_id, (old_status, new_status) in changes.items():
+                history.record(task_id, 'Status changed by dependencies', old_status, new_status, field_changed='status')
+
+            # Bulk updates skip the post_save handlers, so refresh the stats
+            # and push the live updates here
+            transaction.on_commit(lambda: publish_status_changes(changes))
+            invalidate_dashboard_stats(
+                user_ids=Task.assigned_to.through.objects.filter(
+                    task_id__in=changes
+                ).values_list('user_id', flat=True),
+                division_ids=Task.objects.filter(id__in=changes).values_list('division_id', flat=True).distinct(),
+            )
+    return changes
+
+
+def _edge_path_counts(task_id, depends_on_id):
+    """Paths running through the edge task_id -> depends_on_id, as {(ancestor, descendant, depth): count}"""
+    ancestors = [(depends_on_id, 0, 1)] + list(
+        TaskDependencyPath.objects.filter(descendant_id=depends_on_id).values_list('ancestor_id', 'depth', 'path_count')
+    )
+    descendants = [(task_id, 0, 1)] + list(
+        TaskDependencyPath.objects.filter(ancestor_id=task_id).values_list('descendant_id', 'depth', 'path_count')
+    )
+    # The same (ancestor, descendant, depth) can be reached by splitting the
+    # depth differently around the edge, so counts are summed
+    counts = Counter()
+    for ancestor_id, ancestor_depth, ancestor_count in ancestors:
+        for descendant_id, descendant_depth, descendant_count in descendants:
+            counts[(ancestor_id, descendant_id, ancestor_depth + descendant_depth + 1)] += ancestor_count * descendant_count
+    return counts
+
+
+def _apply_path_counts(counts, sign):
+    existing = TaskDependencyPath.objects.filter(
+        ancestor_id__in={key[0] for key in counts},
+        descendant_id__in={key[1] for key in counts},
+    )
+    changed, emptied = [], []
+    for path in existing:
+        count = counts.pop((path.ancestor_id, path.descendant_id, path.depth), None)
+        if count is None:
+            continue
+        path.path_count += sign * count
+        if path.path_count > 0:
+            changed.append(path)
+        else:
+            emptied.append(path.pk)
+
+    TaskDependencyPath.objects.bulk_update(changed, ['path_count'], batch_size=500)
+    if emptied:
+        TaskDependencyPath.objects.filter(pk__in=emptied).delete()
+    if sign > 0:
+        TaskDependencyPath.objects.bulk_create([
+            TaskDependencyPath(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth, path_count=count)
+            for (ancestor_id, descendant_id, depth), count in counts.items()
+        ], batch_size=500)
+
+
+def add_dependency_paths(edges):
+    """Record new (task_id, depends_on_id) edges in the closure table"""
+    with transaction.atomic():
+        for task_id, depends_on_id in edges:
+            _apply_path_counts(_edge_path_counts(task_id, depends_on_id), 1)
+
+
+def remove_dependency_paths(edges):
+    """Discount (task_id, depends_on_id) edges that are about to be deleted"""
+    with transaction.atomic():
+        for task_id, depends_on_id in edges:
+            _apply_path_counts(_edge_path_counts(task_id, depends_on_id), -1)
+
+
+def build_dependency_paths(edges):
+    """
+    Compute the full closure of (task_id, depends_on_id) edges in memory.
+
+    Yields (ancestor, descendant, depth, path_count) rows; raises
+    DependencyCycleError if the edges contain a cycle.
+    """
+    graph = DependencyGraph(edges=edges)
+    paths = {}
+    for task_id in graph.topological_order():
+        counts = Counter()
+        for depends_on_id in graph.upstream.get(task_id, ()):
+            counts[(depends_on_id, 1)] += 1
+            for (ancestor_id, depth), count in paths[depends_on_id].items():
+                counts[(ancestor_id, depth + 1)] += count
+        paths[task_id] = counts
+        for (ancestor_id, depth), count in counts.items():
+            yield ancestor_id, task_id, depth, count
+
+
+def rebuild_dependency_paths(batch_size=1000):
+    """Recreate the closure table from the current edges; returns the number of rows"""
+    edges = Task.depends_on.through.objects.values_list('from_task_id', 'to_task_id')
+    with transaction.atomic():
+        TaskDependencyPath.objects.all().delete()
+        batch, total = [], 0
+        for ancestor_id, descendant_id, depth, count in build_dependency_paths(edges):
+            batch.append(TaskDependencyPath(
+                ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth, path_count=count
+            ))
+            if len(batch) >= batch_size:
+                TaskDependencyPath.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        TaskDependencyPath.objects.bulk_create(batch)
+        return total + len(batch)
+
+
+class DependencyGraph:
+    """In-memory adjacency structure over a set of task dependency edges"""
+
+    def __init__(self, edges=(), statuses=None):
+        self.upstream = defaultdict(set)    # task id -> ids it depends on
+        self.downstream = defaultdict(set)  # task id -> ids depending on it
+        self.statuses = dict(statuses or {})
+        self.nodes = set(self.statuses)
+        for task_id, depends_on_id in edges:
+            self.add_edge(task_id, depends_on_id)
+
+    def __repr__(self):
+        edge_count = sum(len(ids) for ids in self.upstream.values())
+        return f'<DependencyGraph: {len(self.nodes)} tasks, {edge_count} edges>'
+
+    # Loading
+
+    @classmethod
+    def for_project(cls, project_id):
+        """
+        Load a project's tasks and every dependency edge touching them.
+
+        Two queries: one for task statuses, one for the edge set. Tasks
+        outside the project that share an edge are included as nodes.
+        """
+        statuses = dict(Task.objects.filter(project_id=project_id).values_list('id', 'status'))
+        edges = Task.depends_on.through.objects.filter(
+            Q(from_task__project_id=project_id) | Q(to_task__project_id=project_id)
+        ).values_list('from_task_id', 'to_task_id', 'from_task__status', 'to_task__status')
+        return cls._from_rows(statuses, edges)
+
+    @classmethod
+    def for_tasks(cls, task_ids):
+        """
+        Load the part of the graph reachable from task_ids in either direction.
+
+        Reachability uses recursive CTEs, so only the relevant edges are read
+        however large the overall graph is.
+        """
+        task_ids = set(task_ids)
+        related = task_ids | get_upstream_ids(task_ids) | get_downstream_ids(task_ids)
+        statuses = dict(Task.objects.filter(id__in=related).values_list('id', 'status'))
+        edges = Task.depends_on.through.objects.filter(
+            from_task_id__in=related, to_task_id__in=related
+        ).values_list('from_task_id', 'to_task_id', 'from_task__status', 'to_task__status')
+        return cls._from_rows(statuses, edges)
+
+    @classmethod
+    def for_task(cls, task_id):
+        """Load everything upstream and downstream of one task"""
+        return cls.for_tasks([task_id])
+
+    @classmethod
+    def _from_rows(cls, statuses, edge_rows):
+        graph = cls(statuses=statuses)
+        for task_id, depends_on_id, task_status, depends_on_status in edge_rows:
+            graph.statuses.setdefault(task_id, task_status)
+            graph.statuses.setdefault(depends_on_id, depends_on_status)
+            graph.add_edge(task_id, depends_on_id)
+        return graph
+
+    # Structure
+
+    def add_edge(self, task_id, depends_on_id):
+        """Record that task_id depends on depends_on_id"""
+        self.nodes.update([task_id, depends_on_id])
+        self.upstream[task_id].add(depends_on_id)
+        self.downstream[depends_on_id].add(task_id)
+
+    def remove_edge(self, task_id, depends_on_id):
+        self.upstream[task_id].discard(depends_on_id)
+        self.downstream[depends_on_id].discard(task_id)
+
+    def _reachable(self, start_ids, adjacency):
+        seen = set()
+        queue = deque(start_ids)
+        while queue:
+            for next_id in adjacency.get(queue.popleft(), ()):
+                if next_id not in seen:
+                    seen.add(next_id)
+                    queue.append(next_id)
+        return seen
+
+    def get_blockers(self, task_id, transitive=True):
+        """Ids of incomplete tasks task_id waits on (directly or transitively)"""
+        ids = self._reachable([task_id], self.upstream) if transitive else set(self.upstream.get(task_id, ()))
+        return {blocker_id for blocker_id in ids if self.statuses.get(blocker_id) != 'completed'}
+
+    def get_dependents(self, task_id, transitive=True):
+        """Ids of tasks that depend on task_id (directly or transitively)"""
+        if transitive:
+            return self._reachable([task_id], self.downstream)
+        return set(self.downstream.get(task_id, ()))
+
+    def find_path(self, from_id, to_id):
+        """Shortest dependency path [from_id, ..., to_id] following depends_on edges, or None"""
+        previous = {from_id: None}
+        queue = deque([from_id])
+        while queue:
+            current = queue.popleft()
+            if current == to_id:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = previous[current]
+                return path[::-1]
+            for next_id in self.upstream.get(current, ()):
+                if next_id not in previous:
+                    previous[next_id] = current
+                    queue.append(next_id)
+        return None
+
+    def would_create_cycle(self, task_id, depends_on_id):
+        """Check whether adding the edge task_id -> depends_on_id would close a cycle"""
+        return task_id == depends_on_id or self.find_path(depends_on_id, task_id) is not None
+
+    def find_cycle(self):
+        """Get one dependency cycle as a list of task ids (first id repeated at the end), or None"""
+        visiting, done = set(), set()
+        for root in sorted(self.nodes):
+            if root in done:
+                continue
+            # Iterative DFS keeping the current path on an explicit stack
+            stack = [(root, iter(sorted(self.upstream.get(root, ()))))]
+            path = [root]
+            visiting.add(root)
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    path.pop()
+                    visiting.discard(node)
+                    done.add(node)
+                elif child in visiting:
+                    return path[path.index(child):] + [child]
+                elif child not in done:
+                    visiting.add(child)
+                    path.append(child)
+                    stack.append((child, iter(sorted(self.upstream.get(child, ())))))
+        return None
+
+    def topological_order(self):
+        """
+        Order task ids so every task comes after the tasks it depends on.
+
+        Ties are broken by task id so the order is stable. Raises
+        DependencyCycleError if the graph has a cycle.
+        """
+        remaining = {task_id: len(self.upstream.get(task_id, ())) for task_id in self.nodes}
+        ready = [task_id for task_id, count in remaining.items() if count == 0]
+        heapq.heapify(ready)
+
+        order = []
+        while ready:
+            task_id = heapq.heappop(ready)
+            order.append(task_id)
+            for dependent_id in self.downstream.get(task_id, ()):
+                remaining[dependent_id] -= 1
+                if remaining[dependent_id] == 0:
+                    heapq.heappush(ready, dependent_id)
+
+        if len(order) < len(self.nodes):
+            raise DependencyCycleError(self.find_cycle() or [])
+        return order
+
+    def get_ready_tasks(self):
+        """Ids of not-yet-started tasks whose dependencies are all completed"""
+        return {
+            task_id for task_id in self.nodes
+            if self.statuses.get(task_id) in STARTABLE_STATUSES
+            and all(self.statuses.get(dep_id) == 'completed' for dep_id in self.upstream.get(task_id, ()))
+        }
@@ -0,0 +1,243 @@
+"""
+In-process publish/subscribe for live updates over server-sent events.
+
+Views and signal handlers ``publish()`` small JSON events (task status
+changes, new comments, assignments) on named channels once their transaction
+commits. ``task:<id>`` carries everything about a task, ``user:<id>`` carries
+events for the tasks a user watches, ``division:<id>`` carries them for
+division admins, and ``all`` carries them for super admins. The SSE view
+(``/events/``) subscribes a browser's connection to its channels and streams
+what arrives, so pages no longer need to poll.
+
+Each subscription is an ``asyncio.Queue`` on the event loop that serves the
+connection. Publishers may run in any thread (sync views run in a thread pool
+under ASGI) and hand events over with ``call_soon_threadsafe``. A short
+history lets a reconnecting browser catch up from its ``Last-Event-ID``.
+
+The broker lives in the process: serve the site with a single ASGI worker
+process (one event loop handles many open streams), or events published by
+one process will not reach browsers connected to another.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+class Event:
+    """A published event; ``format()`` renders it as an SSE message"""
+
+    def __init__(self, event_id, channels, event_type, data):
+        self.id = event_id
+        self.channels = frozenset(channels)
+        self.type = event_type
+        self.data = data
+
+    def format(self):
+        return f'id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n'
+
+
+class Subscription:
+    """A connection's queue of events, filled from any thread"""
+
+    def __init__(self, channels, loop, queue_size):
+        self.channels = frozenset(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # Set when events had to be dropped; the stream then asks the page to reload
+        self.overflowed = False
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The connection's loop is closed; it is unsubscribed on the way out
+            pass
+
+    async def get(self, timeout=None):
+        """Wait for the next event; None on timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """Routes published events to the subscriptions of their channels"""
+
+    def __init__(self, history_size=500, queue_size=100):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def publish(self, channels, event_type, data):
+        """Send an event to every subscriber of any of the channels; returns the event"""
+        channels = {channel for channel in channels if channel}
+        with self._lock:
+            event = Event(next(self._ids), channels, event_type, data)
+            self._history.append(event)
+            targets = set()
+            for channel in channels:
+                targets.update(self._subscribers.get(channel, ()))
+        for subscription in targets:
+            subscription.deliver(event)
+        return event
+
+    def subscribe(self, channels, last_event_id=None):
+        """
+        Subscribe the running event loop to the channels.
+
+        Events newer than ``last_event_id`` still in the history are queued
+        straight away.
+        """
+        subscription = Subscription(channels, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+            if last_event_id is not None:
+                for event in self._history:
+                    if event.id > last_event_id and event.channels & subscription.channels:
+                        subscription._put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._subscribers.values())) if self._subscribers else 0
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_event_broker():
+    """Get the process-wide broker, creating it from settings on first use"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = EventBroker(
+                    history_size=settings.EVENT_STREAM_HISTORY_SIZE,
+                    queue_size=settings.EVENT_STREAM_QUEUE_SIZE,
+                )
+    return _broker
+
+
+def publish(channels, event_type, data):
+    """Publish an event on the process-wide broker"""
+    return get_event_broker().publish(channels, event_type, data)
+
+
+async def stream_events(channels, last_event_id=None):
+    """
+    Yield SSE messages for a connection until the client goes away.
+
+    A keep-alive comment is sent when nothing happened for
+    ``EVENT_STREAM_KEEPALIVE_SECONDS``. If the connection fell too far
+    behind, a ``reset`` event tells the page to reload and the stream ends.
+    """
+    broker = get_event_broker()
+    subscription = broker.subscribe(channels, last_event_id)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            event = await subscription.get(timeout=settings.EVENT_STREAM_KEEPALIVE_SECONDS)
+            if subscription.overflowed:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            yield event.format() if event is not None else ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# ----------------------------
+# Channels
+# ----------------------------
+
+def get_user_channels(user):
+    """Channels feeding a user's dashboard"""
+    channels = [f'user:{user.pk}']
+    if user.is_super_admin():
+        channels.append('all')
+    elif user.is_admin() and user.division_id:
+        channels.append(f'division:{user.division_id}')
+    return channels
+
+
+def get_task_channels(task_id, user):
+    """Channels for a task page; internal comments only reach admins"""
+    channels = [f'task:{task_id}']
+    if user.is_admin():
+        channels.append(f'task:{task_id}:internal')
+    return channels
+
+
+def publish_task_event(task, event_type, data=None, watcher_ids=(), internal=False):
+    """
+    Publish an event about a task to its page, its watchers' dashboards,
+    its division's admins and super admins.
+
+    Internal events (internal comments) only go to the admin channels.
+    """
+    payload = {'task_id': task.pk, 'title': task.title, 'status': task.status,
+               'status_display': task.get_status_display()}
+    payload.update(data or {})
+    if internal:
+        channels = [f'task:{task.pk}:internal', f'division:{task.division_id}', 'all']
+    else:
+        channels = [f'task:{task.pk}', f'division:{task.division_id}', 'all']
+        channels += [f'user:{user_id}' for user_id in watcher_ids]
+    try:
+        return publish(channels, event_type, payload)
+    except Exception as e:
+        # Live updates are best effort and must never break a write
+        logger.error(f"Publishing {event_type} for task {task.pk} failed: {str(e)}")
+        return None
+
+
+def publish_status_changes(changes):
+    """
+    Publish task.status events for tasks changed by a bulk UPDATE.
+
+    ``changes`` maps task ids to (old_status, new_status), as returned by
+    ``dependencies.propagate_blocked_status``. Costs two queries however
+    many tasks changed, and nothing when ``LIVE_UPDATES`` is off.
+    """
+    if not changes or not settings.LIVE_UPDATES:
+        return
+    assignees = {}
+    for task_id, user_id in Task.assigned_to.through.objects.filter(
+        task_id__in=changes
+    ).values_list('task_id', 'user_id'):
+        assignees.setdefault(task_id, []).append(user_id)
+    for task in Task.objects.filter(id__in=changes).only('id', 'title', 'status', 'division_id', 'created_by_id'):
+        old_status, _new_status = changes[task.pk]
+        publish_task_event(
+            task, 'task.status', {'old_status': old_status},
+            watcher_ids=assignees.get(task.pk, []) + [task.created_by_id],
+        )
@@ -0,0 +1,23 @@
+"""
+Process pool entry points for the export worker.
+
+These run in freshly spawned processes, so this module must stay importable
+before Django is set up: everything Django-related is imported lazily.
+"""
+
+
+def init_worker():
+    """Set up Django in a new pool process"""
+    import django
+    django.setup()
+
+
+def run_job(job_id):
+    """Run one export job and close the process's connections afterwards"""
+    from django.db import close_old_connections
+    from tasks.exports import run_export_job
+
+    try:
+        return run_export_job(job_id)
+    finally:
+        close_old_connections()
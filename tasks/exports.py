@@ -0,0 +1,331 @@
+"""
+Task report exports (Excel and PDF).
+
+Excel rows are read from the database in chunks with ``QuerySet.iterator()``
+and written with xlsxwriter's ``constant_memory`` mode, which flushes each row
+to disk as soon as the next one starts. Memory therefore stays bounded by the
+chunk size instead of growing with the number of exported tasks.
+
+Reports are normally generated by ``ExportJob`` rows picked up by the
+``run_export_worker`` command; ``run_export_job`` is the unit of work it runs.
+"""
+
+import html
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.http import QueryDict
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+try:
+    import xlsxwriter
+    EXCEL_AVAILABLE = True
+except ImportError:
+    EXCEL_AVAILABLE = False
+
+try:
+    import pdfkit
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+from .models import Comment, Division, ExportJob, Project
+from .reports import NO_PROJECT, ReportQuery
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+TASK_HEADERS = [
+    'ID', 'Title', 'Description', 'Status', 'Project', 'Division',
+    'Created By', 'Assigned To', 'Team Size', 'Due Date',
+    'Latest Comment', 'Estimated Hours', 'Actual Hours'
+]
+TASK_COLUMN_WIDTHS = [8, 30, 50, 12, 25, 15, 20, 30, 10, 18, 40, 15, 15]
+
+
+def get_export_queryset(tasks):
+    """Add the joins and prefetches needed to write task rows without per-row queries"""
+    return tasks.select_related('created_by', 'division', 'project').prefetch_related('assigned_to')
+
+
+def iter_export_tasks(tasks, chunk_size):
+    """
+    Iterate over tasks chunk by chunk, attaching each chunk's latest public
+    comments with one query per chunk.
+    """
+    rows = tasks.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        Comment.attach_latest_public(chunk)
+        yield from chunk
+
+
+def _latest_comment_text(task):
+    if task.status == 'in_progress':
+        latest_comment = task.latest_comment
+        if not latest_comment:
+            return 'No comments yet'
+        comment_user = latest_comment.user.get_full_name() or latest_comment.user.username
+        comment_content = html.unescape(strip_tags(latest_comment.content))
+        return f"{comment_user}: {comment_content[:200]}..."
+    elif task.status in ['completed', 'pending', 'cancelled']:
+        return '-'
+    return ''
+
+
+def write_tasks_workbook(report, output, chunk_size=None):
+    """
+    Write the tasks report (Tasks and Summary sheets) for a ReportQuery to a
+    file name or binary file object.
+
+    Returns the number of task rows written.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'remove_timezone': True,
+        'tmpdir': tempfile.gettempdir(),
+    })
+    tasks_sheet = workbook.add_worksheet('Tasks')
+    summary_sheet = workbook.add_worksheet('Summary')
+
+    # Formats
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#4f46e5', 'font_color': 'white', 'border': 1})
+    cell_format = workbook.add_format({'border': 1, 'text_wrap': True})
+    date_format = workbook.add_format({'border': 1, 'num_format': 'yyyy-mm-dd hh:mm'})
+    comment_format = workbook.add_format({'border': 1, 'text_wrap': True, 'bg_color': '#f0f9ff'})
+
+    # constant_memory mode only accepts rows in order, so column setup and
+    # headers come first
+    for col, width in enumerate(TASK_COLUMN_WIDTHS):
+        tasks_sheet.set_column(col, col, width)
+    for col, header in enumerate(TASK_HEADERS):
+        tasks_sheet.write(0, col, header, header_format)
+
+    # Data rows, fetched chunk by chunk (prefetches run once per chunk)
+    rows = iter_export_tasks(get_export_queryset(report.queryset()).order_by('-created_at'), chunk_size)
+    row = 0
+    for task in rows:
+        try:
+            cleaned_description = html.unescape(strip_tags(task.description or ''))
+
+            assignees = list(task.assigned_to.all())
+            if assignees:
+                assignee_names = ", ".join([
+                    user.get_full_name() or user.username
+                    for user in assignees
+                ])
+            else:
+                assignee_names = 'Unassigned'
+
+            values = [
+                (task.id, cell_format),
+                (task.title, cell_format),
+                (cleaned_description[:500] + '...' if len(cleaned_description) > 500 else cleaned_description, cell_format),
+                (task.get_status_display(), cell_format),
+                (task.project.title if task.project else 'Individual Task', cell_format),
+                (task.division.name if task.division else 'N/A', cell_format),
+                (task.created_by.get_full_name() if task.created_by else 'N/A', cell_format),
+                (assignee_names, cell_format),
+                (len(assignees), cell_format),
+                (task.due_date if task.due_date else 'N/A', date_format),
+                (_latest_comment_text(task), comment_format if task.status == 'in_progress' else cell_format),
+                (task.estimated_hours if task.estimated_hours else 'N/A', cell_format),
+                (task.actual_hours if task.actual_hours else 'N/A', cell_format),
+            ]
+        except Exception as e:
+            logger.error(f"Error processing task {task.id} for export: {str(e)}")
+            continue
+
+        row += 1
+        for col, (value, cell_fmt) in enumerate(values):
+            tasks_sheet.write(row, col, value, cell_fmt)
+
+    # Summary Sheet (shared with the reports dashboard through the report cache)
+    task_stats = report.task_stats()
+    summary_data = [
+        ['Metric', 'Value'],
+        ['Total Tasks', task_stats['total']],
+        ['Completed Tasks', task_stats['completed']],
+        ['Pending Tasks', task_stats['pending']],
+        ['In Progress Tasks', task_stats['in_progress']],
+        ['Overdue Tasks', task_stats['overdue']],
+    ]
+
+    summary_sheet.set_column('A:A', 20)
+    summary_sheet.set_column('B:B', 15)
+    for summary_row, (metric, value) in enumerate(summary_data):
+        cell_fmt = header_format if summary_row == 0 else cell_format
+        summary_sheet.write(summary_row, 0, metric, cell_fmt)
+        summary_sheet.write(summary_row, 1, value, cell_fmt)
+
+    workbook.close()
+    return row
+
+
+def build_tasks_workbook_file(report, chunk_size=None):
+    """
+    Write the tasks report to an anonymous temporary file.
+
+    Returns the file rewound to the start; it is deleted when closed.
+    """
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        write_tasks_workbook(report, output, chunk_size=chunk_size)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+# ----------------------------
+# PDF report
+# ----------------------------
+
+def _get_logo_path():
+    static_logo_path = os.path.join(settings.STATIC_ROOT or settings.BASE_DIR, 'static', 'images', 'logo.png')
+    if os.path.exists(static_logo_path):
+        return f'file:///{static_logo_path.replace(os.sep, "/")}'
+    base_logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')
+    if os.path.exists(base_logo_path):
+        return f'file:///{base_logo_path.replace(os.sep, "/")}'
+    return None
+
+
+def render_tasks_pdf(report):
+    """Render the tasks report for a ReportQuery; returns (PDF bytes, task count)"""
+    tasks = list(get_export_queryset(report.queryset()).order_by('-created_at'))
+    Comment.attach_latest_public(tasks)
+
+    # Process tasks for template
+    collaborative_count = 0
+    total_assignees = 0
+
+    for task in tasks:
+        try:
+            task.description_clean = html.unescape(strip_tags(task.description or ''))
+
+            assignees = list(task.assigned_to.all())
+            task.assignee_count = len(assignees)
+            total_assignees += task.assignee_count
+
+            # Check if collaborative (more than 1 assignee)
+            task.is_collaborative = task.assignee_count > 1
+            if task.is_collaborative:
+                collaborative_count += 1
+
+            if assignees:
+                task.assignee_names = ", ".join([
+                    assignee.get_full_name() or assignee.username
+                    for assignee in assignees
+                ])
+            else:
+                task.assignee_names = "Unassigned"
+
+        except Exception as e:
+            logger.error(f"Error processing task {task.id} for PDF export: {str(e)}")
+            # Set safe defaults
+            task.description_clean = "Error loading description"
+            task.assignee_names = "Error loading assignees"
+            task.assignee_count = 0
+            task.is_collaborative = False
+            task.latest_comment = None
+
+    selected_division_obj = None
+    if report.division_id:
+        selected_division_obj = Division.objects.filter(id=report.division_id).first()
+
+    selected_project_obj = None
+    if report.project and report.project != NO_PROJECT:
+        selected_project_obj = Project.objects.filter(id=report.project).first()
+
+    try:
+        logo_path = _get_logo_path()
+    except Exception as e:
+        logger.error(f"Logo path error: {str(e)}")
+        logo_path = None
+
+    template = get_template('tasks/pdf_template.html')
+    rendered_html = template.render({
+        'tasks': tasks,
+        'generated_at': timezone.now(),
+        'logo_path': logo_path,
+        'user': report.user,
+        'divisions': Division.objects.all(),
+        'projects': Project.objects.all(),
+        'selected_division_obj': selected_division_obj,
+        'selected_project_obj': selected_project_obj,
+        **report.get_filter_context(),
+        'collaborative_count': collaborative_count,
+        'total_assignees': total_assignees,
+    })
+
+    if getattr(settings, 'WKHTMLTOPDF_PATH', None):
+        config = pdfkit.configuration(wkhtmltopdf=settings.WKHTMLTOPDF_PATH)
+    else:
+        config = None
+
+    options = {
+        'enable-local-file-access': None,
+        'encoding': 'UTF-8',
+        'quiet': '',
+        'no-outline': None,
+        'margin-top': '0.75in',
+        'margin-right': '0.75in',
+        'margin-bottom': '0.75in',
+        'margin-left': '0.75in',
+    }
+    return pdfkit.from_string(rendered_html, False, options=options, configuration=config), len(tasks)
+
+
+# ----------------------------
+# Background export jobs
+# ----------------------------
+
+def run_export_job(job_id):
+    """
+    Generate the result file of a claimed (running) export job.
+
+    Failures are recorded on the job instead of being raised. Returns the
+    final job status.
+    """
+    job = ExportJob.objects.select_related('requested_by', 'requested_by__division').get(pk=job_id)
+    report = ReportQuery.from_params(job.requested_by, QueryDict(job.query_string))
+
+    try:
+        if job.export_format == 'excel':
+            if not EXCEL_AVAILABLE:
+                raise RuntimeError('Excel export is not available')
+            with tempfile.TemporaryFile(suffix='.xlsx') as output:
+                job.row_count = write_tasks_workbook(report, output)
+                output.seek(0)
+                job.file.save(job.get_filename(), File(output), save=False)
+        else:
+            if not PDF_AVAILABLE:
+                raise RuntimeError('PDF export is not available')
+            pdf, job.row_count = render_tasks_pdf(report)
+            job.file.save(job.get_filename(), ContentFile(pdf), save=False)
+
+        job.status = 'completed'
+        job.completed_at = timezone.now()
+        job.expires_at = job.completed_at + timedelta(hours=settings.EXPORT_JOB_TTL_HOURS)
+    except Exception as e:
+        logger.error(f"Export job {job.pk} failed: {str(e)}")
+        job.status = 'failed'
+        job.error = str(e)
+        job.completed_at = timezone.now()
+
+    job.save(update_fields=['status', 'file', 'row_count', 'error', 'completed_at', 'expires_at'])
+    return job.status
@@ -0,0 +1,137 @@
+"""
+Batched TaskHistory recording.
+
+Views collect a request's task changes in a ``HistoryRecorder`` and write them
+with one ``bulk_create`` when its block ends, inside the same transaction as
+the changes themselves::
+
+    with HistoryRecorder.for_request(request) as history:
+        history.record_changes(task)  # before save(): diff against the loaded state
+        task.save()
+        history.record(task, 'Comment added', new_value=...)
+
+Every entry gets the request's user and client IP address.
+"""
+
+import sys
+from datetime import date, datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TaskHistory
+
+
+# Task fields diffed by record_changes(), with the history action for each
+TRACKED_TASK_FIELDS = {
+    'title': 'Title changed',
+    'status': 'Status changed',
+    'priority': 'Priority changed',
+    'due_date': 'Due date changed',
+    'estimated_hours': 'Estimated hours changed',
+    'actual_hours': 'Actual hours changed',
+}
+
+SUMMARY_LENGTH = 100
+
+
+def get_client_ip(request):
+    """Get the client address of a request, or None"""
+    return request.META.get('REMOTE_ADDR') or None
+
+
+def summarize(text):
+    """Shorten free text (comments, descriptions) for a history entry"""
+    text = text or ''
+    return text[:SUMMARY_LENGTH] + '...' if len(text) > SUMMARY_LENGTH else text
+
+
+def format_value(value):
+    """Render a field value the way history entries store it"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+class HistoryRecorder:
+    """Collects TaskHistory entries and writes them in a single query"""
+
+    def __init__(self, user, ip_address=None):
+        self.user = user
+        self.ip_address = ip_address
+        self.entries = []
+        self._atomic = None
+
+    @classmethod
+    def for_request(cls, request):
+        return cls(request.user, ip_address=get_client_ip(request))
+
+    def __enter__(self):
+        self._atomic = transaction.atomic()
+        self._atomic.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            try:
+                self.flush()
+            except Exception:
+                self._atomic.__exit__(*sys.exc_info())
+                raise
+        return self._atomic.__exit__(exc_type, exc_value, traceback)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, task, action, old_value='', new_value='', field_changed=''):
+        """Queue one history entry; task may be an instance or a task id"""
+        self.entries.append(TaskHistory(
+            task_id=getattr(task, 'pk', task),
+            user=self.user,
+            action=action,
+            old_value=format_value(old_value),
+            new_value=format_value(new_value),
+            field_changed=field_changed,
+            ip_address=self.ip_address,
+        ))
+
+    def record_changes(self, task, fields=None):
+        """
+        Queue an entry for each tracked field that differs from its loaded value.
+
+        Call before saving: save() refreshes the loaded state. Returns the
+        names of the changed fields.
+        """
+        changed = []
+        for field_name, action in (fields or TRACKED_TASK_FIELDS).items():
+            old_value = task.get_loaded_value(field_name)
+            new_value = getattr(task, field_name)
+            if old_value != new_value:
+                self.record(task, action, old_value, new_value, field_changed=field_name)
+                changed.append(field_name)
+        return changed
+
+    def record_assignees(self, task, old_assignees, new_assignees):
+        """Queue an entry if the set of assignees changed"""
+        if set(old_assignees) == set(new_assignees):
+            return False
+        self.record(
+            task, 'Assignees changed',
+            ', '.join(user.get_display_name() for user in old_assignees),
+            ', '.join(user.get_display_name() for user in new_assignees),
+            field_changed='assigned_to',
+        )
+        return True
+
+    def flush(self):
+        """Write the queued entries; returns how many were written"""
+        entries, self.entries = self.entries, []
+        if entries:
+            TaskHistory.objects.bulk_create(entries, batch_size=500)
+        return len(entries)
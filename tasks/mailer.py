@@ -0,0 +1,158 @@
+"""
+Email outbox.
+
+Nothing sends mail from a request. Views and services queue ``OutboundEmail``
+rows (``queue_email``/``queue_notification_emails``), and the background
+sender (``manage.py send_emails``) delivers them in batches over a single
+reused backend connection. Each message that fails is retried with
+exponential backoff until it hits ``EMAIL_OUTBOX_MAX_ATTEMPTS``. Sent rows
+and their notifications are marked in bulk.
+
+Any Django email backend works, so the sender can be tested with
+``EMAIL_BACKEND=django.core.mail.backends.locmem.EmailBackend`` or against a
+local SMTP stand-in (``python -m aiosmtpd -n -l localhost:1025``).
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(to_email, subject, body, notification=None):
+    """Put one message in the outbox"""
+    return OutboundEmail.objects.create(
+        to_email=to_email, subject=subject[:255], body=body, notification=notification
+    )
+
+
+def queue_notification_emails(limit=1000):
+    """
+    Queue an email for every unsent notification that has no outbox row yet.
+
+    Recipients without an email address (or inactive) are skipped. Returns
+    the number of messages queued.
+    """
+    notifications = Notification.objects.filter(
+        is_sent=False, email__isnull=True, recipient__is_active=True
+    ).exclude(recipient__email='').select_related('recipient').order_by('created_at')[:limit]
+
+    emails = [
+        OutboundEmail(
+            to_email=notification.recipient.email,
+            subject=notification.title[:255],
+            body=f'{notification.message}\n\n-- \nTask Manager',
+            notification=notification,
+        )
+        for notification in notifications
+    ]
+    OutboundEmail.objects.bulk_create(emails, batch_size=500)
+    return len(emails)
+
+
+def get_retry_delay(attempts):
+    """Seconds to wait before the next attempt after `attempts` failures"""
+    return settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+
+
+def claim_due_emails(batch_size):
+    """Move up to batch_size due messages from pending to sending and return them"""
+    now = timezone.now()
+    ids = list(OutboundEmail.objects.filter(
+        status='pending', next_attempt_at__lte=now
+    ).order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+    # The conditional UPDATE keeps two senders from claiming the same rows
+    with transaction.atomic():
+        OutboundEmail.objects.filter(pk__in=ids, status='pending').update(status='sending', last_attempt_at=now)
+        return list(OutboundEmail.objects.filter(pk__in=ids, status='sending', last_attempt_at=now))
+
+
+def _record_failures(emails, now):
+    """Schedule a retry with backoff, or give up after EMAIL_OUTBOX_MAX_ATTEMPTS"""
+    for email in emails:
+        email.attempts += 1
+        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = 'failed'
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = now + timedelta(seconds=get_retry_delay(email.attempts))
+    OutboundEmail.objects.bulk_update(emails, ['attempts', 'last_error', 'status', 'next_attempt_at'], batch_size=500)
+
+
+def send_email_batch(emails, connection=None):
+    """
+    Deliver claimed messages over one backend connection.
+
+    Returns (sent, failed) counts. Delivered messages and their
+    notifications are marked with one UPDATE each.
+    """
+    if not emails:
+        return 0, 0
+    now = timezone.now()
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # The server is unreachable: every message in the batch waits for a retry
+        logger.error(f"Email connection failed: {str(e)}")
+        for email in emails:
+            email.last_error = str(e)
+        _record_failures(emails, now)
+        return 0, len(emails)
+
+    sent, failed = [], []
+    try:
+        for email in emails:
+            message = EmailMessage(
+                email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.to_email], connection=connection
+            )
+            try:
+                message.send()
+                sent.append(email)
+            except Exception as e:
+                email.last_error = str(e)
+                failed.append(email)
+    finally:
+        connection.close()
+
+    with transaction.atomic():
+        if sent:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in sent]).update(
+                status='sent', sent_at=timezone.now(), last_error=''
+            )
+            Notification.objects.filter(
+                pk__in=[email.notification_id for email in sent if email.notification_id]
+            ).update(is_sent=True)
+        if failed:
+            _record_failures(failed, now)
+    return len(sent), len(failed)
+
+
+def requeue_stale_emails(stale_after_minutes=15):
+    """Return messages left in 'sending' by a crashed sender to the queue"""
+    cutoff = timezone.now() - timedelta(minutes=stale_after_minutes)
+    return OutboundEmail.objects.filter(status='sending', last_attempt_at__lt=cutoff).update(status='pending')
+
+
+def send_pending_emails(batch_size=None, max_batches=None):
+    """Send due messages batch by batch until the queue is drained; returns (sent, failed)"""
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    total_sent = total_failed = batches = 0
+    while max_batches is None or batches < max_batches:
+        emails = claim_due_emails(batch_size)
+        if not emails:
+            break
+        sent, failed = send_email_batch(emails)
+        total_sent += sent
+        total_failed += failed
+        batches += 1
+    return total_sent, total_failed
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from tasks.archive import ARCHIVE_MODELS, archive_logs, get_archive_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move task history and activity log rows past the retention window into monthly archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=None,
+            help='Keep this many days in the database (default: ARCHIVE_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--kind', action='append', choices=list(ARCHIVE_MODELS),
+            help='Only archive this table (may be repeated)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Rows fetched per database round trip'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many rows would be archived'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = get_archive_cutoff(options['retention_days'])
+        self.stdout.write(f'Archiving rows older than {cutoff:%Y-%m-%d}')
+
+        counts = archive_logs(
+            kinds=options['kind'],
+            retention_days=options['retention_days'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        for kind, count in counts.items():
+            self.stdout.write(f'{verb} {count} {kind} row(s)')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,165 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from importlib import import_module
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.models import User
+
+
+DEFAULT_PATHS = ['/dashboard/', '/tasks/', '/projects/']
+
+
+class Command(BaseCommand):
+    help = 'Compare sync and async view throughput under uvicorn with the same number of workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username the requests are made as')
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS, help='Paths requested in turn')
+        parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes for both runs')
+        parser.add_argument('--concurrency', type=int, default=8, help='Simultaneous client connections')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per run')
+        parser.add_argument(
+            '--modes', nargs='+', choices=['sync', 'async'], default=['sync', 'async'],
+            help='Which view implementations to run'
+        )
+
+    def handle(self, *args, **options):
+        if find_spec('uvicorn') is None:
+            raise CommandError('uvicorn is required: pip install uvicorn')
+
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist")
+
+        session = self.create_session(user)
+        try:
+            results = {}
+            for mode in options['modes']:
+                self.stdout.write(f'Running {mode} views ({options["workers"]} worker(s), '
+                                  f'{options["concurrency"]} connections, {options["duration"]:g}s)...')
+                results[mode] = self.run_mode(mode, session.session_key, options)
+                self.report(mode, results[mode])
+        finally:
+            session.delete()
+
+        if 'sync' in results and 'async' in results and results['sync']['rps']:
+            ratio = results['async']['rps'] / results['sync']['rps']
+            self.stdout.write(self.style.SUCCESS(f'async/sync throughput: {ratio:.2f}x'))
+
+    def create_session(self, user):
+        """Log the user in with a throwaway session"""
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session
+
+    def run_mode(self, mode, session_key, options):
+        port = self.free_port()
+        env = dict(os.environ, ASYNC_VIEWS=str(mode == 'async'), DEBUG='False')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'task_manager.asgi:application',
+             '--host', '127.0.0.1', '--port', str(port),
+             '--workers', str(options['workers']), '--log-level', 'warning', '--no-access-log'],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        try:
+            self.wait_for_server(port, session_key, options['paths'])
+            return self.load(port, session_key, options['paths'], options['concurrency'], options['duration'])
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def request(self, connection, path, session_key):
+        connection.request('GET', path, headers={'Cookie': f'sessionid={session_key}', 'Host': 'localhost'})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+
+    def wait_for_server(self, port, session_key, paths, timeout=30):
+        """Wait until the server answers, then warm every path once"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                for path in paths:
+                    status = self.request(connection, path, session_key)
+                    if status != 200:
+                        raise CommandError(f'{path} answered {status}; check --user and --paths')
+                connection.close()
+                return
+            except (ConnectionError, OSError):
+                if time.monotonic() > deadline:
+                    raise CommandError('uvicorn did not start')
+                time.sleep(0.2)
+
+    def load(self, port, session_key, paths, concurrency, duration):
+        """Keep `concurrency` connections busy for `duration` seconds"""
+        latencies, errors = [], []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            own_latencies, own_errors = [], 0
+            i = offset
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    status = self.request(connection, path, session_key)
+                except (ConnectionError, OSError, http.client.HTTPException):
+                    own_errors += 1
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                    continue
+                if status == 200:
+                    own_latencies.append(time.perf_counter() - started)
+                else:
+                    own_errors += 1
+            connection.close()
+            with lock:
+                latencies.extend(own_latencies)
+                errors.append(own_errors)
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': sum(errors),
+            'rps': len(latencies) / elapsed if elapsed else 0,
+            'p50': statistics.median(latencies) * 1000 if latencies else 0,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0,
+        }
+
+    def report(self, mode, result):
+        self.stdout.write(
+            f'  {mode:5}  {result["requests"]} requests, {result["errors"]} errors, '
+            f'{result["rps"]:.1f} req/s, p50 {result["p50"]:.1f} ms, p95 {result["p95"]:.1f} ms'
+        )
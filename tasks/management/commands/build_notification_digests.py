@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from tasks.notifications import build_notification_digests
+
+
+class Command(BaseCommand):
+    help = 'Fold pending notifications into one digest notification per user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-count', type=int, default=None,
+            help='Only build a digest for users with at least this many pending notifications '
+                 '(default: NOTIFICATION_DIGEST_MIN_COUNT)'
+        )
+
+    def handle(self, *args, **options):
+        digests = build_notification_digests(min_count=options['min_count'])
+        self.stdout.write(self.style.SUCCESS(f'Built {len(digests)} notification digest(s)'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from tasks.stats import rebuild_dashboard_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Drop all cached dashboard statistics and rebuild them from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='Only warm the cache for this username (can be repeated)'
+        )
+        parser.add_argument(
+            '--no-warm', action='store_true',
+            help='Only invalidate the cache, let entries rebuild on first read'
+        )
+
+    def handle(self, *args, **options):
+        if options['no_warm']:
+            rebuild_dashboard_stats()
+            self.stdout.write(self.style.SUCCESS('Dashboard statistics cache invalidated'))
+            return
+
+        users = User.objects.filter(is_active=True)
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        warmed = rebuild_dashboard_stats(users.iterator())
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt dashboard statistics for {warmed} user(s)'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from tasks.dependencies import closure_enabled, rebuild_dependency_paths
+
+
+class Command(BaseCommand):
+    help = 'Recreate the task dependency closure table from the dependency edges'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of closure rows inserted per batch'
+        )
+
+    def handle(self, *args, **options):
+        if not closure_enabled():
+            self.stdout.write(self.style.WARNING(
+                'DEPENDENCY_CLOSURE_TABLE is off; the table is rebuilt but will not be kept up to date'
+            ))
+
+        count = rebuild_dependency_paths(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} dependency path row(s)'))
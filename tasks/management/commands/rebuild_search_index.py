@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from tasks.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search index for tasks and projects'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of documents indexed per batch'
+        )
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'This database has no full-text search support; searches use icontains filters'
+            ))
+            return
+
+        counts = rebuild_index(batch_size=options['batch_size'])
+        for object_type, count in counts.items():
+            self.stdout.write(f'Indexed {count} {object_type}(s)')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
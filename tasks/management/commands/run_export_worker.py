@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from tasks.export_worker import init_worker, run_job
+from tasks.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Generate queued PDF/Excel report exports using a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of reports generated in parallel (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Seconds between checks for new jobs'
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=settings.EXPORT_JOB_STALE_MINUTES,
+            help='Requeue running jobs whose heartbeat is this many minutes old (left by a crashed worker)'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Process the jobs currently queued, then exit'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Export worker started with {workers} process(es)')
+
+        # Pool processes are spawned rather than forked so they never share
+        # this process's database connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        )
+        running = {}
+        last_heartbeat = time.monotonic()
+        try:
+            while True:
+                self.housekeeping(options['stale_after'])
+
+                # Jobs still in the pool are alive however long they take
+                if running and time.monotonic() - last_heartbeat >= settings.EXPORT_JOB_HEARTBEAT_SECONDS:
+                    ExportJob.record_heartbeats(running.values())
+                    last_heartbeat = time.monotonic()
+
+                for job in self.claim_jobs(workers - len(running)):
+                    running[pool.submit(run_job, job.pk)] = job.pk
+                    self.stdout.write(f'Started export job {job.pk}')
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _pending = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        # The pool process died before recording anything
+                        ExportJob.objects.filter(pk=job_id, status='running').update(
+                            status='failed', error=str(e), completed_at=timezone.now()
+                        )
+                        status = 'failed'
+                    self.stdout.write(f'Export job {job_id} {status}')
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping export worker')
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def claim_jobs(self, limit):
+        """Claim up to limit pending jobs, oldest first"""
+        if limit <= 0:
+            return []
+        candidates = ExportJob.objects.filter(status='pending').order_by('created_at')[:limit]
+        return [job for job in candidates if job.claim()]
+
+    def housekeeping(self, stale_after):
+        """Expire old result files and requeue jobs abandoned by a crashed worker"""
+        expired = ExportJob.purge_expired()
+        if expired:
+            self.stdout.write(f'Expired {expired} export file(s)')
+
+        requeued = ExportJob.requeue_stale(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale export job(s)'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.reminders import send_deadline_reminders
+
+
+class Command(BaseCommand):
+    help = 'Notify assignees of tasks coming due or overdue since the last sweep'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float, default=300.0,
+            help='Seconds between sweeps when running continuously'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Sweep up to now, then exit (for cron)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                for threshold, count in send_deadline_reminders().items():
+                    if count:
+                        self.stdout.write(f'Sent {count} {threshold} reminder(s)')
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping reminder scheduler')
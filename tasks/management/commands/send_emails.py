@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.mailer import queue_notification_emails, requeue_stale_emails, send_pending_emails
+from tasks.notifications import build_notification_digests
+
+
+class Command(BaseCommand):
+    help = 'Queue emails for new notifications and send the outbox over one reused connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+            help='Messages sent per connection'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=10.0,
+            help='Seconds between checks for new messages'
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=15,
+            help='Requeue messages left sending for this many minutes by a crashed sender'
+        )
+        parser.add_argument(
+            '--digest', action='store_true',
+            help='Fold pending notifications into digests before queueing emails'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Send the messages currently due, then exit'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Email sender started')
+        try:
+            while True:
+                requeued = requeue_stale_emails(options['stale_after'])
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale message(s)'))
+
+                if options['digest']:
+                    digests = build_notification_digests()
+                    if digests:
+                        self.stdout.write(f'Built {len(digests)} digest(s)')
+
+                queued = queue_notification_emails()
+                if queued:
+                    self.stdout.write(f'Queued {queued} notification email(s)')
+
+                sent, failed = send_pending_emails(options['batch_size'])
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} message(s), {failed} failed')
+
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping email sender')
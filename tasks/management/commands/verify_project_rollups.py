@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from tasks.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Verify denormalized project task counters against the task table and optionally repair them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Write corrected counters for projects that have drifted'
+        )
+        parser.add_argument(
+            '--project', type=int, action='append', dest='project_ids',
+            help='Only check this project id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        drifted = Project.sync_task_rollups(
+            project_ids=options['project_ids'],
+            repair=options['repair']
+        )
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All project task counters are in sync'))
+            return
+
+        for project in drifted:
+            counters = ', '.join(f'{field}={getattr(project, field)}' for field in Project.ROLLUP_FIELDS)
+            self.stdout.write(f'Project {project.pk}: expected {counters}')
+
+        if options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired counters for {len(drifted)} project(s)'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drifted)} project(s) out of sync, run again with --repair to fix'
+            ))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:58
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_task_rollups(apps, schema_editor):
+    Project = apps.get_model('tasks', 'Project')
+    Task = apps.get_model('tasks', 'Task')
+    rows = Task.objects.filter(project__isnull=False).order_by().values('project_id').annotate(
+        task_count=Count('pk'),
+        completed_task_count=Count('pk', filter=Q(status='completed')),
+        active_task_count=Count('pk', filter=~Q(status__in=['completed', 'cancelled'])),
+    )
+    for row in rows:
+        Project.objects.filter(pk=row.pop('project_id')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='active_task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='completed_task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_task_rollups, migrations.RunPython.noop),
+    ]
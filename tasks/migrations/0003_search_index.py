@@ -0,0 +1,134 @@
+import html
+
+from django.conf import settings
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+# A frozen copy of the index schema and documents as of this migration, so
+# later changes to tasks.search cannot change what it does. Installs created
+# before a later schema change are brought up to date by
+# `python manage.py rebuild_search_index`.
+
+SEARCH_TABLE = 'tasks_search_index'
+BATCH_SIZE = 500
+
+
+def _clean_text(value):
+    return html.unescape(strip_tags(value or ''))
+
+
+def _person_names(user):
+    return ' '.join(filter(None, [user.username, user.first_name, user.last_name]))
+
+
+def _task_documents(apps, using, task_ids):
+    Task = apps.get_model('tasks', 'Task')
+    Comment = apps.get_model('tasks', 'Comment')
+    comments = {}
+    for task_id, content in Comment.objects.using(using).filter(
+        task_id__in=task_ids, is_internal=False
+    ).values_list('task_id', 'content'):
+        comments.setdefault(task_id, []).append(_clean_text(content))
+
+    for task in Task.objects.using(using).filter(id__in=task_ids).prefetch_related('assigned_to'):
+        tags = [tag.strip() for tag in (task.tags or '').split(',') if tag.strip()]
+        yield task.id, (
+            task.title,
+            _clean_text(task.description),
+            ' '.join(tags),
+            ' '.join(comments.get(task.id, [])),
+            ' '.join(_person_names(user) for user in task.assigned_to.all()),
+        )
+
+
+def _project_documents(apps, using, project_ids):
+    Project = apps.get_model('tasks', 'Project')
+    projects = Project.objects.using(using).filter(id__in=project_ids).select_related('division', 'assigned_to_admin')
+    for project in projects:
+        yield project.id, (
+            project.title,
+            _clean_text(project.description),
+            project.division.name if project.division else '',
+            '',
+            _person_names(project.assigned_to_admin) if project.assigned_to_admin else '',
+        )
+
+
+def _insert_sqlite(cursor, object_type, documents):
+    # rowid = object_id * 2 + type code, as the search backend expects
+    type_code = {'task': 0, 'project': 1}[object_type]
+    cursor.executemany(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, object_type, object_id, title, body, tags, comments, people) '
+        'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+        [(object_id * 2 + type_code, object_type, object_id, *doc) for object_id, doc in documents]
+    )
+
+
+def _insert_postgresql(cursor, object_type, documents):
+    config = getattr(settings, 'SEARCH_CONFIG', 'english')
+    cursor.executemany(
+        f'INSERT INTO {SEARCH_TABLE} (object_type, object_id, document) VALUES (%s, %s, '
+        "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'C') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'D'))",
+        [
+            (object_type, object_id, config, title, config, tags, config, body, config, f'{comments} {people}')
+            for object_id, (title, body, tags, comments, people) in documents
+        ]
+    )
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        statements = [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            'object_type UNINDEXED, object_id UNINDEXED, '
+            'title, body, tags, comments, people, '
+            "tokenize = 'porter unicode61 remove_diacritics 2')"
+        ]
+        insert = _insert_sqlite
+    elif connection.vendor == 'postgresql':
+        statements = [
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            'object_type varchar(20) NOT NULL, '
+            'object_id bigint NOT NULL, '
+            'document tsvector NOT NULL, '
+            'PRIMARY KEY (object_type, object_id))',
+            f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin ON {SEARCH_TABLE} USING GIN (document)',
+        ]
+        insert = _insert_postgresql
+    else:
+        # Other backends search with icontains filters
+        return
+
+    using = connection.alias
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+        for object_type, model_name, build in [
+            ('task', 'Task', _task_documents),
+            ('project', 'Project', _project_documents),
+        ]:
+            ids = list(apps.get_model('tasks', model_name).objects.using(using).order_by('pk').values_list('pk', flat=True))
+            for start in range(0, len(ids), BATCH_SIZE):
+                insert(cursor, object_type, list(build(apps, using, ids[start:start + BATCH_SIZE])))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_project_task_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
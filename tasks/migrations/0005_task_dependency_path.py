@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_dependency_paths(apps, schema_editor):
+    from tasks.dependencies import build_dependency_paths
+    Task = apps.get_model('tasks', 'Task')
+    TaskDependencyPath = apps.get_model('tasks', 'TaskDependencyPath')
+    edges = Task.depends_on.through.objects.values_list('from_task_id', 'to_task_id')
+    TaskDependencyPath.objects.bulk_create([
+        TaskDependencyPath(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth, path_count=count)
+        for ancestor_id, descendant_id, depth, count in build_dependency_paths(edges)
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_export_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskDependencyPath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('path_count', models.PositiveBigIntegerField(default=1)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_paths', to='tasks.task')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_paths', to='tasks.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'ancestor'], name='tasks_taskd_descend_5a8680_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant', 'depth'), name='unique_task_dependency_path')],
+            },
+        ),
+        migrations.RunPython(populate_dependency_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_dependency_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('task_history', 'Task history'), ('activity_log', 'Activity log')], max_length=20)),
+                ('month', models.DateField(help_text='First day of the archived month')),
+                ('file', models.FileField(upload_to='archive/')),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-month', '-id'],
+                'indexes': [models.Index(fields=['kind', 'month'], name='tasks_archi_kind_57773f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_archive_segment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('task_assigned', 'Task Assigned'), ('task_completed', 'Task Completed'), ('task_overdue', 'Task Overdue'), ('task_comment', 'Task Comment'), ('project_assigned', 'Project Assigned'), ('project_update', 'Project Update'), ('file_uploaded', 'File Uploaded'), ('mention', 'Mentioned in Comment'), ('deadline_reminder', 'Deadline Reminder'), ('digest', 'Notification Digest'), ('system', 'System Notification')], max_length=20),
+        ),
+    ]
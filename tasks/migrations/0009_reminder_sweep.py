@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_outbound_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderSweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.CharField(max_length=50, unique=True)),
+                ('swept_until', models.DateTimeField(help_text='Tasks whose reminder time is up to this moment were handled')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:58
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_heartbeats(apps, schema_editor):
+    # Jobs running during the upgrade count as alive since they started
+    ExportJob = apps.get_model('tasks', 'ExportJob')
+    ExportJob.objects.filter(status='running').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_reminder_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Refreshed by the export worker while the job runs', null=True),
+        ),
+        migrations.RunPython(start_heartbeats, migrations.RunPython.noop),
+    ]
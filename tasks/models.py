@@ -1,8 +1,9 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
 import os
 from datetime import timedelta
 from tinymce.models import HTMLField
@@ -97,9 +98,28 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Name fields copied into the search documents of the user's tasks and projects
+    SEARCH_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
     def __str__(self):
         return f"{self.username} ({self.get_full_name()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored names so saves can tell whether the search index needs them
+        instance._loaded_names = {
+            name: value for name, value in zip(field_names, values) if name in cls.SEARCH_NAME_FIELDS
+        }
+        return instance
+
+    def search_names_changed(self):
+        """Check if a name shown in search results differs from the stored one"""
+        loaded = getattr(self, '_loaded_names', None)
+        if loaded is None or len(loaded) < len(self.SEARCH_NAME_FIELDS):
+            return True
+        return any(getattr(self, name) != value for name, value in loaded.items())
+
     def is_admin(self):
         """Check if user is admin or super_admin"""
         return self.role in ['admin', 'super_admin']
@@ -234,6 +254,11 @@ class Project(models.Model):
         help_text="Actual budget spent"
     )
     
+    # Denormalized task rollups, kept in sync by Task.save() and task deletes
+    task_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_task_count = models.PositiveIntegerField(default=0, editable=False)
+    active_task_count = models.PositiveIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -274,18 +299,75 @@ class Project(models.Model):
             
         return final_code
 
-    # ... rest of your methods remain exactly the same ...
+    @staticmethod
+    def get_task_rollup_fields(status):
+        """Get the rollup counter fields a task with this status contributes to"""
+        fields = ['task_count']
+        if status == 'completed':
+            fields.append('completed_task_count')
+        if status not in Task.INACTIVE_STATUSES:
+            fields.append('active_task_count')
+        return fields
+
+    @classmethod
+    def adjust_task_rollups(cls, project_id, status, delta):
+        """Add delta (+1/-1) to the rollup counters of a project for one task"""
+        if not project_id:
+            return
+        cls.objects.filter(pk=project_id).update(**{
+            field: F(field) + delta for field in cls.get_task_rollup_fields(status)
+        })
+
+    @classmethod
+    def compute_task_rollups(cls, project_ids=None):
+        """Recompute rollup counters from the task table, keyed by project id"""
+        tasks = Task.objects.filter(project__isnull=False)
+        if project_ids is not None:
+            tasks = tasks.filter(project_id__in=project_ids)
+        rows = tasks.order_by().values('project_id').annotate(
+            task_count=Count('pk'),
+            completed_task_count=Count('pk', filter=Q(status='completed')),
+            active_task_count=Count('pk', filter=~Q(status__in=Task.INACTIVE_STATUSES)),
+        )
+        return {row.pop('project_id'): row for row in rows}
+
+    @classmethod
+    def sync_task_rollups(cls, project_ids=None, repair=True):
+        """
+        Compare stored rollup counters with the task table.
+
+        Returns the list of projects whose counters had drifted; with
+        ``repair`` they are corrected in a single bulk update.
+        """
+        expected = cls.compute_task_rollups(project_ids)
+        projects = cls.objects.only('pk', *cls.ROLLUP_FIELDS)
+        if project_ids is not None:
+            projects = projects.filter(pk__in=project_ids)
+
+        empty = dict.fromkeys(cls.ROLLUP_FIELDS, 0)
+        drifted = []
+        for project in projects.iterator():
+            counts = expected.get(project.pk, empty)
+            if any(getattr(project, field) != counts[field] for field in cls.ROLLUP_FIELDS):
+                for field in cls.ROLLUP_FIELDS:
+                    setattr(project, field, counts[field])
+                drifted.append(project)
+
+        if repair and drifted:
+            cls.objects.bulk_update(drifted, cls.ROLLUP_FIELDS, batch_size=500)
+        return drifted
+
     def get_task_count(self):
         """Get total number of tasks in this project"""
-        return self.tasks.count()
+        return self.task_count
 
     def get_completed_task_count(self):
         """Get number of completed tasks in this project"""
-        return self.tasks.filter(status='completed').count()
+        return self.completed_task_count
 
     def get_active_tasks_count(self):
         """Get count of non-completed tasks"""
-        return self.tasks.exclude(status__in=['completed', 'cancelled']).count()
+        return self.active_task_count
 
     def get_overdue_tasks_count(self):
         """Get count of overdue tasks"""
@@ -325,12 +407,12 @@ class Project(models.Model):
         return delta.days
 
     def get_recent_activity(self, days=7):
-        """Get recent task activities in this project"""
+        """Get recent task activities in this project, including archived ones"""
+        # Imported lazily: the archive module imports these models
+        from .archive import get_records
         recent_date = timezone.now() - timedelta(days=days)
-        return TaskHistory.objects.filter(
-            task__project=self,
-            timestamp__gte=recent_date
-        ).select_related('user', 'task').order_by('-timestamp')[:10]
+        task_ids = list(self.tasks.values_list('id', flat=True))
+        return get_records('task_history', {'task_id__in': task_ids}, since=recent_date, limit=10)
 
     def get_budget_utilization(self):
         """Get budget utilization percentage"""
@@ -363,6 +445,8 @@ class Project(models.Model):
         }
         return priority_classes.get(self.priority, 'bg-secondary')
 
+    ROLLUP_FIELDS = ['task_count', 'completed_task_count', 'active_task_count']
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -493,6 +577,9 @@ class Task(models.Model):
         ('urgent', 'Urgent'),
     ]
 
+    # Statuses that no longer count as active work
+    INACTIVE_STATUSES = ['completed', 'cancelled']
+
     title = models.CharField(max_length=200)
     description = HTMLField(
         help_text="Task description with formatting options",
@@ -553,6 +640,20 @@ class Task(models.Model):
     def __str__(self):
         return f"{self.title} - {self.get_status_display()}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored state so save() can tell what actually changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_loaded_value(self, field_name):
+        """Get a field's value as last loaded from or saved to the database"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or field_name not in loaded:
+            return getattr(self, field_name)
+        return loaded[field_name]
+
     def save(self, *args, **kwargs):
         # Auto-set completed_at when status changes to completed
         if self.status == 'completed' and not self.completed_at:
@@ -562,37 +663,85 @@ class Task(models.Model):
             self.completed_at = None
             if self.progress_percentage == 100:
                 self.progress_percentage = 0
-        super().save(*args, **kwargs)
+
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        rollup_tracked = update_fields is None or bool({'status', 'project', 'project_id'} & set(update_fields))
+        old_project_id = self.get_loaded_value('project_id')
+        old_status = self.get_loaded_value('status')
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Keep project rollup counters in step within the same transaction
+            if adding:
+                Project.adjust_task_rollups(self.project_id, self.status, 1)
+            elif rollup_tracked and (old_project_id, old_status) != (self.project_id, self.status):
+                Project.adjust_task_rollups(old_project_id, old_status, -1)
+                Project.adjust_task_rollups(self.project_id, self.status, 1)
+
+        loaded = getattr(self, '_loaded_values', None) or {}
+        for field in self._meta.concrete_fields:
+            if update_fields is None or field.name in update_fields or field.attname in update_fields:
+                loaded[field.attname] = getattr(self, field.attname)
+        self._loaded_values = loaded
+
+    def get_prefetched_assignees(self):
+        """Get assignees loaded by prefetch_related('assigned_to'), or None"""
+        cache = getattr(self, '_prefetched_objects_cache', {})
+        if 'assigned_to' in cache:
+            return list(cache['assigned_to'])
+        return None
+
+    def cache_assignment(self, user, is_assigned):
+        """Remember whether a user is assigned so later checks skip the query"""
+        if not hasattr(self, '_assignment_cache'):
+            self._assignment_cache = {}
+        self._assignment_cache[user.pk] = is_assigned
 
     def get_assignees_display(self):
         """Get a string of all assigned users"""
-        assignees = self.assigned_to.all()
-        if not assignees.exists():
+        assignees = self.get_prefetched_assignees()
+        if assignees is None:
+            assignees = list(self.assigned_to.all())
+        if not assignees:
             return "No assignees"
         
-        if assignees.count() <= 2:
+        if len(assignees) <= 2:
             return ", ".join([user.get_display_name() for user in assignees])
         else:
-            first_two = list(assignees[:2])
-            names = [user.get_display_name() for user in first_two]
-            remaining = assignees.count() - 2
+            names = [user.get_display_name() for user in assignees[:2]]
+            remaining = len(assignees) - 2
             return f"{', '.join(names)} +{remaining} more"
 
     def is_assigned_to_user(self, user):
         """Check if a specific user is assigned to this task"""
-        return self.assigned_to.filter(id=user.id).exists()
+        cached = getattr(self, '_assignment_cache', {})
+        if user.pk in cached:
+            return cached[user.pk]
+
+        assignees = self.get_prefetched_assignees()
+        if assignees is not None:
+            is_assigned = any(assignee.pk == user.pk for assignee in assignees)
+        else:
+            is_assigned = self.assigned_to.filter(id=user.id).exists()
+        self.cache_assignment(user, is_assigned)
+        return is_assigned
 
     def get_assignee_count(self):
         """Get the number of assigned users"""
+        assignees = self.get_prefetched_assignees()
+        if assignees is not None:
+            return len(assignees)
         return self.assigned_to.count()
 
     def is_collaborative(self):
         """Check if this is a collaborative task (multiple assignees)"""
-        return self.assigned_to.count() > 1
+        return self.get_assignee_count() > 1
 
     def get_collaboration_level(self):
         """Get collaboration level description"""
-        count = self.assigned_to.count()
+        count = self.get_assignee_count()
         if count == 1:
             return "Individual Task"
         elif count <= 3:
@@ -604,15 +753,17 @@ class Task(models.Model):
 
     def get_assignee_avatars_html(self):
         """Get HTML for displaying assignee avatars"""
-        assignees = self.assigned_to.all()[:3]  # Show max 3 avatars
+        assignees = self.get_prefetched_assignees()
+        if assignees is None:
+            assignees = list(self.assigned_to.all())
         html_parts = []
         
-        for user in assignees:
+        for user in assignees[:3]:  # Show max 3 avatars
             initial = user.get_display_name()[0].upper()
             html_parts.append(f'<span class="user-avatar" title="{user.get_display_name()}">{initial}</span>')
         
-        if self.assigned_to.count() > 3:
-            remaining = self.assigned_to.count() - 3
+        if len(assignees) > 3:
+            remaining = len(assignees) - 3
             html_parts.append(f'<span class="user-avatar-more">+{remaining}</span>')
         
         return ''.join(html_parts)
@@ -633,17 +784,23 @@ class Task(models.Model):
 
     def can_start(self):
         """Check if task can start (all dependencies completed)"""
-        if not self.depends_on.exists():
-            return True
         return not self.depends_on.exclude(status='completed').exists()
 
-    def get_blocking_dependencies(self):
-        """Get list of incomplete dependencies"""
+    def get_blocking_dependencies(self, transitive=False):
+        """Get incomplete dependencies, optionally including indirect ones"""
+        if transitive:
+            from .dependencies import get_upstream_ids
+            return Task.objects.filter(id__in=get_upstream_ids([self.pk])).exclude(status='completed')
         return self.depends_on.exclude(status='completed')
 
-    def get_dependent_tasks(self):
-        """Get tasks that depend on this task"""
-        return self.dependent_tasks.exclude(status__in=['completed', 'cancelled'])
+    def get_dependent_tasks(self, transitive=False):
+        """Get active tasks that depend on this task, optionally including indirect ones"""
+        if transitive:
+            from .dependencies import get_downstream_ids
+            tasks = Task.objects.filter(id__in=get_downstream_ids([self.pk]))
+        else:
+            tasks = self.dependent_tasks.all()
+        return tasks.exclude(status__in=['completed', 'cancelled'])
 
     def get_effort_variance(self):
         """Get variance between estimated and actual hours"""
@@ -672,7 +829,7 @@ class Task(models.Model):
         """Check if user can edit this task"""
         return (
             user.is_admin() or 
-            self.created_by == user or 
+            self.created_by_id == user.pk or 
             self.is_assigned_to_user(user)
         )
 
@@ -708,6 +865,31 @@ class Task(models.Model):
         ]
 
 
+class TaskDependencyPath(models.Model):
+    """
+    Materialized transitive closure of ``Task.depends_on``.
+
+    One row per (ancestor, descendant, depth): the descendant depends on the
+    ancestor through ``path_count`` distinct chains of ``depth`` edges. Counting
+    paths lets edges be added and removed incrementally (see dependencies.py).
+    """
+    ancestor = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='descendant_paths')
+    descendant = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='ancestor_paths')
+    depth = models.PositiveIntegerField()
+    path_count = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"#{self.descendant_id} depends on #{self.ancestor_id} (depth {self.depth})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant', 'depth'], name='unique_task_dependency_path'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'ancestor']),
+        ]
+
+
 class TaskAttachment(models.Model):
     """Model for task file attachments"""
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='attachments')
@@ -870,6 +1052,33 @@ class Comment(models.Model):
         """Check if this is a reply to another comment"""
         return self.parent is not None
 
+    @classmethod
+    def get_latest_public(cls, task_ids):
+        """Get the newest public comment of each task, keyed by task id, in one query"""
+        task_ids = set(task_ids)
+        if not task_ids:
+            return {}
+
+        latest = cls.objects.filter(task_id__in=task_ids, is_internal=False).annotate(
+            recency=Window(
+                RowNumber(),
+                partition_by=[F('task_id')],
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        ).filter(recency=1).select_related('user')
+        return {comment.task_id: comment for comment in latest}
+
+    @classmethod
+    def attach_latest_public(cls, tasks, statuses=('in_progress',)):
+        """
+        Set ``latest_comment`` on each task whose status is in statuses (None
+        on the others) using a single query. Returns the tasks.
+        """
+        latest = cls.get_latest_public(task.pk for task in tasks if task.status in statuses)
+        for task in tasks:
+            task.latest_comment = latest.get(task.pk)
+        return tasks
+
     class Meta:
         ordering = ['-is_pinned', '-created_at']
         indexes = [
@@ -894,8 +1103,12 @@ class Notification(models.Model):
         ('file_uploaded', 'File Uploaded'),
         ('mention', 'Mentioned in Comment'),
         ('deadline_reminder', 'Deadline Reminder'),
+        ('digest', 'Notification Digest'),
         ('system', 'System Notification'),
     ]
+    # Fields read by resolve_related_objects()
+    RELATED_TYPE_FIELD = 'related_object_type'
+    RELATED_ID_FIELD = 'related_object_id'
 
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sent_notifications')
@@ -918,28 +1131,16 @@ class Notification(models.Model):
     def mark_as_read(self):
         """Mark notification as read"""
         if not self.is_read:
+            from .notifications import adjust_unread_counts
             self.is_read = True
             self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+            # Conditional UPDATE so a concurrent read is only counted once
+            if Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True, read_at=self.read_at):
+                adjust_unread_counts([self.recipient_id], -1)
 
     def get_related_object(self):
         """Get the related object (task, project, etc.)"""
-        if not self.related_object_type or not self.related_object_id:
-            return None
-        
-        model_map = {
-            'task': Task,
-            'project': Project,
-            'comment': Comment,
-        }
-        
-        model_class = model_map.get(self.related_object_type)
-        if model_class:
-            try:
-                return model_class.objects.get(id=self.related_object_id)
-            except model_class.DoesNotExist:
-                return None
-        return None
+        return get_related_object(self)
 
     def get_notification_icon(self):
         """Get icon class for notification type"""
@@ -953,6 +1154,7 @@ class Notification(models.Model):
             'file_uploaded': 'fas fa-file-upload text-warning',
             'mention': 'fas fa-at text-purple',
             'deadline_reminder': 'fas fa-clock text-warning',
+            'digest': 'fas fa-inbox text-primary',
             'system': 'fas fa-cog text-muted',
         }
         return icon_map.get(self.notification_type, 'fas fa-bell text-muted')
@@ -965,6 +1167,51 @@ class Notification(models.Model):
         ]
 
 
+class OutboundEmail(models.Model):
+    """An email waiting in the outbox for the background sender (`manage.py send_emails`)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    notification = models.OneToOneField(
+        Notification, on_delete=models.SET_NULL, null=True, blank=True, related_name='email'
+    )
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.get_status_display()})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+
+class ReminderSweep(models.Model):
+    """High-water mark of the deadline reminder scheduler, one row per reminder threshold"""
+    threshold = models.CharField(max_length=50, unique=True)
+    swept_until = models.DateTimeField(help_text="Tasks whose reminder time is up to this moment were handled")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.threshold} swept until {self.swept_until}"
+
+
 # ----------------------------
 # Activity Log for Better Tracking
 # ----------------------------
@@ -984,6 +1231,9 @@ class ActivityLog(models.Model):
         ('complete', 'Complete'),
         ('comment', 'Comment'),
     ]
+    # Fields read by resolve_related_objects()
+    RELATED_TYPE_FIELD = 'object_type'
+    RELATED_ID_FIELD = 'object_id'
 
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     action = models.CharField(max_length=20, choices=ACTION_TYPES)
@@ -1022,6 +1272,10 @@ class ActivityLog(models.Model):
         }
         return icon_map.get(self.action, 'fas fa-history text-muted')
 
+    def get_related_object(self):
+        """Get the object the activity was about, if it still exists"""
+        return get_related_object(self)
+
     class Meta:
         ordering = ['-timestamp']
         indexes = [
@@ -1031,6 +1285,55 @@ class ActivityLog(models.Model):
         ]
 
 
+# ----------------------------
+# Generic relations (Notification.related_object_*, ActivityLog.object_*)
+# ----------------------------
+
+RELATED_OBJECT_MODELS = {
+    'task': Task,
+    'project': Project,
+    'comment': Comment,
+    'projectfile': ProjectFile,
+    'user': User,
+    'division': Division,
+}
+
+
+def resolve_related_objects(items):
+    """
+    Attach the related object of every notification/activity log in one query per type.
+
+    Items are grouped by their type field and each group is fetched with a
+    single ``in_bulk``, so a page of any size costs at most one query per
+    object type. ``get_related_object()`` then answers from memory (None
+    for deleted objects and unknown types). Returns the items.
+    """
+    items = list(items)
+    ids_by_type = {}
+    for item in items:
+        object_type = getattr(item, item.RELATED_TYPE_FIELD)
+        object_id = getattr(item, item.RELATED_ID_FIELD)
+        if object_type in RELATED_OBJECT_MODELS and object_id:
+            ids_by_type.setdefault(object_type, set()).add(object_id)
+
+    objects = {
+        object_type: RELATED_OBJECT_MODELS[object_type].objects.in_bulk(ids)
+        for object_type, ids in ids_by_type.items()
+    }
+    for item in items:
+        item._related_object = objects.get(getattr(item, item.RELATED_TYPE_FIELD), {}).get(
+            getattr(item, item.RELATED_ID_FIELD)
+        )
+    return items
+
+
+def get_related_object(item):
+    """Get the related object of one notification/activity log, using the batch-resolved one if present"""
+    if not hasattr(item, '_related_object'):
+        resolve_related_objects([item])
+    return item._related_object
+
+
 # ----------------------------
 # Task Templates for Reusability
 # ----------------------------
@@ -1151,57 +1454,236 @@ class TimeEntry(models.Model):
         ]
 
 
+# ----------------------------
+# Background Report Exports
+# ----------------------------
+
+class ExportJob(models.Model):
+    """A PDF or Excel report generated off the request path by the export worker"""
+    FORMAT_CHOICES = [
+        ('excel', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ]
+
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    query_string = models.TextField(blank=True, help_text="Report filters as submitted")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    file = models.FileField(upload_to='exports/', blank=True)
+    row_count = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(
+        null=True, blank=True, help_text="Refreshed by the export worker while the job runs"
+    )
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_export_format_display()} export #{self.pk} ({self.get_status_display()})"
+
+    def claim(self):
+        """
+        Move a pending job to running; returns False if another worker got it first.
+
+        A conditional UPDATE is atomic on every backend, so no row locks are needed.
+        """
+        started_at = timezone.now()
+        claimed = ExportJob.objects.filter(pk=self.pk, status='pending').update(
+            status='running', started_at=started_at, heartbeat_at=started_at
+        )
+        if claimed:
+            self.status = 'running'
+            self.started_at = self.heartbeat_at = started_at
+        return bool(claimed)
+
+    def is_finished(self):
+        """Check if the worker is done with this job"""
+        return self.status in ['completed', 'failed', 'expired']
+
+    def is_downloadable(self):
+        """Check if the result file can still be downloaded"""
+        return (
+            self.status == 'completed' and bool(self.file) and
+            (self.expires_at is None or self.expires_at > timezone.now())
+        )
+
+    def get_filename(self):
+        """Get the download filename for the result file"""
+        extension = 'xlsx' if self.export_format == 'excel' else 'pdf'
+        return f'tasks_report_{timezone.localtime(self.created_at).strftime("%Y%m%d_%H%M%S")}.{extension}'
+
+    def get_status_badge_class(self):
+        """Get CSS class for status badge"""
+        status_classes = {
+            'pending': 'bg-secondary',
+            'running': 'bg-info',
+            'completed': 'bg-success',
+            'failed': 'bg-danger',
+            'expired': 'bg-dark',
+        }
+        return status_classes.get(self.status, 'bg-secondary')
+
+    @classmethod
+    def purge_expired(cls, now=None):
+        """Delete result files past their expiry and mark the jobs expired; returns the count"""
+        now = now or timezone.now()
+        expired = list(cls.objects.filter(status='completed', expires_at__lte=now))
+        for job in expired:
+            if job.file:
+                job.file.delete(save=False)
+        return cls.objects.filter(pk__in=[job.pk for job in expired]).update(status='expired', file='')
+
+    @classmethod
+    def record_heartbeats(cls, job_ids, now=None):
+        """Mark running jobs as still being worked on"""
+        return cls.objects.filter(pk__in=job_ids, status='running').update(heartbeat_at=now or timezone.now())
+
+    @classmethod
+    def requeue_stale(cls, stale_after_minutes, now=None):
+        """
+        Requeue running jobs whose worker stopped sending heartbeats; returns the count.
+
+        Long exports keep their heartbeat fresh, so only jobs abandoned by a
+        crashed or killed worker are picked up again.
+        """
+        cutoff = (now or timezone.now()) - timedelta(minutes=stale_after_minutes)
+        return cls.objects.filter(status='running', heartbeat_at__lt=cutoff).update(
+            status='pending', started_at=None, heartbeat_at=None
+        )
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['requested_by', 'created_at']),
+        ]
+
+
+# ----------------------------
+# Log Archive
+# ----------------------------
+
+class ArchiveSegment(models.Model):
+    """A month of TaskHistory or ActivityLog rows moved out of the hot table into a gzipped JSONL file"""
+    KIND_CHOICES = [
+        ('task_history', 'Task history'),
+        ('activity_log', 'Activity log'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    month = models.DateField(help_text="First day of the archived month")
+    file = models.FileField(upload_to='archive/')
+    row_count = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.month:%Y-%m} ({self.row_count} rows)"
+
+    class Meta:
+        ordering = ['-month', '-id']
+        indexes = [
+            models.Index(fields=['kind', 'month']),
+        ]
+
+
 # ----------------------------
 # Helper Functions for Dashboard Stats
 # ----------------------------
 
 def get_dashboard_stats(user):
-    """Get comprehensive dashboard statistics for a user"""
-    from django.db.models import Count, Sum, Avg, Q
+    """Get comprehensive dashboard statistics for a user (served from the stats cache)"""
+    from .stats import get_cached_dashboard_stats
+    return get_cached_dashboard_stats(user)
+
+
+def compute_dashboard_stats(user):
+    """Compute comprehensive dashboard statistics for a user straight from the database"""
+    from django.db.models import Count, Avg, Q
     from django.utils import timezone
     from datetime import timedelta
+    from .stats import get_task_stats, overdue_q
     
     now = timezone.now()
     week_start = now - timedelta(days=7)
     month_start = now - timedelta(days=30)
+    open_statuses = ['pending', 'in_progress']
     
     # Base task querysets
     if user.is_super_admin():
         all_tasks = Task.objects.all()
         all_projects = Project.objects.all()
     elif user.is_admin():
-        all_tasks = Task.objects.filter(division=user.division)
-        all_projects = Project.objects.filter(division=user.division)
+        all_tasks = Task.objects.filter(division_id=user.division_id)
+        all_projects = Project.objects.filter(division_id=user.division_id)
     else:
         all_tasks = user.assigned_tasks.all()
         all_projects = user.get_my_projects()
 
     my_tasks = user.assigned_tasks.all()
     
+    # Personal task buckets and productivity figures in a single pass
+    my_stats = my_tasks.order_by().aggregate(
+        total=Count('pk'),
+        pending=Count('pk', filter=Q(status='pending')),
+        in_progress=Count('pk', filter=Q(status='in_progress')),
+        completed_this_week=Count('pk', filter=Q(status='completed', completed_at__gte=week_start)),
+        overdue=Count('pk', filter=overdue_q(now)),
+        due_this_week=Count('pk', filter=Q(
+            due_date__gte=now,
+            due_date__lte=now + timedelta(days=7),
+            status__in=open_statuses
+        )),
+        created_this_month=Count('pk', filter=Q(created_at__range=[month_start, now])),
+        completed_this_month=Count('pk', filter=Q(created_at__range=[month_start, now], status='completed')),
+        avg_task_duration=Avg('actual_hours', filter=Q(status='completed', actual_hours__isnull=False)),
+    )
+    
+    project_stats = all_projects.order_by().aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(status='active')),
+    )
+    if user.is_admin():
+        my_projects_count = user.get_my_projects().count()
+    else:
+        # Regular users' visible projects are exactly their own projects
+        my_projects_count = project_stats['total']
+    
+    completion_rate = 0
+    if my_stats['created_this_month']:
+        completion_rate = round((my_stats['completed_this_month'] / my_stats['created_this_month']) * 100, 1)
+    
+    # Status buckets of every task the user can see (the dashboard counters)
+    task_stats = get_task_stats(all_tasks, now=now)
+
     stats = {
+        'tasks': task_stats,
         'my_tasks': {
-            'total': my_tasks.count(),
-            'pending': my_tasks.filter(status='pending').count(),
-            'in_progress': my_tasks.filter(status='in_progress').count(),
-            'completed_this_week': my_tasks.filter(
-                status='completed',
-                completed_at__gte=week_start
-            ).count(),
-            'overdue': my_tasks.filter(
-                due_date__lt=now,
-                status__in=['pending', 'in_progress']
-            ).count(),
-            'due_this_week': my_tasks.filter(
-                due_date__gte=now,
-                due_date__lte=now + timedelta(days=7),
-                status__in=['pending', 'in_progress']
-            ).count(),
+            'total': my_stats['total'],
+            'pending': my_stats['pending'],
+            'in_progress': my_stats['in_progress'],
+            'completed_this_week': my_stats['completed_this_week'],
+            'overdue': my_stats['overdue'],
+            'due_this_week': my_stats['due_this_week'],
         },
         'projects': {
-            'total': all_projects.count(),
-            'my_projects': user.get_my_projects().count(),
+            'total': project_stats['total'],
+            'my_projects': my_projects_count,
             'managed': user.get_managed_projects().count() if user.is_admin() else 0,
-            'active': all_projects.filter(status='active').count(),
+            'active': project_stats['active'],
         },
         'collaboration': {
             'collaborative_tasks': my_tasks.annotate(
@@ -1212,27 +1694,21 @@ def get_dashboard_stats(user):
             ).exclude(id=user.id).distinct().count(),
         },
         'productivity': {
-            'completion_rate': user.get_completion_rate(30),
-            'avg_task_duration': my_tasks.filter(
-                status='completed',
-                actual_hours__isnull=False
-            ).aggregate(avg=Avg('actual_hours'))['avg'] or 0,
+            'completion_rate': completion_rate,
+            'avg_task_duration': my_stats['avg_task_duration'] or 0,
         }
     }
     
     # Admin-specific stats
     if user.is_admin():
         stats['admin'] = {
-            'total_tasks': all_tasks.count(),
-            'total_projects': all_projects.count(),
+            'total_tasks': task_stats['total'],
+            'total_projects': project_stats['total'],
             'pending_approvals': User.objects.filter(
                 is_active=False,
-                division=user.division if not user.is_super_admin() else None
-            ).count(),
-            'overdue_tasks': all_tasks.filter(
-                due_date__lt=now,
-                status__in=['pending', 'in_progress']
+                division_id=user.division_id if not user.is_super_admin() else None
             ).count(),
+            'overdue_tasks': task_stats['overdue'],
         }
     
     return stats
@@ -0,0 +1,341 @@
+"""
+Notification fan-out.
+
+``notify()`` turns one event into ``Notification`` rows for every recipient
+with a single ``bulk_create``. Recipients are de-duplicated, the acting user
+is left out, and anyone who already has an unread notification for the same
+event (type + related object) from the last ``NOTIFICATION_COALESCE_MINUTES``
+is skipped, so bursts of edits do not flood inboxes. ``notify_many()`` does
+the same for a batch of events in one query.
+
+The ``notify_*`` helpers compute recipients for the events raised by views.
+``build_notification_digests()`` folds a user's pending (not yet emailed)
+notifications into one digest notification.
+
+Each user's unread count is kept in the cache so the navbar badge costs a
+cache read rather than a COUNT per page. Every insert and read adjusts the
+counter with ``incr``/``decr`` once the transaction commits. A missing counter
+is recounted on the next read, and ``NOTIFICATION_UNREAD_CACHE_TIMEOUT`` bounds
+how long a drifted one can live.
+"""
+
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, Task, User, resolve_related_objects
+
+
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.+-]+)')
+UNREAD_CACHE_PREFIX = 'notifications:unread'
+
+
+def _user_ids(users):
+    return {getattr(user, 'pk', user) for user in users if user is not None} - {None}
+
+
+def _related(obj):
+    if obj is None:
+        return None, None
+    return obj.pk, obj._meta.model_name
+
+
+def notify(notification_type, recipients, title, message, sender=None, related_object=None,
+           coalesce_minutes=None):
+    """
+    Create one notification per recipient in a single query.
+
+    ``recipients`` may hold users or user ids. Returns the created
+    notifications (recipients skipped by coalescing get none).
+    """
+    related_object_id, related_object_type = _related(related_object)
+    return notify_many(
+        [(notification_type, recipients, title, message, related_object_type, related_object_id)],
+        sender=sender, coalesce_minutes=coalesce_minutes,
+    )
+
+
+def notify_many(events, sender=None, coalesce_minutes=None):
+    """
+    Create the notifications of several events in a single query.
+
+    Each event is a ``(notification_type, recipients, title, message,
+    related_object_type, related_object_id)`` tuple; batch jobs that only
+    hold object ids (such as the deadline reminders) use this directly.
+    Coalescing works as in ``notify()``, including between the given events.
+    """
+    sender_ids = _user_ids([sender])
+    pending = {}
+    for notification_type, recipients, title, message, related_object_type, related_object_id in events:
+        for recipient_id in sorted(_user_ids(recipients) - sender_ids):
+            key = (recipient_id, notification_type, related_object_type, related_object_id)
+            pending.setdefault(key, (title, message))
+    if not pending:
+        return []
+
+    if coalesce_minutes is None:
+        coalesce_minutes = settings.NOTIFICATION_COALESCE_MINUTES
+    if coalesce_minutes:
+        recent = Notification.objects.filter(
+            recipient_id__in={key[0] for key in pending},
+            notification_type__in={key[1] for key in pending},
+            is_read=False,
+            created_at__gte=timezone.now() - timedelta(minutes=coalesce_minutes),
+        ).values_list('recipient_id', 'notification_type', 'related_object_type', 'related_object_id')
+        for key in recent:
+            pending.pop(key, None)
+
+    created = Notification.objects.bulk_create([
+        Notification(
+            recipient_id=recipient_id,
+            sender=sender,
+            title=title[:255],
+            message=message,
+            notification_type=notification_type,
+            related_object_id=related_object_id,
+            related_object_type=related_object_type,
+        )
+        for (recipient_id, notification_type, related_object_type, related_object_id), (title, message)
+        in pending.items()
+    ], batch_size=500)
+    adjust_unread_counts(notification.recipient_id for notification in created)
+    return created
+
+
+# ----------------------------
+# Unread counters
+# ----------------------------
+
+def _unread_key(user_id):
+    return f'{UNREAD_CACHE_PREFIX}:{user_id}'
+
+
+def get_unread_count(user):
+    """Get a user's unread notification count, counting only on a cache miss"""
+    user_id = getattr(user, 'pk', user)
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        # add() rather than set() so a counter created meanwhile is kept
+        cache.add(_unread_key(user_id), count, settings.NOTIFICATION_UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def _apply_unread_deltas(deltas):
+    for user_id, delta in deltas.items():
+        key = _unread_key(user_id)
+        try:
+            count = cache.incr(key, delta) if delta > 0 else cache.decr(key, -delta)
+        except ValueError:
+            # Not cached: the next read counts from the database
+            continue
+        if count < 0:
+            cache.delete(key)
+
+
+def adjust_unread_counts(user_ids, delta=1):
+    """
+    Add delta to the unread counters of the given users after the transaction commits.
+
+    ``user_ids`` may repeat a user (once per notification) or be a mapping
+    of user id to delta.
+    """
+    if isinstance(user_ids, dict):
+        deltas = dict(user_ids)
+    else:
+        deltas = defaultdict(int)
+        for user_id in user_ids:
+            deltas[user_id] += delta
+    deltas = {user_id: value for user_id, value in deltas.items() if user_id and value}
+    if deltas:
+        transaction.on_commit(lambda: _apply_unread_deltas(deltas))
+
+
+def invalidate_unread_counts(user_ids):
+    """Drop cached unread counters so they are recounted on the next read"""
+    keys = [_unread_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_recent_notifications(user, limit=5):
+    """A user's latest unread notifications, with their related objects resolved in bulk"""
+    user_id = getattr(user, 'pk', user)
+    return resolve_related_objects(
+        Notification.objects.filter(recipient_id=user_id, is_read=False).order_by('-created_at', '-pk')[:limit]
+    )
+
+
+def mark_all_read(user, notification_ids=None):
+    """
+    Mark a user's unread notifications as read with one UPDATE.
+
+    Limited to ``notification_ids`` when given. Returns the number of
+    notifications marked.
+    """
+    user_id = getattr(user, 'pk', user)
+    unread = Notification.objects.filter(recipient_id=user_id, is_read=False)
+    if notification_ids is not None:
+        unread = unread.filter(pk__in=notification_ids)
+    marked = unread.update(is_read=True, read_at=timezone.now())
+    if notification_ids is None:
+        # Recount rather than reset to zero, in case a notification arrived meanwhile
+        invalidate_unread_counts([user_id])
+    else:
+        adjust_unread_counts({user_id: -marked})
+    return marked
+
+
+# ----------------------------
+# Recipients
+# ----------------------------
+
+def get_task_watchers(task):
+    """Ids of users following a task: its creator, assignees and the project admin"""
+    user_ids = set(Task.assigned_to.through.objects.filter(task_id=task.pk).values_list('user_id', flat=True))
+    user_ids.add(task.created_by_id)
+    if task.project_id:
+        user_ids.add(task.project.assigned_to_admin_id)
+    return user_ids - {None}
+
+
+def get_project_team(project):
+    """Ids of everyone working on a project: its admin and every task assignee"""
+    user_ids = set(Task.assigned_to.through.objects.filter(
+        task__project_id=project.pk
+    ).values_list('user_id', flat=True).distinct())
+    user_ids.add(project.assigned_to_admin_id)
+    return user_ids - {None}
+
+
+def get_mentioned_user_ids(text):
+    """Ids of active users @mentioned in a piece of text"""
+    usernames = set(MENTION_RE.findall(text or ''))
+    if not usernames:
+        return set()
+    return set(User.objects.filter(username__in=usernames, is_active=True).values_list('id', flat=True))
+
+
+# ----------------------------
+# Events
+# ----------------------------
+
+def notify_task_assigned(task, user_ids, sender=None):
+    """Tell newly added assignees about a task"""
+    return notify(
+        'task_assigned', user_ids,
+        f'New task: {task.title}',
+        f'{sender.get_display_name() if sender else "Someone"} assigned you to "{task.title}".',
+        sender=sender, related_object=task,
+    )
+
+
+def notify_task_completed(task, sender=None):
+    """Tell a task's watchers that it was completed"""
+    return notify(
+        'task_completed', get_task_watchers(task),
+        f'Task completed: {task.title}',
+        f'"{task.title}" was marked as completed.',
+        sender=sender, related_object=task,
+    )
+
+
+def notify_task_comment(comment, sender=None):
+    """Tell watchers about a comment, and send a mention to anyone @mentioned"""
+    task = comment.task
+    sender = sender or comment.user
+    mentioned = get_mentioned_user_ids(comment.content)
+    watchers = get_task_watchers(task)
+    if comment.is_internal:
+        # Internal comments are only visible to admins
+        admin_ids = set(User.objects.filter(
+            id__in=watchers | mentioned, role__in=['admin', 'super_admin']
+        ).values_list('id', flat=True))
+        watchers &= admin_ids
+        mentioned &= admin_ids
+
+    created = notify(
+        'mention', mentioned,
+        f'{sender.get_display_name()} mentioned you',
+        f'You were mentioned in a comment on "{task.title}".',
+        sender=sender, related_object=task,
+    )
+    created += notify(
+        'task_comment', watchers - mentioned,
+        f'New comment on {task.title}',
+        f'{sender.get_display_name()} commented on "{task.title}".',
+        sender=sender, related_object=task,
+    )
+    return created
+
+
+def notify_project_assigned(project, sender=None):
+    """Tell the managing admin about a project assigned to them"""
+    return notify(
+        'project_assigned', [project.assigned_to_admin_id],
+        f'Project assigned: {project.title}',
+        f'You are now managing "{project.title}".',
+        sender=sender, related_object=project,
+    )
+
+
+def notify_file_uploaded(project_file, sender=None):
+    """Tell a project's team about a new file"""
+    project = project_file.project
+    return notify(
+        'file_uploaded', get_project_team(project),
+        f'New file in {project.title}',
+        f'"{project_file.filename}" was uploaded to "{project.title}".',
+        sender=sender, related_object=project,
+    )
+
+
+# ----------------------------
+# Digests
+# ----------------------------
+
+def build_notification_digests(min_count=None, max_lines=10):
+    """
+    Fold each user's pending notifications into one digest notification.
+
+    Pending means unread and not yet sent by email. Users with at least
+    ``min_count`` of them get a single 'digest' notification listing them,
+    and the folded notifications are marked as sent so they are not emailed
+    one by one. Returns the created digests.
+    """
+    if min_count is None:
+        min_count = settings.NOTIFICATION_DIGEST_MIN_COUNT
+
+    pending = defaultdict(list)
+    rows = Notification.objects.filter(is_read=False, is_sent=False).exclude(
+        notification_type='digest'
+    ).order_by('recipient_id', '-created_at').values_list('id', 'recipient_id', 'title')
+    for notification_id, recipient_id, title in rows:
+        pending[recipient_id].append((notification_id, title))
+
+    digests, folded_ids = [], []
+    for recipient_id, items in pending.items():
+        if len(items) < min_count:
+            continue
+        lines = [f'- {title}' for _, title in items[:max_lines]]
+        if len(items) > max_lines:
+            lines.append(f'...and {len(items) - max_lines} more')
+        digests.append(Notification(
+            recipient_id=recipient_id,
+            title=f'You have {len(items)} new notifications',
+            message='\n'.join(lines),
+            notification_type='digest',
+        ))
+        folded_ids.extend(notification_id for notification_id, _ in items)
+
+    with transaction.atomic():
+        Notification.objects.bulk_create(digests, batch_size=500)
+        adjust_unread_counts(digest.recipient_id for digest in digests)
+        for start in range(0, len(folded_ids), 500):
+            Notification.objects.filter(id__in=folded_ids[start:start + 500]).update(is_sent=True)
+    return digests
@@ -0,0 +1,183 @@
+"""
+Keyset (cursor) pagination for large list views.
+
+Unlike ``django.core.paginator.Paginator`` this never runs ``COUNT(*)`` and
+never uses ``OFFSET``: each page is fetched with a ``WHERE`` clause on the
+ordering key of the last row seen, so deep pages cost the same as the first.
+"""
+
+import json
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+
+CURSOR_SALT = 'tasks.pagination.cursor'
+
+
+def use_cursor_pagination(request):
+    """Check whether a list view should use cursor instead of page-number pagination"""
+    return getattr(settings, 'CURSOR_PAGINATION', False) or 'cursor' in request.GET
+
+
+def estimate_count(queryset):
+    """
+    Get the planner's row estimate for a queryset without counting it.
+
+    Only PostgreSQL exposes a cheap estimate; other backends return None so
+    callers can simply hide the total.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPage:
+    """A single page of results produced by CursorPaginator"""
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset on a unique ordering key such as ('-created_at', 'id').
+
+    The last field of ``ordering`` must be unique so every row has a distinct
+    position. Key parts may also be annotations, such as the ``search_rank``
+    of a search, so ranked results page in rank order. Cursors are signed,
+    opaque tokens encoding the key of the first or last row of the page they
+    came from.
+    """
+
+    def __init__(self, queryset, ordering, per_page, estimate_total=False):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.estimate_total = estimate_total
+        self._count = None
+
+    @property
+    def count(self):
+        """Estimated number of rows, or None when no cheap estimate exists"""
+        if self.estimate_total and self._count is None:
+            self._count = estimate_count(self.queryset)
+        return self._count
+
+    # Cursor encoding
+
+    def _key_fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _key_field(self, name):
+        """The model field, or the annotation's output field, of a key part"""
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, obj, direction):
+        """Build an opaque cursor pointing after (or before) obj"""
+        values = []
+        for name, _descending in self._key_fields():
+            if name in self.queryset.query.annotations:
+                values.append(str(getattr(obj, name)))
+            else:
+                values.append(self._key_field(name).value_to_string(obj))
+        return signing.dumps({'d': direction, 'k': values}, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """Decode a cursor into (direction, key values); None if invalid"""
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+            direction, raw_values = payload['d'], payload['k']
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+
+        fields = self._key_fields()
+        if direction not in ('next', 'prev') or len(raw_values) != len(fields):
+            return None
+        try:
+            values = [
+                self._key_field(name).to_python(raw)
+                for (name, _descending), raw in zip(fields, raw_values)
+            ]
+        except Exception:
+            return None
+        return direction, values
+
+    # Page lookup
+
+    def _seek_filter(self, values, backwards):
+        """Build the keyset WHERE clause for rows after (or before) a key"""
+        condition = Q()
+        equal_prefix = Q()
+        for (name, descending), value in zip(self._key_fields(), values):
+            # Descending fields move forward by getting smaller
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+            equal_prefix &= Q(**{name: value})
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_page(self, cursor=None):
+        """Get the page identified by a cursor; invalid or missing cursors give the first page"""
+        decoded = self.decode_cursor(cursor) if cursor else None
+        backwards = bool(decoded and decoded[0] == 'prev')
+
+        queryset = self.queryset
+        if decoded:
+            queryset = queryset.filter(self._seek_filter(decoded[1], backwards))
+        queryset = queryset.order_by(*(self._reversed_ordering() if backwards else self.ordering))
+
+        # Fetch one extra row to know whether another page follows
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = self.encode_cursor(rows[-1], 'next')
+            if decoded and (has_more or not backwards):
+                previous_cursor = self.encode_cursor(rows[0], 'prev')
+        return CursorPage(rows, self, next_cursor, previous_cursor)
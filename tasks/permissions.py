@@ -0,0 +1,49 @@
+"""
+Bulk permission resolution for pages of tasks.
+
+Checking ``can_user_edit`` / ``is_assigned_to_user`` task by task costs one
+query per call. ``resolve_task_permissions`` answers them for a whole page at
+once: from prefetched assignees when available, otherwise with a single query
+on the assignment table. The results are cached on each task so the model
+methods and template filters reuse them.
+"""
+
+from .models import Task
+
+
+def get_assigned_task_ids(task_ids, user):
+    """Get the subset of task_ids the user is assigned to, in one query"""
+    if not task_ids:
+        return set()
+    return set(
+        Task.assigned_to.through.objects.filter(
+            user_id=user.pk, task_id__in=task_ids
+        ).values_list('task_id', flat=True)
+    )
+
+
+def resolve_task_permissions(tasks, user):
+    """
+    Set ``user_is_assigned``, ``user_can_edit`` and ``user_can_update_status``
+    on every task for the given user.
+
+    Returns the tasks as a list.
+    """
+    tasks = list(tasks)
+    is_admin = user.is_admin()
+
+    unresolved = [task.pk for task in tasks if task.get_prefetched_assignees() is None]
+    assigned_ids = get_assigned_task_ids(unresolved, user)
+
+    for task in tasks:
+        assignees = task.get_prefetched_assignees()
+        if assignees is None:
+            is_assigned = task.pk in assigned_ids
+        else:
+            is_assigned = any(assignee.pk == user.pk for assignee in assignees)
+        task.cache_assignment(user, is_assigned)
+
+        task.user_is_assigned = is_assigned
+        task.user_can_edit = is_admin or task.created_by_id == user.pk or is_assigned
+        task.user_can_update_status = is_assigned or is_admin
+    return tasks
@@ -0,0 +1,135 @@
+"""
+Deadline reminder scheduler.
+
+Each reminder threshold ("due in 24 hours", "overdue"...) keeps a high-water
+mark in ``ReminderSweep``: every task whose reminder time (due date minus the
+threshold) is at or before ``swept_until`` has been handled. A run sweeps the
+time between the mark and now in fixed windows of
+``DEADLINE_REMINDER_WINDOW_MINUTES``. Each window is one range query on the
+``(due_date, status)`` index plus one query for assignees, and it hands the
+reminders to ``notify_many()``, which coalesces them like any other
+notification and writes them with a single ``bulk_create``. The cost of a run therefore follows the number of
+tasks coming due, not the size of the table. A task is reminded once per
+threshold, and again only if its due date is moved past the mark.
+
+A task created or rescheduled with its due date already inside a "due soon"
+threshold (due in 2 hours, threshold 24 hours) has a reminder time behind the
+mark, so the window scan alone would never see it. Each window therefore also
+picks up tasks written during the window whose reminder time has passed but
+whose due date has not; that query is bounded by the due dates within the
+threshold. Tasks that already got a "due soon" reminder since their reminder
+time (from this or a tighter threshold, or before an unrelated edit) are
+skipped, so a task due in an hour is reminded once, not once per threshold.
+
+The first sweep of a threshold starts at the current time, so reminders are
+not sent for deadlines that passed before the scheduler was set up.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, ReminderSweep, Task
+from .notifications import notify_many
+
+
+def get_reminder_thresholds():
+    """Map each threshold name to how long before the due date it fires"""
+    thresholds = {f'due_in_{hours}h': timedelta(hours=hours) for hours in settings.DEADLINE_REMINDER_HOURS if hours > 0}
+    thresholds['overdue'] = timedelta(0)
+    return thresholds
+
+
+def _build_reminders(tasks, assignees, offset):
+    """Reminder events for notify_many(), one per task"""
+    events = []
+    for task_id, title, due_date, created_by_id in tasks:
+        if offset:
+            notification_type = 'deadline_reminder'
+            notification_title = f'Due soon: {title}'
+            message = f'"{title}" is due {timezone.localtime(due_date):%b %d, %Y %H:%M}.'
+        else:
+            notification_type = 'task_overdue'
+            notification_title = f'Overdue: {title}'
+            message = f'"{title}" was due {timezone.localtime(due_date):%b %d, %Y %H:%M} and is not finished.'
+        # Unassigned tasks remind their creator instead
+        recipients = assignees.get(task_id) or {created_by_id}
+        events.append((notification_type, recipients, notification_title, message, 'task', task_id))
+    return events
+
+
+def _due_tasks(offset, start, end):
+    """Tasks to remind for one threshold and window, as (id, title, due_date, created_by_id)"""
+    # Excluding statuses (rather than listing the active ones) keeps the
+    # planner on the (due_date, status) index instead of the status one
+    active = Task.objects.exclude(status__in=Task.INACTIVE_STATUSES).order_by()
+    fields = ('id', 'title', 'due_date', 'created_by_id')
+    tasks = list(active.filter(due_date__gt=start + offset, due_date__lte=end + offset).values_list(*fields))
+    if offset and start + offset > end:
+        # Written during the window with the reminder time already behind the
+        # mark and the due date still ahead
+        tasks += active.filter(
+            due_date__gt=end, due_date__lte=start + offset, updated_at__gt=start, updated_at__lte=end
+        ).values_list(*fields)
+    return tasks
+
+
+def _already_reminded(tasks, offset):
+    """Ids of tasks with a "due soon" reminder sent at or after their reminder time"""
+    reminder_times = {task_id: due_date - offset for task_id, _title, due_date, _creator in tasks}
+    sent = Notification.objects.filter(
+        notification_type='deadline_reminder', related_object_type='task',
+        related_object_id__in=reminder_times, created_at__gte=min(reminder_times.values()),
+    ).values_list('related_object_id', 'created_at')
+    return {task_id for task_id, created_at in sent if created_at >= reminder_times[task_id]}
+
+
+def sweep_window(offset, start, end):
+    """Create the reminders of one threshold for window (start, end]; returns the notifications"""
+    tasks = _due_tasks(offset, start, end)
+    if tasks and offset:
+        reminded = _already_reminded(tasks, offset)
+        tasks = [task for task in tasks if task[0] not in reminded]
+    if not tasks:
+        return []
+
+    assignees = {}
+    rows = Task.assigned_to.through.objects.filter(
+        task_id__in=[task[0] for task in tasks], user__is_active=True
+    ).values_list('task_id', 'user_id')
+    for task_id, user_id in rows:
+        assignees.setdefault(task_id, set()).add(user_id)
+
+    return notify_many(_build_reminders(tasks, assignees, offset))
+
+
+def sweep_threshold(threshold, offset, now=None, window=None):
+    """Advance one threshold's high-water mark to now, window by window; returns the number of reminders"""
+    now = now or timezone.now()
+    window = window or timedelta(minutes=settings.DEADLINE_REMINDER_WINDOW_MINUTES)
+    sweep, created = ReminderSweep.objects.get_or_create(threshold=threshold, defaults={'swept_until': now})
+    if created:
+        return 0
+
+    count = 0
+    start = sweep.swept_until
+    while start < now:
+        end = min(start + window, now)
+        # The reminders and the new mark are committed together, so a crash
+        # never sends a window twice or skips it
+        with transaction.atomic():
+            count += len(sweep_window(offset, start, end))
+            ReminderSweep.objects.filter(pk=sweep.pk).update(swept_until=end)
+        start = end
+    return count
+
+
+def send_deadline_reminders(now=None):
+    """Run every reminder threshold up to now; returns {threshold: reminders created}"""
+    now = now or timezone.now()
+    return {
+        threshold: sweep_threshold(threshold, offset, now=now)
+        for threshold, offset in get_reminder_thresholds().items()
+    }
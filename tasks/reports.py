@@ -0,0 +1,329 @@
+"""
+Report query compiler shared by the reports dashboard and the exports.
+
+``ReportQuery.from_params`` parses the report GET parameters once into typed
+filters. The parsed filters plus the user's visibility scope form a canonical,
+hashable ``key``: two requests that select the same tasks (whatever the
+parameter order, duplicates or formatting) get the same key. The key is also
+used to cache report aggregates, so the dashboard and a follow-up export of
+the same filters share computed results.
+"""
+
+import hashlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import NotSupportedError, connections
+from django.db.models import (
+    Aggregate, Avg, Count, Exists, ExpressionWrapper, F, FloatField, Func, OuterRef, Q, Value, Window
+)
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Task
+from .stats import get_stats_generation, get_task_stats
+
+
+REPORT_CACHE_PREFIX = 'report'
+NO_PROJECT = 'no_project'
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _parse_id(value):
+    value = int(value)
+    if value <= 0:
+        raise ValueError(value)
+    return value
+
+
+def _start_of_day(day):
+    """Get the first instant of a day in the current timezone"""
+    value = datetime.combine(day, time.min)
+    if settings.USE_TZ:
+        value = timezone.make_aware(value)
+    return value
+
+
+# ----------------------------
+# Completion time expressions
+# ----------------------------
+
+COMPLETION_PERCENTILES = (0.5, 0.9)
+
+
+class HoursBetween(Func):
+    """Hours elapsed from the second datetime expression to the first, as a float"""
+    arity = 2
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f'HoursBetween is not implemented for {connection.vendor}')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='((julianday(%(expressions)s)) * 24.0)', arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='(EXTRACT(EPOCH FROM (%(expressions)s)) / 3600.0)', arg_joiner=' - ',
+            **extra_context
+        )
+
+
+class PercentileCont(Aggregate):
+    """PostgreSQL's interpolated percentile ordered-set aggregate"""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+    allow_distinct = False
+
+    def __init__(self, expression, percentile, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+def _percentile_label(percentile):
+    return 'median' if percentile == 0.5 else f'p{int(percentile * 100)}'
+
+
+def _completion_stats_postgresql(tasks, dimension, hours):
+    aggregates = {'count': Count('pk'), 'mean': Avg(hours)}
+    for percentile in COMPLETION_PERCENTILES:
+        aggregates[_percentile_label(percentile)] = PercentileCont(hours, percentile)
+
+    if dimension is None:
+        row = tasks.aggregate(**aggregates)
+        return [row] if row['count'] else []
+    return list(tasks.values(dimension).annotate(**aggregates).order_by('-count'))
+
+
+def _completion_stats_sqlite(tasks, dimension, hours):
+    """
+    SQLite has no percentile aggregate: rank the durations with window
+    functions and only fetch the rows around each requested percentile.
+    """
+    partition = [F(dimension)] if dimension else None
+    ranked = tasks.annotate(hours=hours).annotate(
+        position=Window(RowNumber(), partition_by=partition, order_by=F('hours').asc()),
+        group_count=Window(Count('pk'), partition_by=partition),
+        group_mean=Window(Avg('hours'), partition_by=partition),
+    )
+
+    # Same linear interpolation as PERCENTILE_CONT: the value sits at rank
+    # 1 + p * (n - 1), so keep the ranks within one of it
+    around_percentile = Q()
+    for percentile in COMPLETION_PERCENTILES:
+        target = ExpressionWrapper(Value(percentile) * (F('group_count') - 1), output_field=FloatField())
+        around_percentile |= Q(position__gt=target, position__lt=target + 2)
+
+    fields = ['position', 'group_count', 'group_mean', 'hours'] + ([dimension] if dimension else [])
+    groups = {}
+    for row in ranked.filter(around_percentile).values(*fields):
+        groups.setdefault(row[dimension] if dimension else None, []).append(row)
+
+    results = []
+    for key, rows in groups.items():
+        count = rows[0]['group_count']
+        hours_at = {row['position']: row['hours'] for row in rows}
+        result = {dimension: key} if dimension else {}
+        result.update(count=count, mean=rows[0]['group_mean'])
+        for percentile in COMPLETION_PERCENTILES:
+            # Rounded so float noise cannot point past the fetched ranks
+            rank = round(1 + percentile * (count - 1), 9)
+            lower, fraction = int(rank), rank - int(rank)
+            value = hours_at[lower]
+            if fraction:
+                value += (hours_at[lower + 1] - value) * fraction
+            result[_percentile_label(percentile)] = value
+        results.append(result)
+    return sorted(results, key=lambda result: -result['count'])
+
+
+def get_completion_stats(tasks, dimension=None):
+    """
+    Completion time statistics in hours (created_at to completed_at) for
+    completed tasks, computed in one database query.
+
+    Returns a list of dicts with ``count``, ``mean``, ``median`` and ``p90``
+    keys, one per value of ``dimension`` (e.g. ``'division__name'``) or a
+    single overall row when no dimension is given; empty if nothing matched.
+    """
+    tasks = tasks.filter(status='completed', completed_at__isnull=False).order_by()
+    hours = HoursBetween('completed_at', 'created_at')
+    if connections[tasks.db].vendor == 'postgresql':
+        return _completion_stats_postgresql(tasks, dimension, hours)
+    return _completion_stats_sqlite(tasks, dimension, hours)
+
+
+class ReportQuery:
+    """Compiled report filters for one user"""
+
+    def __init__(self, user, date_from=None, date_to=None, division_id=None,
+                 statuses=(), project=None, assigned_to=None, raw=None, errors=()):
+        self.user = user
+        self.date_from = date_from
+        self.date_to = date_to
+        self.division_id = division_id
+        self.statuses = tuple(sorted(set(statuses)))
+        self.project = project
+        self.assigned_to = assigned_to
+        self.raw = raw or {}
+        self.errors = list(errors)
+
+    @classmethod
+    def from_params(cls, user, params):
+        """
+        Parse report GET parameters (a QueryDict).
+
+        Invalid values are dropped from the filter and described in ``errors``
+        so every view treats them the same way.
+        """
+        errors = []
+        parsed = {}
+        raw = {
+            'date_from': params.get('date_from'),
+            'date_to': params.get('date_to'),
+            'division': params.get('division'),
+            'status': params.getlist('status'),
+            'project': params.get('project'),
+            'assigned_to': params.get('assigned_to'),
+        }
+
+        for name in ['date_from', 'date_to']:
+            if raw[name]:
+                try:
+                    parsed[name] = _parse_date(raw[name])
+                except ValueError:
+                    errors.append(f'Invalid date "{raw[name]}" ignored, expected YYYY-MM-DD.')
+
+        for name, param in [('division_id', 'division'), ('assigned_to', 'assigned_to')]:
+            if raw[param]:
+                try:
+                    parsed[name] = _parse_id(raw[param])
+                except ValueError:
+                    errors.append(f'Invalid {param.replace("_", " ")} "{raw[param]}" ignored.')
+
+        if raw['project']:
+            if raw['project'] == NO_PROJECT:
+                parsed['project'] = NO_PROJECT
+            else:
+                try:
+                    parsed['project'] = _parse_id(raw['project'])
+                except ValueError:
+                    errors.append(f'Invalid project "{raw["project"]}" ignored.')
+
+        valid_statuses = {status for status, _label in Task.STATUS_CHOICES}
+        parsed['statuses'] = [status for status in raw['status'] if status in valid_statuses]
+
+        return cls(user, raw=raw, errors=errors, **parsed)
+
+    # Canonical key
+
+    @property
+    def scope(self):
+        """The part of the key describing which tasks the user may see at all"""
+        if self.user.role == 'user':
+            return ('user', self.user.pk)
+        elif self.user.role == 'admin':
+            return ('division', self.user.division_id) if self.user.division_id else ('none',)
+        return ('all',)
+
+    @property
+    def key(self):
+        """Hashable key identifying the selected task set"""
+        return (
+            self.scope,
+            self.date_from.isoformat() if self.date_from else None,
+            self.date_to.isoformat() if self.date_to else None,
+            self.division_id,
+            self.statuses,
+            self.project,
+            self.assigned_to,
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, ReportQuery) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def cache_key(self, name):
+        """Cache key for a named result; changes whenever tasks, projects or users are written"""
+        digest = hashlib.sha1(repr(self.key).encode()).hexdigest()
+        return f'{REPORT_CACHE_PREFIX}:{get_stats_generation()}:{digest}:{name}'
+
+    # Querying
+
+    def queryset(self):
+        """Get the matching tasks, unordered and without joins or prefetches"""
+        scope = self.scope
+        if scope[0] == 'none':
+            return Task.objects.none()
+
+        tasks = Task.objects.all()
+        if scope[0] == 'user':
+            # EXISTS instead of a join so no DISTINCT is needed
+            tasks = tasks.filter(Q(Exists(self._assignments(scope[1]))) | Q(created_by_id=scope[1]))
+        elif scope[0] == 'division':
+            tasks = tasks.filter(division_id=scope[1])
+
+        # Ranges on created_at instead of created_at__date so an index can be used
+        if self.date_from:
+            tasks = tasks.filter(created_at__gte=_start_of_day(self.date_from))
+        if self.date_to:
+            tasks = tasks.filter(created_at__lt=_start_of_day(self.date_to + timedelta(days=1)))
+        if self.division_id:
+            tasks = tasks.filter(division_id=self.division_id)
+        if self.statuses:
+            tasks = tasks.filter(status__in=self.statuses)
+        if self.project == NO_PROJECT:
+            tasks = tasks.filter(project__isnull=True)
+        elif self.project:
+            tasks = tasks.filter(project_id=self.project)
+        if self.assigned_to:
+            tasks = tasks.filter(Exists(self._assignments(self.assigned_to)))
+        return tasks
+
+    @staticmethod
+    def _assignments(user_id):
+        return Task.assigned_to.through.objects.filter(task_id=OuterRef('pk'), user_id=user_id)
+
+    def get_cached(self, name, compute):
+        """Get a named result for these filters from the cache, computing it on a miss"""
+        return cache.get_or_set(self.cache_key(name), compute, settings.REPORT_CACHE_TIMEOUT)
+
+    # Shared aggregates
+
+    def task_stats(self):
+        """Total, per-status and overdue counts (see stats.get_task_stats)"""
+        return self.get_cached('task_stats', lambda: get_task_stats(self.queryset()))
+
+    def distribution(self, field):
+        """Task counts grouped by a field, largest first"""
+        return self.get_cached(f'distribution:{field}', lambda: list(
+            self.queryset().values(field).annotate(count=Count('id')).order_by('-count')
+        ))
+
+    def completion_stats(self, dimension=None):
+        """Completion time statistics (see get_completion_stats)"""
+        return self.get_cached(
+            f'completion:{dimension}', lambda: get_completion_stats(self.queryset(), dimension)
+        )
+
+    def get_filter_context(self):
+        """Template context echoing the submitted filters"""
+        return {
+            'date_from': self.raw.get('date_from'),
+            'date_to': self.raw.get('date_to'),
+            'selected_division': self.raw.get('division'),
+            'selected_statuses': self.raw.get('status', []),
+            'selected_project': self.raw.get('project'),
+            'selected_assigned_to': self.raw.get('assigned_to'),
+        }
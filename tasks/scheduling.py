@@ -0,0 +1,175 @@
+"""
+Critical-path scheduling and completion forecasts for projects.
+
+A project's tasks form a DAG through ``Task.depends_on``. Each task's
+duration is its remaining effort: ``estimated_hours`` scaled by the progress
+still to do (zero once completed or cancelled). A forward pass gives every
+task its earliest start/finish, a backward pass its latest start/finish, and
+the difference is its slack; tasks without slack form the critical path.
+
+Both passes are linear in tasks + edges over a topological order, and the
+data is read in two queries, so even projects with thousands of tasks are
+scheduled in milliseconds. Results are cached per project and dropped by the
+signal handlers whenever a task, dependency or the project itself changes.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .dependencies import DependencyCycleError, DependencyGraph
+from .models import Task
+
+
+SCHEDULE_CACHE_PREFIX = 'project_schedule'
+# Float noise allowed when deciding whether a task has zero slack
+SLACK_TOLERANCE = 1e-6
+
+
+def get_remaining_hours(status, estimated_hours, progress_percentage):
+    """Get the hours of work left on a task"""
+    if status in Task.INACTIVE_STATUSES:
+        return 0.0
+    if estimated_hours is None:
+        estimated_hours = settings.SCHEDULE_DEFAULT_TASK_HOURS
+    progress = min(max(progress_percentage or 0, 0), 100)
+    return float(estimated_hours) * (100 - progress) / 100
+
+
+class ProjectSchedule:
+    """Critical-path result for one project; all times are work hours from now"""
+
+    def __init__(self, project_id, end_date=None, computed_at=None):
+        self.project_id = project_id
+        self.end_date = end_date
+        self.computed_at = computed_at or timezone.now()
+        self.tasks = {}           # task id -> timing dict
+        self.critical_path = []   # task ids, first to last
+        self.duration_hours = 0.0
+        self.cycle = None
+
+    def __repr__(self):
+        return f'<ProjectSchedule project={self.project_id} tasks={len(self.tasks)} hours={self.duration_hours:.1f}>'
+
+    @property
+    def duration_days(self):
+        """Remaining duration in (working) days"""
+        return self.duration_hours / settings.SCHEDULE_HOURS_PER_DAY
+
+    @property
+    def forecast_completion(self):
+        """Forecast completion date, or None if the graph has a cycle"""
+        if self.cycle:
+            return None
+        return (self.computed_at + timedelta(days=self.duration_days)).date()
+
+    @property
+    def days_late(self):
+        """Days the forecast overshoots the project end date (negative when early)"""
+        if not self.end_date or self.forecast_completion is None:
+            return None
+        return (self.forecast_completion - self.end_date).days
+
+    def is_on_track(self):
+        """Check if the forecast meets the project end date (None if there is no end date)"""
+        days_late = self.days_late
+        return None if days_late is None else days_late <= 0
+
+    def get_critical_task_ids(self):
+        return {task_id for task_id, timing in self.tasks.items() if timing['critical']}
+
+
+def compute_project_schedule(project):
+    """Run the critical-path calculation for a project straight from the database"""
+    schedule = ProjectSchedule(project.pk, end_date=project.end_date)
+
+    rows = Task.objects.filter(project_id=project.pk).values_list(
+        'id', 'status', 'estimated_hours', 'progress_percentage'
+    )
+    durations = {
+        task_id: get_remaining_hours(status, estimated_hours, progress)
+        for task_id, status, estimated_hours, progress in rows
+    }
+
+    # Dependencies on tasks outside the project are not scheduled here
+    graph = DependencyGraph(statuses={task_id: None for task_id in durations})
+    edges = Task.depends_on.through.objects.filter(
+        from_task__project_id=project.pk, to_task__project_id=project.pk
+    ).values_list('from_task_id', 'to_task_id')
+    for task_id, depends_on_id in edges:
+        graph.add_edge(task_id, depends_on_id)
+
+    try:
+        order = graph.topological_order()
+    except DependencyCycleError as e:
+        schedule.cycle = e.cycle
+        return schedule
+
+    # Forward pass: earliest start is when the last dependency finishes
+    earliest_finish = {}
+    for task_id in order:
+        start = max((earliest_finish[dep_id] for dep_id in graph.upstream.get(task_id, ())), default=0.0)
+        earliest_finish[task_id] = start + durations[task_id]
+    schedule.duration_hours = max(earliest_finish.values(), default=0.0)
+
+    # Backward pass: latest finish is when the first dependent must start
+    latest_start = {}
+    for task_id in reversed(order):
+        finish = min(
+            (latest_start[dependent_id] for dependent_id in graph.downstream.get(task_id, ())),
+            default=schedule.duration_hours
+        )
+        latest_start[task_id] = finish - durations[task_id]
+
+    for task_id in order:
+        earliest_start = earliest_finish[task_id] - durations[task_id]
+        slack = latest_start[task_id] - earliest_start
+        schedule.tasks[task_id] = {
+            'duration': durations[task_id],
+            'earliest_start': earliest_start,
+            'earliest_finish': earliest_finish[task_id],
+            'latest_start': latest_start[task_id],
+            'latest_finish': latest_start[task_id] + durations[task_id],
+            'slack': max(slack, 0.0),
+            'critical': slack <= SLACK_TOLERANCE and durations[task_id] > 0,
+        }
+
+    # Walk back from the critical task that finishes last
+    critical = schedule.get_critical_task_ids()
+    current = max(
+        critical, key=lambda task_id: (earliest_finish[task_id], -task_id), default=None
+    )
+    while current is not None:
+        schedule.critical_path.append(current)
+        current = next((
+            dep_id for dep_id in sorted(graph.upstream.get(current, ()))
+            if dep_id in critical
+            and abs(earliest_finish[dep_id] - schedule.tasks[current]['earliest_start']) <= SLACK_TOLERANCE
+        ), None)
+    schedule.critical_path.reverse()
+    return schedule
+
+
+def _schedule_key(project_id):
+    return f'{SCHEDULE_CACHE_PREFIX}:{project_id}'
+
+
+def get_project_schedule(project):
+    """Get a project's schedule, computing and caching it on a miss"""
+    key = _schedule_key(project.pk)
+    schedule = cache.get(key)
+    if schedule is None:
+        schedule = compute_project_schedule(project)
+        cache.set(key, schedule, settings.SCHEDULE_CACHE_TIMEOUT)
+    return schedule
+
+
+def invalidate_project_schedules(project_ids):
+    """Drop cached schedules once the surrounding transaction commits"""
+    keys = [_schedule_key(project_id) for project_id in set(project_ids) if project_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
@@ -0,0 +1,353 @@
+"""
+Full-text search index for tasks and projects.
+
+Documents live in a single ``tasks_search_index`` table: an FTS5 virtual
+table on SQLite, or a regular table with a weighted ``tsvector`` column and a
+GIN index on PostgreSQL. Task documents cover the title, the tag-stripped
+description, tags, public comment bodies and assignee names; project documents
+cover the title, description, division and managing admin.
+
+The index is filled by its migration, kept up to date by signal handlers
+(see ``signals.py``) and can be rebuilt with
+``python manage.py rebuild_search_index``. Other database backends
+fall back to the original ``icontains`` filters.
+"""
+
+import html
+import logging
+import re
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'tasks_search_index'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def clean_text(value):
+    """Get plain text from a possibly HTML value"""
+    return html.unescape(strip_tags(value or ''))
+
+
+def tokenize(text):
+    """Split a user query into search terms"""
+    return TOKEN_RE.findall(text or '')[:16]
+
+
+# ----------------------------
+# Document builders
+# ----------------------------
+
+def _person_names(user):
+    return ' '.join(filter(None, [user.username, user.first_name, user.last_name]))
+
+
+def build_task_documents(task_ids):
+    """Build search documents for tasks, keyed by task id"""
+    from .models import Task, Comment
+
+    tasks = Task.objects.filter(id__in=task_ids).prefetch_related('assigned_to')
+    comments = {}
+    for task_id, content in Comment.objects.filter(
+        task_id__in=task_ids, is_internal=False
+    ).values_list('task_id', 'content'):
+        comments.setdefault(task_id, []).append(clean_text(content))
+
+    return {
+        task.id: {
+            'title': task.title,
+            'body': clean_text(task.description),
+            'tags': ' '.join(task.get_tag_list()),
+            'comments': ' '.join(comments.get(task.id, [])),
+            'people': ' '.join(_person_names(user) for user in task.assigned_to.all()),
+        }
+        for task in tasks
+    }
+
+
+def build_project_documents(project_ids):
+    """Build search documents for projects, keyed by project id"""
+    from .models import Project
+
+    projects = Project.objects.filter(id__in=project_ids).select_related('division', 'assigned_to_admin')
+    return {
+        project.id: {
+            'title': project.title,
+            'body': clean_text(project.description),
+            'tags': project.division.name if project.division else '',
+            'comments': '',
+            'people': _person_names(project.assigned_to_admin) if project.assigned_to_admin else '',
+        }
+        for project in projects
+    }
+
+
+DOCUMENT_BUILDERS = {
+    'task': build_task_documents,
+    'project': build_project_documents,
+}
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+
+class SQLiteSearchBackend:
+    """FTS5 virtual table ranked with bm25()"""
+    vendor = 'sqlite'
+    # bm25() weights: object_type, object_id, title, body, tags, comments, people
+    weights = '0, 0, 10.0, 1.0, 5.0, 1.0, 2.0'
+    # Rows are keyed on rowid = object_id * 2 + type code so single-document
+    # updates and rank lookups hit the rowid b-tree instead of scanning
+    type_codes = {'task': 0, 'project': 1}
+
+    def rowid(self, object_type, object_id):
+        return int(object_id) * 2 + self.type_codes[object_type]
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            'object_type UNINDEXED, object_id UNINDEXED, '
+            'title, body, tags, comments, people, '
+            "tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+
+    def drop_schema(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def build_query(self, text):
+        # Quote every term and match it as a prefix so partial words hit
+        terms = tokenize(text)
+        return ' '.join(f'"{term}"*' for term in terms) or None
+
+    def remove(self, cursor, object_type, object_ids):
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(self.rowid(object_type, object_id),) for object_id in object_ids]
+        )
+
+    def upsert(self, cursor, object_type, documents):
+        self.remove(cursor, object_type, documents.keys())
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, object_type, object_id, title, body, tags, comments, people) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+            [
+                (
+                    self.rowid(object_type, object_id), object_type, object_id,
+                    doc['title'], doc['body'], doc['tags'], doc['comments'], doc['people'],
+                )
+                for object_id, doc in documents.items()
+            ]
+        )
+
+    def match_sql(self, object_type, query):
+        return (
+            f'SELECT object_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND object_type = %s',
+            [query, object_type]
+        )
+
+    def rank_sql(self, object_type, query, outer_pk):
+        # bm25() is "lower is better"; negate it so higher ranks sort first
+        return (
+            f'SELECT -bm25({SEARCH_TABLE}, {self.weights}) FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = {outer_pk} * 2 + %s',
+            [query, self.type_codes[object_type]]
+        )
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector column with a GIN index, ranked with ts_rank()"""
+    vendor = 'postgresql'
+
+    @property
+    def config(self):
+        return getattr(settings, 'SEARCH_CONFIG', 'english')
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            'object_type varchar(20) NOT NULL, '
+            'object_id bigint NOT NULL, '
+            'document tsvector NOT NULL, '
+            'PRIMARY KEY (object_type, object_id))'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin '
+            f'ON {SEARCH_TABLE} USING GIN (document)'
+        )
+
+    def drop_schema(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def build_query(self, text):
+        terms = tokenize(text)
+        return ' & '.join(f'{term}:*' for term in terms) or None
+
+    def remove(self, cursor, object_type, object_ids):
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE object_type = %s AND object_id = ANY(%s)',
+            [object_type, list(object_ids)]
+        )
+
+    def upsert(self, cursor, object_type, documents):
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (object_type, object_id, document) VALUES (%s, %s, '
+            "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+            "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+            "setweight(to_tsvector(%s::regconfig, %s), 'C') || "
+            "setweight(to_tsvector(%s::regconfig, %s), 'D')) "
+            'ON CONFLICT (object_type, object_id) DO UPDATE SET document = EXCLUDED.document',
+            [
+                (
+                    object_type, object_id,
+                    self.config, doc['title'],
+                    self.config, doc['tags'],
+                    self.config, doc['body'],
+                    self.config, f"{doc['comments']} {doc['people']}",
+                )
+                for object_id, doc in documents.items()
+            ]
+        )
+
+    def match_sql(self, object_type, query):
+        return (
+            f'SELECT object_id FROM {SEARCH_TABLE} '
+            'WHERE object_type = %s AND document @@ to_tsquery(%s::regconfig, %s)',
+            [object_type, self.config, query]
+        )
+
+    def rank_sql(self, object_type, query, outer_pk):
+        return (
+            f'SELECT ts_rank(document, to_tsquery(%s::regconfig, %s)) FROM {SEARCH_TABLE} '
+            f'WHERE object_type = %s AND object_id = {outer_pk}',
+            [self.config, query, object_type]
+        )
+
+
+BACKENDS = {
+    backend.vendor: backend for backend in [SQLiteSearchBackend(), PostgresSearchBackend()]
+}
+
+
+def get_backend(using='default'):
+    """Get the search backend for a database, or None if it has no full-text support"""
+    return BACKENDS.get(connections[using].vendor)
+
+
+# ----------------------------
+# Indexing
+# ----------------------------
+
+def index_objects(object_type, object_ids, using='default'):
+    """(Re)index the given objects; ids that no longer exist are removed"""
+    backend = get_backend(using)
+    object_ids = set(filter(None, object_ids))
+    if backend is None or not object_ids:
+        return
+
+    documents = DOCUMENT_BUILDERS[object_type](object_ids)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        stale = object_ids - set(documents)
+        if stale:
+            backend.remove(cursor, object_type, stale)
+        if documents:
+            backend.upsert(cursor, object_type, documents)
+
+
+def remove_objects(object_type, object_ids, using='default'):
+    """Drop objects from the index"""
+    backend = get_backend(using)
+    object_ids = set(filter(None, object_ids))
+    if backend is None or not object_ids:
+        return
+    with connections[using].cursor() as cursor:
+        backend.remove(cursor, object_type, object_ids)
+
+
+def schedule_index(object_type, object_ids):
+    """Reindex objects once the surrounding transaction commits"""
+    object_ids = set(filter(None, object_ids))
+    if not object_ids:
+        return
+
+    def run():
+        try:
+            index_objects(object_type, object_ids)
+        except Exception as e:
+            # A stale index must never break the write that triggered it
+            logger.error(f"Search indexing failed for {object_type} {sorted(object_ids)}: {str(e)}")
+
+    transaction.on_commit(run)
+
+
+def rebuild_index(batch_size=500, using='default'):
+    """Recreate the index table and index every task and project; returns document counts"""
+    from .models import Task, Project
+
+    backend = get_backend(using)
+    if backend is None:
+        return {}
+
+    with connections[using].cursor() as cursor:
+        backend.drop_schema(cursor)
+        backend.create_schema(cursor)
+
+    counts = {}
+    for object_type, model in [('task', Task), ('project', Project)]:
+        ids = list(model.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            index_objects(object_type, ids[start:start + batch_size], using=using)
+        counts[object_type] = len(ids)
+    return counts
+
+
+# ----------------------------
+# Querying
+# ----------------------------
+
+def _search(queryset, object_type, text, fallback):
+    backend = get_backend(queryset.db)
+    if backend is None:
+        return queryset.filter(fallback).distinct().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    query = backend.build_query(text)
+    if query is None:
+        return queryset.none()
+
+    table = queryset.model._meta.db_table
+    outer_pk = f'"{table}"."{queryset.model._meta.pk.column}"'
+    match_sql, match_params = backend.match_sql(object_type, query)
+    rank_sql, rank_params = backend.rank_sql(object_type, query, outer_pk)
+    return queryset.filter(pk__in=RawSQL(match_sql, match_params)).annotate(
+        search_rank=RawSQL(rank_sql, rank_params, output_field=FloatField())
+    )
+
+
+def search_tasks(queryset, text):
+    """Filter a task queryset by a search string and annotate ``search_rank`` (higher is better)"""
+    fallback = (
+        Q(title__icontains=text) |
+        Q(description__icontains=text) |
+        Q(assigned_to__username__icontains=text) |
+        Q(assigned_to__first_name__icontains=text) |
+        Q(assigned_to__last_name__icontains=text)
+    )
+    return _search(queryset, 'task', text, fallback)
+
+
+def search_projects(queryset, text):
+    """Filter a project queryset by a search string and annotate ``search_rank`` (higher is better)"""
+    fallback = (
+        Q(title__icontains=text) |
+        Q(description__icontains=text) |
+        Q(assigned_to_admin__username__icontains=text) |
+        Q(assigned_to_admin__first_name__icontains=text) |
+        Q(assigned_to_admin__last_name__icontains=text) |
+        Q(division__name__icontains=text)
+    )
+    return _search(queryset, 'project', text, fallback)
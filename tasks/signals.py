@@ -0,0 +1,317 @@
+"""
+Signal handlers keeping derived data (cached statistics, project rollups,
+schedules, the dependency closure table, unread notification counters and
+the search index) in sync with writes, and publishing live update events.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import User, Division, Project, Task, Comment, Notification
+from .dependencies import (
+    check_new_dependencies, closure_enabled, add_dependency_paths, remove_dependency_paths
+)
+from .events import publish_task_event
+from .notifications import adjust_unread_counts, get_task_watchers, invalidate_unread_counts
+from .scheduling import invalidate_project_schedules
+from .search import schedule_index, remove_objects
+from .stats import invalidate_dashboard_stats
+
+
+# ----------------------------
+# Dashboard statistics cache
+# ----------------------------
+
+@receiver(post_save, sender=Task)
+def task_saved_update_stats(sender, instance, created, **kwargs):
+    """Invalidate stats for the task's assignees, division and super admins"""
+    user_ids = [] if created else list(instance.assigned_to.values_list('id', flat=True))
+    invalidate_dashboard_stats(user_ids=user_ids, division_ids=[instance.division_id])
+
+
+@receiver(pre_delete, sender=Task)
+def task_deleted_update_stats(sender, instance, **kwargs):
+    """Invalidate stats before the assignee rows disappear with the task"""
+    user_ids = list(instance.assigned_to.values_list('id', flat=True))
+    invalidate_dashboard_stats(user_ids=user_ids, division_ids=[instance.division_id])
+
+
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def task_assignees_changed_update_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate stats for everyone sharing the affected tasks"""
+    if action == 'pre_clear':
+        # Remember who is about to be removed; pk_set is empty for clears
+        if reverse:
+            instance._stats_cleared_ids = list(instance.assigned_tasks.values_list('id', flat=True))
+        else:
+            instance._stats_cleared_ids = list(instance.assigned_to.values_list('id', flat=True))
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    changed_ids = set(pk_set or ()) | set(getattr(instance, '_stats_cleared_ids', ()))
+    if reverse:
+        # instance is a User and the changed ids are task ids
+        task_ids = changed_ids
+        user_ids = {instance.pk}
+        division_ids = set(Task.objects.filter(id__in=task_ids).values_list('division_id', flat=True))
+    else:
+        task_ids = {instance.pk}
+        user_ids = changed_ids
+        division_ids = {instance.division_id}
+
+    # Co-assignees see their team member counts change too
+    user_ids |= set(
+        sender.objects.filter(task_id__in=task_ids).values_list('user_id', flat=True)
+    )
+    invalidate_dashboard_stats(user_ids=user_ids, division_ids=division_ids)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed_update_stats(sender, instance, update_fields=None, **kwargs):
+    """Invalidate stats affected by a user's role, division or approval state"""
+    # Logins only touch last_login, which no statistic depends on
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_dashboard_stats(user_ids=[instance.pk], division_ids=[instance.division_id])
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed_update_stats(sender, instance, **kwargs):
+    """Invalidate project counts for the division and the managing admin"""
+    invalidate_dashboard_stats(
+        user_ids=[instance.assigned_to_admin_id],
+        division_ids=[instance.division_id]
+    )
+
+
+# ----------------------------
+# Project task rollups
+# ----------------------------
+
+@receiver(post_delete, sender=Task)
+def task_deleted_update_rollups(sender, instance, **kwargs):
+    """Remove a deleted task from its project's rollup counters"""
+    Project.adjust_task_rollups(
+        instance.get_loaded_value('project_id'),
+        instance.get_loaded_value('status'),
+        -1
+    )
+
+
+# ----------------------------
+# Task dependencies
+# ----------------------------
+
+@receiver(m2m_changed, sender=Task.depends_on.through)
+def task_dependencies_check_cycles(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refuse dependency edges that would create a cycle"""
+    if action != 'pre_add' or not pk_set:
+        return
+    if reverse:
+        # instance is the dependency being added to each task in pk_set
+        for task_id in pk_set:
+            check_new_dependencies(task_id, [instance.pk])
+    else:
+        check_new_dependencies(instance.pk, pk_set)
+
+
+def _dependency_edges(instance, reverse, pk_set=None):
+    """Existing (task_id, depends_on_id) edges touched by an m2m change"""
+    if reverse:
+        edges = Task.depends_on.through.objects.filter(to_task_id=instance.pk)
+        if pk_set is not None:
+            edges = edges.filter(from_task_id__in=pk_set)
+    else:
+        edges = Task.depends_on.through.objects.filter(from_task_id=instance.pk)
+        if pk_set is not None:
+            edges = edges.filter(to_task_id__in=pk_set)
+    return list(edges.values_list('from_task_id', 'to_task_id'))
+
+
+@receiver(m2m_changed, sender=Task.depends_on.through)
+def task_dependencies_changed_update_paths(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the dependency closure table in step with the edges"""
+    if not closure_enabled():
+        return
+    if action == 'post_add' and pk_set:
+        # pk_set only holds the newly linked ids at this point
+        if reverse:
+            add_dependency_paths([(task_id, instance.pk) for task_id in pk_set])
+        else:
+            add_dependency_paths([(instance.pk, depends_on_id) for depends_on_id in pk_set])
+    elif action == 'pre_remove' and pk_set:
+        # pk_set may name ids that are not linked; only discount real edges
+        remove_dependency_paths(_dependency_edges(instance, reverse, pk_set))
+    elif action == 'pre_clear':
+        remove_dependency_paths(_dependency_edges(instance, reverse))
+
+
+@receiver(pre_delete, sender=Task)
+def task_deleted_update_paths(sender, instance, **kwargs):
+    """
+    Unlink the task first so paths running through it are discounted; the
+    cascade alone would only drop the rows that name the task itself.
+    """
+    if closure_enabled():
+        instance.depends_on.clear()
+        instance.dependent_tasks.clear()
+
+
+# ----------------------------
+# Project schedules
+# ----------------------------
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_changed_update_schedule(sender, instance, **kwargs):
+    """Drop the cached schedule of the task's project (and its previous one)"""
+    invalidate_project_schedules([instance.project_id, instance.get_loaded_value('project_id')])
+
+
+@receiver(m2m_changed, sender=Task.depends_on.through)
+def task_dependencies_changed_update_schedule(sender, instance, action, **kwargs):
+    """Dependencies only count within a project, so the instance's project covers every edge"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_project_schedules([instance.project_id])
+
+
+@receiver(post_save, sender=Project)
+def project_saved_update_schedule(sender, instance, **kwargs):
+    """The forecast is compared against the project's end date"""
+    invalidate_project_schedules([instance.pk])
+
+
+# ----------------------------
+# Unread notification counters
+# ----------------------------
+# Bulk inserts and mark_as_read/mark_all_read adjust the counters themselves;
+# these cover single saves and deletes (admin, shell, cascades).
+
+@receiver(post_save, sender=Notification)
+def notification_saved_update_unread(sender, instance, created, **kwargs):
+    """Count a new unread notification, recount after any other save"""
+    if not created:
+        invalidate_unread_counts([instance.recipient_id])
+    elif not instance.is_read:
+        adjust_unread_counts([instance.recipient_id])
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted_update_unread(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread_counts([instance.recipient_id], -1)
+
+
+# ----------------------------
+# Live updates (server-sent events)
+# ----------------------------
+# Nothing is published (or queried for it) unless LIVE_UPDATES is on. Bulk
+# status changes (dependency propagation) publish their own events.
+
+@receiver(post_save, sender=Task)
+def task_saved_publish_status(sender, instance, created, **kwargs):
+    """Push status changes to the task page and its watchers' dashboards"""
+    if not settings.LIVE_UPDATES:
+        return
+    old_status = instance.get_loaded_value('status')
+    if created or old_status == instance.status:
+        return
+    transaction.on_commit(lambda: publish_task_event(
+        instance, 'task.status', {'old_status': old_status}, watcher_ids=get_task_watchers(instance)
+    ))
+
+
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def task_assignees_changed_publish(sender, instance, action, reverse, pk_set, **kwargs):
+    """Push new assignments; the new assignees are among the watchers"""
+    if not settings.LIVE_UPDATES or action != 'post_add' or reverse or not pk_set:
+        return
+    user_ids = sorted(pk_set)
+    transaction.on_commit(lambda: publish_task_event(
+        instance, 'task.assigned', {'user_ids': user_ids}, watcher_ids=get_task_watchers(instance)
+    ))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved_publish(sender, instance, created, **kwargs):
+    """Push new comments; internal ones only reach admins"""
+    if not settings.LIVE_UPDATES or not created:
+        return
+    task = instance.task
+    author = instance.user.get_full_name() or instance.user.username
+    transaction.on_commit(lambda: publish_task_event(
+        task, 'task.comment', {'comment_id': instance.pk, 'author': author},
+        watcher_ids=get_task_watchers(task), internal=instance.is_internal,
+    ))
+
+
+# ----------------------------
+# Full-text search index
+# ----------------------------
+
+@receiver(post_save, sender=Task)
+def task_saved_update_search(sender, instance, **kwargs):
+    """Reindex a task after it is saved"""
+    schedule_index('task', [instance.pk])
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted_update_search(sender, instance, **kwargs):
+    """Drop a deleted task from the index"""
+    transaction.on_commit(lambda: remove_objects('task', [instance.pk]))
+
+
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def task_assignees_changed_update_search(sender, instance, action, reverse, pk_set, **kwargs):
+    """Reindex tasks whose assignee names changed"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        task_ids = set(pk_set or ()) | set(getattr(instance, '_stats_cleared_ids', ()))
+    else:
+        task_ids = [instance.pk]
+    schedule_index('task', task_ids)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed_update_search(sender, instance, **kwargs):
+    """Reindex the task a comment belongs to"""
+    schedule_index('task', [instance.task_id])
+
+
+@receiver(post_save, sender=Project)
+def project_saved_update_search(sender, instance, **kwargs):
+    """Reindex a project after it is saved"""
+    schedule_index('project', [instance.pk])
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted_update_search(sender, instance, **kwargs):
+    """Drop a deleted project from the index"""
+    transaction.on_commit(lambda: remove_objects('project', [instance.pk]))
+
+
+@receiver(post_save, sender=User)
+def user_saved_update_search(sender, instance, created, update_fields=None, **kwargs):
+    """Reindex documents carrying the user's name when it changed"""
+    if created or (update_fields is not None and not set(User.SEARCH_NAME_FIELDS) & set(update_fields)):
+        return
+    # Profile edits, approvals and password changes save every field
+    if instance.search_names_changed():
+        schedule_index('task', instance.assigned_tasks.values_list('id', flat=True))
+        schedule_index('project', instance.managed_projects.values_list('id', flat=True))
+    instance._loaded_names = {name: getattr(instance, name) for name in User.SEARCH_NAME_FIELDS}
+
+
+@receiver(post_save, sender=Division)
+def division_saved_update_search(sender, instance, created, **kwargs):
+    """Reindex projects showing a renamed division"""
+    if not created:
+        schedule_index('project', instance.project_set.values_list('id', flat=True))
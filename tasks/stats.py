@@ -0,0 +1,154 @@
+"""
+Task statistics engine shared by the dashboard, reports and project views.
+
+All status buckets and the overdue count are computed with conditional
+aggregation so a scoped queryset is scanned once instead of once per count.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Task
+
+
+# Statuses that still count towards "overdue" once the due date has passed
+OVERDUE_STATUSES = ['pending', 'in_progress']
+
+
+def overdue_q(now=None):
+    """Get the Q object matching overdue tasks"""
+    return Q(due_date__lt=now or timezone.now(), status__in=OVERDUE_STATUSES)
+
+
+def get_task_stats(tasks, now=None):
+    """
+    Get total, per-status and overdue counts for a task queryset in one query.
+
+    Returns a dict with a ``total`` key, one key per ``Task.STATUS_CHOICES``
+    value (``pending``, ``in_progress``, ``completed``...) and ``overdue``.
+    """
+    stats = tasks.order_by().aggregate(**_task_stats_aggregates(now))
+    # Aggregates over an empty result can come back as None on some backends
+    return {key: value or 0 for key, value in stats.items()}
+
+
+def _task_stats_aggregates(now=None):
+    aggregates = {'total': Count('pk')}
+    for status, _label in Task.STATUS_CHOICES:
+        aggregates[status] = Count('pk', filter=Q(status=status))
+    aggregates['overdue'] = Count('pk', filter=overdue_q(now))
+    return aggregates
+
+
+# ----------------------------
+# Per-user dashboard statistics cache
+# ----------------------------
+#
+# Cached entries are keyed on a set of generation tokens instead of being
+# deleted one by one. Writes bump the tokens for the scopes they touch (the
+# affected users, their division and the global scope) and readers simply
+# miss on the next lookup, so a warm read never touches the database.
+# Entries are recomputed rather than patched in place: several figures
+# (overdue, due this week, this month's completion rate) move with the clock,
+# so a delta applied at write time would not keep them right. Bulk writes
+# that bypass the model signals (queryset.update) must call
+# invalidate_dashboard_stats themselves.
+
+DASHBOARD_STATS_PREFIX = 'dashboard_stats'
+GLOBAL_SCOPE = 'all'
+
+
+def _generation_key(scope):
+    return f'{DASHBOARD_STATS_PREFIX}:gen:{scope}'
+
+
+def _user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def _division_scope(division_id):
+    return f'division:{division_id}'
+
+
+def _bump_generations(scopes):
+    """Replace the generation token of each scope so dependent entries miss"""
+    token = uuid.uuid4().hex[:12]
+    cache.set_many({_generation_key(scope): token for scope in scopes}, None)
+
+
+def get_stats_generation():
+    """Get a token that changes whenever any task, project or user is written"""
+    scopes = ['epoch', GLOBAL_SCOPE]
+    generations = cache.get_many([_generation_key(name) for name in scopes])
+    return '.'.join(generations.get(_generation_key(name), '0') for name in scopes)
+
+
+def _dashboard_stats_key(user):
+    """Get the versioned cache key for a user's dashboard statistics"""
+    if user.is_super_admin():
+        scope = GLOBAL_SCOPE
+    elif user.is_admin():
+        scope = _division_scope(user.division_id)
+    else:
+        scope = None
+
+    scopes = ['epoch', _user_scope(user.pk)] + ([scope] if scope else [])
+    generations = cache.get_many([_generation_key(name) for name in scopes])
+    version = '.'.join(generations.get(_generation_key(name), '0') for name in scopes)
+    return f'{DASHBOARD_STATS_PREFIX}:{user.pk}:{version}'
+
+
+def _compute(user):
+    # Imported lazily: models.get_dashboard_stats delegates back to this module
+    from .models import compute_dashboard_stats
+    return compute_dashboard_stats(user)
+
+
+def get_cached_dashboard_stats(user):
+    """Get a user's dashboard statistics, computing and caching them on a miss"""
+    key = _dashboard_stats_key(user)
+    stats = cache.get(key)
+    if stats is None:
+        stats = _compute(user)
+        cache.set(key, stats, settings.DASHBOARD_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_dashboard_stats(user_ids=(), division_ids=()):
+    """
+    Invalidate cached dashboard statistics after a write.
+
+    The global scope (super admins) is always bumped since it covers every
+    task, project and user. Bumps are deferred until the surrounding
+    transaction commits so readers cannot re-cache pre-commit data.
+    """
+    scopes = [GLOBAL_SCOPE]
+    scopes += [_user_scope(user_id) for user_id in set(user_ids) if user_id]
+    scopes += [_division_scope(division_id) for division_id in set(division_ids)]
+    transaction.on_commit(lambda: _bump_generations(scopes))
+
+
+def rebuild_dashboard_stats(users=None):
+    """
+    Drop every cached dashboard entry and recompute stats for the given users.
+
+    Returns the number of users whose statistics were warmed.
+    """
+    _bump_generations(['epoch'])
+    if users is None:
+        return 0
+
+    warmed = 0
+    for user in users:
+        cache.set(
+            _dashboard_stats_key(user),
+            _compute(user),
+            settings.DASHBOARD_STATS_CACHE_TIMEOUT
+        )
+        warmed += 1
+    return warmed
@@ -1,3 +1,1518 @@
-from django.test import TestCase
+import io
+import json
+import re
+import shutil
+import statistics
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import async_views, views
+from .activity import ActivityLogBuffer, log_activity
+from .admin import TaskAdmin
+from .archive import archive_logs, get_records, read_segment
+from .context_processors import notifications as notifications_context
+from .dependencies import (
+    DependencyCycleError, build_dependency_paths, get_downstream_ids, get_upstream_ids,
+    propagate_blocked_status,
+)
+from .exports import XLSX_CONTENT_TYPE, iter_export_tasks, run_export_job
+from .history import HistoryRecorder
+from .mailer import (
+    get_retry_delay, queue_email, queue_notification_emails, requeue_stale_emails, send_pending_emails
+)
+from .management.commands.run_export_worker import Command as RunExportWorkerCommand
+from .models import (
+    ActivityLog, Comment, Division, ExportJob, Notification, OutboundEmail, Project, ReminderSweep, Task,
+    TaskDependencyPath, TaskHistory, User, get_dashboard_stats, resolve_related_objects,
+)
+from .notifications import (
+    build_notification_digests, get_recent_notifications, get_unread_count, mark_all_read, notify,
+    notify_task_comment, notify_task_completed,
+)
+from .pagination import CursorPaginator
+from .permissions import resolve_task_permissions
+from .reminders import send_deadline_reminders
+from .reports import ReportQuery, get_completion_stats
+from .scheduling import compute_project_schedule, get_project_schedule
+from .search import search_tasks
+
+
+# The background activity writer runs outside the test transaction
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class TaskTestCase(TestCase):
+    """Shared fixtures: two divisions, an admin and a regular user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.division = Division.objects.create(name='Engineering')
+        cls.other_division = Division.objects.create(name='Operations')
+        cls.admin = User.objects.create_user(
+            username='admin', password='x', role='admin', division=cls.division, is_active=True
+        )
+        cls.user = User.objects.create_user(
+            username='worker', password='x', email='worker@example.com', division=cls.division, is_active=True
+        )
+
+    def setUp(self):
+        # Cached statistics and counters outlive the rolled back test data
+        cache.clear()
+
+    def make_task(self, title='Task', **kwargs):
+        kwargs.setdefault('created_by', self.admin)
+        kwargs.setdefault('division', self.division)
+        return Task.objects.create(title=title, **kwargs)
+
+    def bulk_update_status(self, queryset, status):
+        """Run the admin bulk status action as the admin user"""
+        request = RequestFactory().post('/admin/tasks/task/')
+        request.user = self.admin
+        return TaskAdmin(Task, site)._bulk_update_status(request, queryset, status)
+
+
+# ----------------------------
+# Dashboard statistics cache
+# ----------------------------
+
+class DashboardStatsCacheTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task = self.make_task('Report')
+            self.task.assigned_to.add(self.user)
+
+    def task_stats(self, user):
+        return get_dashboard_stats(user)['tasks']
+
+    def test_warm_reads_skip_the_database(self):
+        self.task_stats(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.task_stats(self.user)['total'], 1)
+
+    def test_saves_invalidate_assignees_and_division_admins(self):
+        self.assertEqual(self.task_stats(self.user)['pending'], 1)
+        self.assertEqual(self.task_stats(self.admin)['pending'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.status = 'completed'
+            self.task.save()
+        self.assertEqual(self.task_stats(self.user)['completed'], 1)
+        self.assertEqual(self.task_stats(self.admin)['completed'], 1)
+
+    def test_assignment_changes_invalidate_both_sides(self):
+        other = self.make_task('Other')
+        self.assertEqual(self.task_stats(self.user)['total'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.assigned_to.add(self.user)
+        self.assertEqual(self.task_stats(self.user)['total'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.assigned_tasks.remove(other)
+        self.assertEqual(self.task_stats(self.user)['total'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.assigned_to.clear()
+        self.assertEqual(self.task_stats(self.user)['total'], 0)
+
+    def test_deletes_invalidate_former_assignees(self):
+        self.assertEqual(self.task_stats(self.user)['total'], 1)
+        self.assertEqual(self.task_stats(self.admin)['total'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.delete()
+        self.assertEqual(self.task_stats(self.user)['total'], 0)
+        self.assertEqual(self.task_stats(self.admin)['total'], 0)
+
+    def test_other_divisions_keep_their_entries(self):
+        outsider = User.objects.create_user(
+            username='ops', password='x', role='admin', division=self.other_division, is_active=True
+        )
+        self.task_stats(outsider)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.status = 'completed'
+            self.task.save()
+        with self.assertNumQueries(0):
+            self.task_stats(outsider)
+
+    def test_admin_bulk_actions_invalidate(self):
+        self.assertEqual(self.task_stats(self.user)['pending'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bulk_update_status(Task.objects.all(), 'completed')
+        self.assertEqual(self.task_stats(self.user)['completed'], 1)
+        self.assertEqual(self.task_stats(self.admin)['completed'], 1)
+
+
+# ----------------------------
+# Project task rollups
+# ----------------------------
+
+class ProjectRollupTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(title='Website', division=self.division, created_by=self.admin)
+        self.other = Project.objects.create(title='Mobile', division=self.division, created_by=self.admin)
+
+    def rollups(self, project):
+        project.refresh_from_db()
+        return project.task_count, project.completed_task_count, project.active_task_count
+
+    def assertRollupsMatchTasks(self):
+        self.assertEqual(Project.sync_task_rollups(repair=False), [])
+
+    def test_counters_follow_creates_status_changes_and_moves(self):
+        pending = self.make_task('pending', project=self.project)
+        done = self.make_task('done', project=self.project, status='completed')
+        self.make_task('cancelled', project=self.project, status='cancelled')
+        self.assertEqual(self.rollups(self.project), (3, 1, 1))
+
+        pending.status = 'completed'
+        pending.save()
+        self.assertEqual(self.rollups(self.project), (3, 2, 0))
+
+        done.project = self.other
+        done.status = 'in_progress'
+        done.save()
+        self.assertEqual(self.rollups(self.project), (2, 1, 0))
+        self.assertEqual(self.rollups(self.other), (1, 0, 1))
+
+        done.project = None
+        done.save()
+        self.assertEqual(self.rollups(self.other), (0, 0, 0))
+        self.assertRollupsMatchTasks()
+
+    def test_counters_follow_update_fields_saves_and_deletes(self):
+        task = self.make_task('task', project=self.project)
+        task.status = 'completed'
+        task.save(update_fields=['status'])
+        self.assertEqual(self.rollups(self.project), (1, 1, 0))
+
+        # Saves that cannot change the rollups leave them alone
+        task.title = 'renamed'
+        task.save(update_fields=['title'])
+        self.assertEqual(self.rollups(self.project), (1, 1, 0))
+
+        Task.objects.get(pk=task.pk).delete()
+        self.assertEqual(self.rollups(self.project), (0, 0, 0))
+        self.assertRollupsMatchTasks()
+
+    def test_sync_repairs_drift(self):
+        self.make_task('task', project=self.project)
+        Task.objects.update(status='completed')
+        drifted = Project.sync_task_rollups()
+        self.assertEqual([project.pk for project in drifted], [self.project.pk])
+        self.assertEqual(self.rollups(self.project), (1, 1, 0))
+
+
+# ----------------------------
+# Cursor pagination
+# ----------------------------
+
+def walk_cursor_pages(paginator):
+    """Follow next cursors from the first page to the last"""
+    pages, cursor = [], None
+    while True:
+        page = paginator.get_page(cursor)
+        pages.append(page)
+        if not page.has_next():
+            return pages
+        cursor = page.next_cursor
+
+
+class CursorPaginationTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        tasks = [self.make_task(f'task {n}') for n in range(23)]
+        # Equal timestamps force the id tie-breaker to do its job
+        same_time = timezone.now() - timedelta(days=1)
+        Task.objects.filter(pk__in=[task.pk for task in tasks[5:12]]).update(created_at=same_time)
+        self.expected = list(Task.objects.order_by('-created_at', 'id').values_list('id', flat=True))
+        self.paginator = CursorPaginator(Task.objects.all(), ('-created_at', 'id'), 5)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        pages = walk_cursor_pages(self.paginator)
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+        self.assertEqual([task.pk for page in pages for task in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+
+    def test_previous_cursors_walk_back(self):
+        pages = walk_cursor_pages(self.paginator)
+        page = pages[-1]
+        for earlier in reversed(pages[:-1]):
+            page = self.paginator.get_page(page.previous_cursor)
+            self.assertEqual([task.pk for task in page], [task.pk for task in earlier])
+        self.assertTrue(page.has_next())
+
+    def test_invalid_cursors_give_the_first_page(self):
+        first = [task.pk for task in self.paginator.get_page()]
+        cursor = self.paginator.get_page().next_cursor
+        for bad in ['garbage', cursor[:-2] + 'xx']:
+            self.assertEqual([task.pk for task in self.paginator.get_page(bad)], first)
+
+
+class RankedCursorPaginationTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(12):
+                self.make_task('budget ' * (n % 3 + 1) + str(n), description='budget')
+        self.queryset = search_tasks(Task.objects.all(), 'budget')
+        self.expected = list(self.queryset.order_by('-search_rank', '-created_at', 'id').values_list('id', flat=True))
+
+    def test_pages_follow_the_rank(self):
+        paginator = CursorPaginator(self.queryset, ('-search_rank', '-created_at', 'id'), 4)
+        pages = walk_cursor_pages(paginator)
+        self.assertEqual([task.pk for page in pages for task in page], self.expected)
+        previous = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual([task.pk for task in previous], [task.pk for task in pages[-2]])
+
+    def test_task_list_cursor_mode_orders_by_rank(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('task_list'), {'search': 'budget', 'cursor': ''})
+        page = response.context['page_obj']
+        self.assertEqual([task.pk for task in page], self.expected[:10])
+        response = self.client.get(reverse('task_list'), {'search': 'budget', 'cursor': page.next_cursor})
+        self.assertEqual([task.pk for task in response.context['page_obj']], self.expected[10:])
+
+
+# ----------------------------
+# Full-text search
+# ----------------------------
+
+class SearchTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        # The index is updated once the writing transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title_match = self.make_task('Quarterly budget review', description='<p>Numbers</p>')
+            self.body_match = self.make_task('Planning', description='<p>Check the <b>budget</b> figures</p>')
+            self.other = self.make_task('Office move', description='Boxes')
+
+    def search(self, text, queryset=None):
+        return list(search_tasks(queryset or Task.objects.all(), text).order_by('-search_rank', 'id'))
+
+    def test_title_matches_rank_first(self):
+        results = self.search('budget')
+        self.assertEqual(results, [self.title_match, self.body_match])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_prefixes_and_every_term_match(self):
+        self.assertEqual(self.search('budg'), [self.title_match, self.body_match])
+        self.assertEqual(self.search('budget quarterly'), [self.title_match])
+        self.assertEqual(self.search('nothing-like-this'), [])
+
+    def test_search_respects_the_queryset(self):
+        self.assertEqual(self.search('budget', Task.objects.exclude(pk=self.title_match.pk)), [self.body_match])
+
+    def test_index_follows_edits_comments_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.title = 'Budget for the office move'
+            self.other.save()
+            Comment.objects.create(task=self.title_match, user=self.admin, content='Vendor invoices')
+            Comment.objects.create(task=self.body_match, user=self.admin, content='Secret', is_internal=True)
+        self.assertIn(self.other, self.search('budget'))
+        self.assertEqual(self.search('invoices'), [self.title_match])
+        self.assertEqual(self.search('secret'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title_match.delete()
+        self.assertEqual(self.search('quarterly'), [])
+
+    def test_renaming_an_assignee_reindexes_their_tasks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.assigned_to.add(self.user)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Zebedee'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.search('zebedee'), [self.other])
+
+    def test_saving_a_user_without_a_name_change_skips_the_index(self):
+        self.other.assigned_to.add(self.user)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new password')
+        user.phone = '555-0100'
+        with mock.patch('tasks.signals.schedule_index') as schedule_index:
+            user.save()
+            user.last_name = 'Renamed'
+            user.save()
+            user.save()
+        self.assertEqual(schedule_index.call_count, 2)
+
+
+# ----------------------------
+# Bulk permission resolution
+# ----------------------------
+
+class TaskPermissionTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.assigned = self.make_task('assigned')
+        self.assigned.assigned_to.add(self.user)
+        self.own = self.make_task('own', created_by=self.user)
+        self.other = self.make_task('other')
+        self.ids = [self.assigned.pk, self.own.pk, self.other.pk]
+
+    def flags(self, tasks):
+        return [(task.user_is_assigned, task.user_can_edit, task.user_can_update_status) for task in tasks]
+
+    def test_one_query_for_a_whole_page(self):
+        tasks = list(Task.objects.filter(pk__in=self.ids).order_by('pk'))
+        with self.assertNumQueries(1):
+            resolve_task_permissions(tasks, self.user)
+        self.assertEqual(self.flags(tasks), [(True, True, True), (False, True, False), (False, False, False)])
+        # The model checks reuse the resolved answers
+        with self.assertNumQueries(0):
+            self.assertEqual([task.can_user_edit(self.user) for task in tasks], [True, True, False])
+
+    def test_prefetched_assignees_need_no_query(self):
+        tasks = list(Task.objects.filter(pk__in=self.ids).order_by('pk').prefetch_related('assigned_to'))
+        with self.assertNumQueries(0):
+            resolve_task_permissions(tasks, self.user)
+        self.assertEqual(self.flags(tasks), [(True, True, True), (False, True, False), (False, False, False)])
+
+    def test_admins_can_edit_everything(self):
+        tasks = resolve_task_permissions(Task.objects.filter(pk__in=self.ids).order_by('pk'), self.admin)
+        self.assertEqual(self.flags(tasks), [(False, True, True)] * 3)
+
+    def test_answers_match_the_per_task_checks(self):
+        for user in (self.user, self.admin):
+            tasks = resolve_task_permissions(Task.objects.filter(pk__in=self.ids).order_by('pk'), user)
+            fresh = Task.objects.filter(pk__in=self.ids).order_by('pk')
+            self.assertEqual(
+                [(task.user_is_assigned, task.user_can_edit) for task in tasks],
+                [(task.is_assigned_to_user(user), task.can_user_edit(user)) for task in fresh]
+            )
+
+
+# ----------------------------
+# Report export jobs
+# ----------------------------
+
+class ExportJobTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.make_task('Exported')
+
+    def make_job(self, **kwargs):
+        return ExportJob.objects.create(requested_by=self.admin, export_format='excel', **kwargs)
+
+    def test_claim_starts_the_heartbeat(self):
+        job = self.make_job()
+        self.assertTrue(job.claim())
+        self.assertFalse(ExportJob.objects.get(pk=job.pk).claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.heartbeat_at), ('running', job.started_at))
+
+    def test_only_jobs_with_a_stale_heartbeat_are_requeued(self):
+        now = timezone.now()
+        long_running = self.make_job(
+            status='running', started_at=now - timedelta(hours=3), heartbeat_at=now - timedelta(minutes=1)
+        )
+        abandoned = self.make_job(
+            status='running', started_at=now - timedelta(minutes=20), heartbeat_at=now - timedelta(minutes=10)
+        )
+        self.assertEqual(ExportJob.requeue_stale(15, now=now), 0)
+        self.assertEqual(ExportJob.requeue_stale(5, now=now), 1)
+        long_running.refresh_from_db()
+        abandoned.refresh_from_db()
+        self.assertEqual(long_running.status, 'running')
+        self.assertEqual((abandoned.status, abandoned.started_at, abandoned.heartbeat_at), ('pending', None, None))
+
+    def test_heartbeats_keep_long_jobs_running(self):
+        now = timezone.now()
+        job = self.make_job(status='running', started_at=now - timedelta(hours=1), heartbeat_at=now - timedelta(hours=1))
+        finished = self.make_job(status='completed')
+        self.assertEqual(ExportJob.record_heartbeats([job.pk, finished.pk], now=now), 1)
+        self.assertEqual(ExportJob.requeue_stale(5, now=now), 0)
+
+    @override_settings(EXPORT_JOB_STALE_MINUTES=5)
+    def test_worker_housekeeping_uses_the_threshold(self):
+        now = timezone.now()
+        self.make_job(status='running', started_at=now - timedelta(hours=1), heartbeat_at=now - timedelta(minutes=10))
+        command = RunExportWorkerCommand(stdout=io.StringIO())
+        command.housekeeping(settings.EXPORT_JOB_STALE_MINUTES)
+        self.assertEqual(ExportJob.objects.get().status, 'pending')
+
+    def test_run_export_job_writes_the_workbook(self):
+        job = self.make_job()
+        job.claim()
+        self.assertEqual(run_export_job(job.pk), 'completed')
+        job.refresh_from_db()
+        self.assertEqual(job.row_count, 1)
+        self.assertTrue(job.is_downloadable())
+
+    def test_exports_run_inline_by_default(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export_tasks_excel'))
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+        self.assertFalse(ExportJob.objects.exists())
+
+    @override_settings(EXPORT_BACKGROUND_JOBS=True)
+    def test_background_exports_are_queued(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export_tasks_excel'))
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('export_job_detail', args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual(job.status, 'pending')
+
+
+# ----------------------------
+# Report filters
+# ----------------------------
+
+class ReportQueryTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(title='Website', division=self.division, created_by=self.admin)
+        self.assigned = self.make_task('assigned', project=self.project)
+        self.assigned.assigned_to.add(self.user)
+        self.created = self.make_task('created', created_by=self.user, status='completed')
+        self.elsewhere = self.make_task('elsewhere', division=self.other_division)
+        Task.objects.filter(pk=self.created.pk).update(created_at=timezone.make_aware(datetime(2026, 3, 10, 23, 30)))
+
+    def query(self, user, params=''):
+        return ReportQuery.from_params(user, QueryDict(params))
+
+    def titles(self, report):
+        return sorted(report.queryset().values_list('title', flat=True))
+
+    def test_equivalent_parameters_share_a_key(self):
+        first = self.query(self.admin, 'status=pending&status=completed&date_from=2026-03-01')
+        second = self.query(self.admin, 'date_from=2026-03-01&status=completed&status=pending&status=completed')
+        self.assertEqual(first.key, second.key)
+        self.assertEqual(first.cache_key('x'), second.cache_key('x'))
+        self.assertNotEqual(first.key, self.query(self.user, 'status=pending&status=completed&date_from=2026-03-01').key)
+
+    def test_invalid_values_are_dropped_with_a_message(self):
+        report = self.query(self.admin, 'date_from=yesterday&division=abc&project=-1&status=bogus')
+        self.assertEqual(len(report.errors), 3)
+        self.assertEqual(report.key, self.query(self.admin).key)
+
+    def test_scopes(self):
+        self.assertEqual(self.titles(self.query(self.user)), ['assigned', 'created'])
+        self.assertEqual(self.titles(self.query(self.admin)), ['assigned', 'created'])
+        self.admin.role = 'super_admin'
+        self.assertEqual(self.titles(self.query(self.admin)), ['assigned', 'created', 'elsewhere'])
+
+    def test_filters(self):
+        self.assertEqual(self.titles(self.query(self.admin, 'date_from=2026-03-10&date_to=2026-03-10')), ['created'])
+        self.assertEqual(self.titles(self.query(self.admin, 'status=completed')), ['created'])
+        self.assertEqual(self.titles(self.query(self.admin, 'project=no_project')), ['created'])
+        self.assertEqual(self.titles(self.query(self.admin, f'project={self.project.pk}')), ['assigned'])
+        self.assertEqual(self.titles(self.query(self.admin, f'assigned_to={self.user.pk}')), ['assigned'])
+
+    def test_aggregates_are_cached_until_a_write(self):
+        report = self.query(self.admin)
+        self.assertEqual(report.task_stats()['total'], 2)
+        with self.assertNumQueries(0):
+            self.query(self.admin).task_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_task('new')
+        self.assertEqual(self.query(self.admin).task_stats()['total'], 3)
+
+    def test_dashboard_reports_invalid_filters(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('reports'), {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Invalid date "yesterday" ignored', ' '.join(str(m) for m in response.context['messages']))
+
+
+# ----------------------------
+# Completion time statistics
+# ----------------------------
+
+class CompletionStatsTests(TaskTestCase):
+    def make_completed(self, hours, division):
+        task = self.make_task(division=division)
+        created = timezone.now() - timedelta(days=30)
+        Task.objects.filter(pk=task.pk).update(
+            status='completed', created_at=created, completed_at=created + timedelta(hours=hours)
+        )
+
+    @staticmethod
+    def percentile(values, p):
+        values = sorted(values)
+        rank = p * (len(values) - 1)
+        lower = int(rank)
+        if lower + 1 == len(values):
+            return values[lower]
+        return values[lower] + (values[lower + 1] - values[lower]) * (rank - lower)
+
+    def assertStats(self, row, hours):
+        self.assertEqual(row['count'], len(hours))
+        self.assertAlmostEqual(row['mean'], statistics.mean(hours), places=3)
+        self.assertAlmostEqual(row['median'], self.percentile(hours, 0.5), places=3)
+        self.assertAlmostEqual(row['p90'], self.percentile(hours, 0.9), places=3)
+
+    def test_overall_and_per_dimension(self):
+        engineering, operations = [1, 2, 3, 4, 10], [5, 7]
+        for hours in engineering:
+            self.make_completed(hours, self.division)
+        for hours in operations:
+            self.make_completed(hours, self.other_division)
+        # Unfinished tasks are ignored
+        self.make_task('open')
+
+        [overall] = get_completion_stats(Task.objects.all())
+        self.assertStats(overall, engineering + operations)
+        self.assertAlmostEqual(overall['p90'], 8.2, places=3)
+
+        rows = {row['division__name']: row for row in get_completion_stats(Task.objects.all(), 'division__name')}
+        self.assertStats(rows['Engineering'], engineering)
+        self.assertStats(rows['Operations'], operations)
+
+    def test_single_task_and_empty(self):
+        self.assertEqual(get_completion_stats(Task.objects.all()), [])
+        self.make_completed(6, self.division)
+        [row] = get_completion_stats(Task.objects.all())
+        self.assertStats(row, [6])
+
+
+# ----------------------------
+# Latest public comments
+# ----------------------------
+
+class LatestCommentTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tasks = [self.make_task(f'task {n}', status='in_progress') for n in range(3)]
+        first, second, _third = self.tasks
+        self.old = Comment.objects.create(task=first, user=self.user, content='Old')
+        self.new = Comment.objects.create(task=first, user=self.user, content='New')
+        Comment.objects.create(task=first, user=self.admin, content='Internal', is_internal=True)
+        # Same timestamp: the higher id wins
+        tied = [Comment.objects.create(task=second, user=self.user, content=text) for text in ('a', 'b')]
+        Comment.objects.filter(pk__in=[comment.pk for comment in tied]).update(created_at=timezone.now())
+        self.tied = tied[1]
+
+    def test_one_query_for_any_number_of_tasks(self):
+        with self.assertNumQueries(1):
+            latest = Comment.get_latest_public(task.pk for task in self.tasks)
+            # The author comes along
+            authors = {task_id: comment.user.username for task_id, comment in latest.items()}
+        self.assertEqual({task_id: comment.pk for task_id, comment in latest.items()},
+                         {self.tasks[0].pk: self.new.pk, self.tasks[1].pk: self.tied.pk})
+        self.assertEqual(set(authors.values()), {'worker'})
+
+    def test_attach_only_loads_the_requested_statuses(self):
+        Task.objects.filter(pk=self.tasks[1].pk).update(status='completed')
+        tasks = list(Task.objects.filter(pk__in=[task.pk for task in self.tasks]).order_by('pk'))
+        with self.assertNumQueries(1):
+            Comment.attach_latest_public(tasks)
+        self.assertEqual([task.latest_comment for task in tasks], [self.new, None, None])
+
+    def test_export_chunks_query_comments_once_per_chunk(self):
+        tasks = Task.objects.filter(pk__in=[task.pk for task in self.tasks]).order_by('pk')
+        # The task rows plus one comment query for each of the two chunks
+        with self.assertNumQueries(3):
+            rows = list(iter_export_tasks(tasks, chunk_size=2))
+        self.assertEqual([task.latest_comment for task in rows], [self.new, self.tied, None])
+
+
+# ----------------------------
+# Project schedules
+# ----------------------------
+
+@override_settings(SCHEDULE_DEFAULT_TASK_HOURS=8, SCHEDULE_HOURS_PER_DAY=8)
+class ProjectScheduleTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(title='Launch', division=self.division, created_by=self.admin)
+        self.design = self.make_task('design', project=self.project, estimated_hours=8)
+        self.build = self.make_task('build', project=self.project, estimated_hours=16)
+        self.docs = self.make_task('docs', project=self.project, estimated_hours=4)
+        self.build.depends_on.add(self.design)
+        self.docs.depends_on.add(self.design)
+
+    def test_critical_path_and_slack(self):
+        schedule = compute_project_schedule(self.project)
+        self.assertEqual(schedule.critical_path, [self.design.pk, self.build.pk])
+        self.assertEqual(schedule.duration_hours, 24)
+        self.assertEqual(schedule.tasks[self.docs.pk]['slack'], 12)
+        self.assertEqual(schedule.forecast_completion, (schedule.computed_at + timedelta(days=3)).date())
+
+    def test_remaining_effort_follows_progress_and_status(self):
+        Task.objects.filter(pk=self.build.pk).update(progress_percentage=75)
+        Task.objects.filter(pk=self.design.pk).update(status='completed')
+        Task.objects.filter(pk=self.docs.pk).update(estimated_hours=None)
+        schedule = compute_project_schedule(self.project)
+        self.assertEqual(schedule.tasks[self.build.pk]['duration'], 4)
+        self.assertEqual(schedule.tasks[self.docs.pk]['duration'], 8)
+        self.assertEqual(schedule.critical_path, [self.docs.pk])
+
+    def test_cycles_are_reported(self):
+        # Written straight to the table, bypassing the cycle check
+        Task.depends_on.through.objects.create(from_task=self.design, to_task=self.build)
+        schedule = compute_project_schedule(self.project)
+        self.assertIsNotNone(schedule.cycle)
+        self.assertIsNone(schedule.forecast_completion)
+
+    def test_days_late_against_the_end_date(self):
+        self.project.end_date = timezone.localdate() + timedelta(days=1)
+        schedule = compute_project_schedule(self.project)
+        self.assertEqual(schedule.days_late, 2)
+        self.assertFalse(schedule.is_on_track())
+
+    def assertScheduleRefreshed(self, write):
+        get_project_schedule(self.project)
+        with self.assertNumQueries(0):
+            get_project_schedule(self.project)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        with self.assertNumQueries(2):
+            get_project_schedule(self.project)
+
+    def test_task_saves_drop_the_cached_schedule(self):
+        def write():
+            self.docs.estimated_hours = 40
+            self.docs.save()
+        self.assertScheduleRefreshed(write)
+        self.assertEqual(get_project_schedule(self.project).critical_path, [self.design.pk, self.docs.pk])
+
+    def test_dependency_changes_drop_the_cached_schedule(self):
+        self.assertScheduleRefreshed(lambda: self.docs.depends_on.add(self.build))
+
+    def test_admin_bulk_actions_drop_the_cached_schedule(self):
+        self.assertScheduleRefreshed(
+            lambda: self.bulk_update_status(Task.objects.filter(pk=self.design.pk), 'completed')
+        )
+        self.assertEqual(get_project_schedule(self.project).duration_hours, 16)
+
+
+# ----------------------------
+# Dependency closure table
+# ----------------------------
+
+class DependencyClosureTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.a, self.b, self.c, self.d, self.e = [self.make_task(title) for title in 'abcde']
+
+    def assertClosureMatchesRebuild(self):
+        edges = list(Task.depends_on.through.objects.values_list('from_task_id', 'to_task_id'))
+        expected = sorted(build_dependency_paths(edges))
+        actual = sorted(TaskDependencyPath.objects.values_list('ancestor_id', 'descendant_id', 'depth', 'path_count'))
+        self.assertEqual(actual, expected)
+
+    def build_diamond(self):
+        # d depends on b and c, which both depend on a; e depends on d
+        self.b.depends_on.add(self.a)
+        self.c.depends_on.add(self.a)
+        self.d.depends_on.add(self.b, self.c)
+        self.e.depends_on.add(self.d)
+
+    def test_add_counts_every_path(self):
+        self.build_diamond()
+        self.assertClosureMatchesRebuild()
+        path = TaskDependencyPath.objects.get(ancestor=self.a, descendant=self.e)
+        self.assertEqual((path.depth, path.path_count), (3, 2))
+
+    def test_add_from_the_reverse_side(self):
+        self.a.dependent_tasks.add(self.b, self.c)
+        self.d.depends_on.add(self.b)
+        self.c.dependent_tasks.add(self.d)
+        self.assertClosureMatchesRebuild()
+
+    def test_remove_keeps_paths_that_still_exist(self):
+        self.build_diamond()
+        self.d.depends_on.remove(self.b)
+        self.assertClosureMatchesRebuild()
+        path = TaskDependencyPath.objects.get(ancestor=self.a, descendant=self.e)
+        self.assertEqual(path.path_count, 1)
+
+        self.d.depends_on.remove(self.c)
+        self.assertClosureMatchesRebuild()
+        self.assertFalse(TaskDependencyPath.objects.filter(ancestor=self.a, descendant=self.e).exists())
+
+    def test_remove_ignores_ids_that_are_not_linked(self):
+        self.build_diamond()
+        self.e.depends_on.remove(self.a, self.d)
+        self.assertClosureMatchesRebuild()
+
+    def test_remove_from_the_reverse_side(self):
+        self.build_diamond()
+        self.a.dependent_tasks.remove(self.c)
+        self.assertClosureMatchesRebuild()
+
+    def test_clear(self):
+        self.build_diamond()
+        self.d.depends_on.clear()
+        self.assertClosureMatchesRebuild()
+        self.a.dependent_tasks.clear()
+        self.assertClosureMatchesRebuild()
+
+    def test_deleting_a_task_discounts_paths_through_it(self):
+        self.build_diamond()
+        self.b.delete()
+        self.assertClosureMatchesRebuild()
+        self.d.delete()
+        self.assertClosureMatchesRebuild()
+        self.assertFalse(TaskDependencyPath.objects.filter(ancestor=self.a, descendant=self.e).exists())
+
+    def test_cycles_are_refused(self):
+        self.build_diamond()
+        with self.assertRaises(DependencyCycleError) as raised, transaction.atomic():
+            self.a.depends_on.add(self.e)
+        self.assertEqual(raised.exception.cycle[0], self.a.pk)
+        self.assertEqual(raised.exception.cycle[-1], self.a.pk)
+        self.assertClosureMatchesRebuild()
+
+    def test_closure_and_recursive_query_agree(self):
+        self.build_diamond()
+        upstream, downstream = get_upstream_ids([self.e.pk]), get_downstream_ids([self.a.pk])
+        self.assertEqual(upstream, {self.a.pk, self.b.pk, self.c.pk, self.d.pk})
+        self.assertEqual(downstream, {self.b.pk, self.c.pk, self.d.pk, self.e.pk})
+        with override_settings(DEPENDENCY_CLOSURE_TABLE=False):
+            self.assertEqual(get_upstream_ids([self.e.pk]), upstream)
+            self.assertEqual(get_downstream_ids([self.a.pk]), downstream)
+
+
+# ----------------------------
+# Blocked status propagation
+# ----------------------------
+
+class BlockedStatusPropagationTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.a = self.make_task('a')
+        self.b = self.make_task('b')
+        self.c = self.make_task('c')
+        self.b.depends_on.add(self.a)
+        self.c.depends_on.add(self.b)
+
+    def propagate(self, task_ids, **kwargs):
+        with HistoryRecorder(self.admin) as history:
+            return propagate_blocked_status(task_ids, history, **kwargs)
+
+    def statuses(self):
+        return dict(Task.objects.filter(pk__in=[self.a.pk, self.b.pk, self.c.pk]).values_list('title', 'status'))
+
+    def test_incomplete_dependencies_block_the_whole_downstream_set(self):
+        changes = self.propagate([self.a.pk])
+        self.assertEqual(changes, {self.b.pk: ('pending', 'blocked'), self.c.pk: ('pending', 'blocked')})
+        self.assertEqual(self.statuses(), {'a': 'pending', 'b': 'blocked', 'c': 'blocked'})
+        self.assertEqual(
+            TaskHistory.objects.filter(action='Status changed by dependencies', new_value='blocked').count(), 2
+        )
+
+    def test_completing_dependencies_unblocks(self):
+        self.propagate([self.a.pk])
+        self.a.status = 'completed'
+        self.a.save()
+        changes = self.propagate([self.a.pk])
+        # c still waits for b
+        self.assertEqual(changes, {self.b.pk: ('blocked', 'pending')})
+        self.assertEqual(self.statuses(), {'a': 'completed', 'b': 'pending', 'c': 'blocked'})
+
+    def test_tasks_in_progress_are_left_alone(self):
+        Task.objects.filter(pk=self.b.pk).update(status='in_progress')
+        changes = self.propagate([self.a.pk])
+        self.assertEqual(changes, {self.c.pk: ('pending', 'blocked')})
+
+    def test_include_tasks_reevaluates_the_given_tasks(self):
+        self.assertEqual(self.propagate([self.b.pk]), {self.c.pk: ('pending', 'blocked')})
+        self.assertEqual(self.propagate([self.b.pk], include_tasks=True), {self.b.pk: ('pending', 'blocked')})
+
+    def test_admin_bulk_actions_propagate(self):
+        self.propagate([self.a.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bulk_update_status(Task.objects.filter(pk=self.a.pk), 'completed')
+        self.assertEqual(self.statuses(), {'a': 'completed', 'b': 'pending', 'c': 'blocked'})
+        self.assertTrue(TaskHistory.objects.filter(task=self.b, user=self.admin, new_value='pending').exists())
+
+        # Reopening a task blocks its dependents again, and a selected
+        # task that still waits on an incomplete dependency is blocked
+        self.bulk_update_status(Task.objects.filter(pk__in=[self.a.pk, self.b.pk]), 'pending')
+        self.assertEqual(self.statuses(), {'a': 'pending', 'b': 'blocked', 'c': 'blocked'})
+
+
+# ----------------------------
+# Batched task history
+# ----------------------------
+
+class HistoryRecorderTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        # The edit form posts due dates to the minute
+        due_date = timezone.now().replace(second=0, microsecond=0) + timedelta(days=3)
+        self.task = self.make_task('Write docs', priority='medium', due_date=due_date)
+
+    def test_record_changes_diffs_against_the_loaded_state(self):
+        task = Task.objects.get(pk=self.task.pk)
+        task.status = 'in_progress'
+        task.priority = 'high'
+        with HistoryRecorder(self.admin, ip_address='10.0.0.1') as history:
+            self.assertEqual(history.record_changes(task), ['status', 'priority'])
+            task.save()
+            # save() refreshes the loaded state
+            self.assertEqual(history.record_changes(task), [])
+
+        entries = TaskHistory.objects.filter(task=self.task).order_by('field_changed')
+        self.assertEqual(
+            [(e.field_changed, e.old_value, e.new_value, e.ip_address, e.user_id) for e in entries],
+            [
+                ('priority', 'medium', 'high', '10.0.0.1', self.admin.pk),
+                ('status', 'pending', 'in_progress', '10.0.0.1', self.admin.pk),
+            ]
+        )
+
+    def test_entries_are_written_in_one_query(self):
+        with HistoryRecorder(self.admin) as history:
+            for n in range(5):
+                history.record(self.task.pk, 'Comment added', new_value=f'comment {n}')
+            with self.assertNumQueries(1):
+                self.assertEqual(history.flush(), 5)
+        self.assertEqual(len(history), 0)
+
+    def test_nothing_is_written_when_the_block_fails(self):
+        with self.assertRaises(ValueError):
+            with HistoryRecorder(self.admin) as history:
+                history.record(self.task, 'Title changed', 'a', 'b', field_changed='title')
+                raise ValueError
+        self.assertFalse(TaskHistory.objects.filter(task=self.task).exists())
+
+    def test_task_edit_records_every_changed_field(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('task_edit', args=[self.task.pk]), {
+            'title': 'Write the docs',
+            'description': 'Setup guide',
+            'status': 'in_progress',
+            'priority': 'medium',
+            'due_date': timezone.localtime(self.task.due_date).strftime('%Y-%m-%dT%H:%M'),
+            'assigned_to': [self.admin.pk],
+            'estimated_hours': '',
+        }, REMOTE_ADDR='10.0.0.2')
+        self.assertRedirects(response, reverse('task_detail', args=[self.task.pk]), fetch_redirect_response=False)
+
+        entries = TaskHistory.objects.filter(task=self.task)
+        self.assertEqual(
+            sorted(entries.values_list('field_changed', flat=True)), ['assigned_to', 'status', 'title']
+        )
+        self.assertEqual(set(entries.values_list('ip_address', flat=True)), {'10.0.0.2'})
+
+
+# ----------------------------
+# History archive
+# ----------------------------
+
+class ArchiveTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, ARCHIVE_RETENTION_DAYS=180)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.task = self.make_task('Archived')
+        self.other_task = self.make_task('Other')
+        old = timezone.now() - timedelta(days=400)
+        for n, task in enumerate([self.task, self.task, self.other_task, self.task]):
+            entry = TaskHistory.objects.create(task=task, user=self.user, action=f'Old {n}', new_value=f'value {n}')
+            TaskHistory.objects.filter(pk=entry.pk).update(timestamp=old + timedelta(hours=n, microseconds=n))
+        self.recent = TaskHistory.objects.create(task=self.task, user=self.admin, action='Recent')
+        self.before = list(TaskHistory.objects.filter(task=self.task).order_by('-timestamp', '-pk').values())
+
+    def test_round_trip(self):
+        self.assertEqual(archive_logs(kinds=['task_history']), {'task_history': 4})
+        self.assertEqual(list(TaskHistory.objects.values_list('pk', flat=True)), [self.recent.pk])
+
+        records = get_records('task_history', {'task_id': self.task.pk})
+        self.assertEqual([record.pk for record in records], [row['id'] for row in self.before])
+        for record, row in zip(records, self.before):
+            self.assertEqual({field: getattr(record, field) for field in row}, row)
+        self.assertFalse(getattr(records[0], 'is_archived', False))
+        self.assertTrue(all(record.is_archived for record in records[1:]))
+        # Foreign keys of archived rows are loaded
+        self.assertEqual(records[-1].user, self.user)
+
+    def test_limit_and_time_range(self):
+        archive_logs(kinds=['task_history'])
+        self.assertEqual([record.action for record in get_records('task_history', {'task_id': self.task.pk}, limit=2)],
+                         ['Recent', 'Old 3'])
+        since = timezone.now() - timedelta(days=30)
+        self.assertEqual([record.action for record in get_records('task_history', {'task_id': self.task.pk}, since=since)],
+                         ['Recent'])
+        until = timezone.now() - timedelta(days=30)
+        self.assertEqual(
+            [record.action for record in get_records('task_history', {'task_id__in': [self.other_task.pk]}, until=until)],
+            ['Old 2']
+        )
+
+    def test_rerunning_is_a_no_op(self):
+        archive_logs(kinds=['task_history'])
+        self.assertEqual(archive_logs(kinds=['task_history']), {'task_history': 0})
+        self.assertEqual(len(get_records('task_history', {'task_id': self.task.pk})), 4)
+
+    def test_task_pages_skip_segments_older_than_the_task(self):
+        archive_logs(kinds=['task_history'])
+        fresh = self.make_task('Fresh')
+        self.client.force_login(self.admin)
+        with mock.patch('tasks.archive.read_segment', wraps=read_segment) as read:
+            response = self.client.get(reverse('task_detail', args=[fresh.pk]))
+            self.assertEqual(response.status_code, 200)
+            TaskAdmin(Task, site).history_display(fresh)
+            read.assert_not_called()
+
+            # A task older than its archived history still reads it
+            Task.objects.filter(pk=self.task.pk).update(created_at=timezone.now() - timedelta(days=401))
+            self.task.refresh_from_db()
+            self.assertIn('Old 3', TaskAdmin(Task, site).history_display(self.task))
+            read.assert_called()
+
+
+# ----------------------------
+# Activity log pipeline
+# ----------------------------
+
+class ActivityLogBufferTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        # Drive the buffer from the test thread: the writer thread could not
+        # see the test transaction
+        patcher = mock.patch.object(ActivityLogBuffer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.3', HTTP_USER_AGENT='tests')
+        self.request.user = self.admin
+
+    def entry(self, n=0):
+        return ActivityLog(user=self.admin, action='view', description=f'event {n}', object_type='task', object_id=n)
+
+    def test_drain_writes_in_batches(self):
+        buffer = ActivityLogBuffer(batch_size=3)
+        for n in range(7):
+            self.assertTrue(buffer.put(self.entry(n)))
+        self.assertEqual(buffer.stats()['pending'], 7)
+        with self.assertNumQueries(3):
+            buffer.drain()
+        self.assertEqual(ActivityLog.objects.count(), 7)
+        self.assertEqual(buffer.stats(), {'queued': 7, 'written': 7, 'dropped': 0, 'failed': 0, 'pending': 0})
+
+    def test_full_queue_drops_events(self):
+        buffer = ActivityLogBuffer(max_size=2)
+        self.assertEqual([buffer.put(self.entry(n)) for n in range(3)], [True, True, False])
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        buffer.shutdown()
+        self.assertEqual(ActivityLog.objects.count(), 2)
+
+    def test_failed_writes_are_counted(self):
+        buffer = ActivityLogBuffer()
+        buffer.put(self.entry())
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=RuntimeError('locked')), \
+                self.assertLogs('tasks.activity', 'ERROR') as logs:
+            buffer.drain()
+        self.assertEqual(buffer.stats()['failed'], 1)
+        self.assertIn('Activity log write failed for 1 event(s): locked', logs.output[0])
+
+    def test_log_activity_queues_without_writing(self):
+        buffer = ActivityLogBuffer()
+        task = self.make_task('Queued')
+        with override_settings(ACTIVITY_LOG_ASYNC=True), \
+                mock.patch('tasks.activity.get_activity_buffer', return_value=buffer), \
+                self.assertNumQueries(0):
+            self.assertTrue(log_activity(self.request, 'view', obj=task, description='Viewed'))
+        buffer.drain()
+        entry = ActivityLog.objects.get()
+        self.assertEqual(
+            (entry.user, entry.object_type, entry.object_id, entry.object_name, entry.ip_address, entry.user_agent),
+            (self.admin, 'task', task.pk, str(task), '10.0.0.3', 'tests')
+        )
+
+    def test_inline_mode_writes_immediately(self):
+        self.assertTrue(log_activity(self.request, 'login', description='Logged in'))
+        self.assertEqual(ActivityLog.objects.get().description, 'Logged in')
+
+
+# ----------------------------
+# Notification fan-out
+# ----------------------------
+
+class NotificationFanOutTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.colleague = User.objects.create_user(
+            username='colleague', password='x', division=self.division, is_active=True
+        )
+        self.task = self.make_task('Release')
+        self.task.assigned_to.set([self.user, self.colleague])
+
+    def recipients(self, notification_type):
+        return set(Notification.objects.filter(
+            notification_type=notification_type
+        ).values_list('recipient__username', flat=True))
+
+    def test_notify_inserts_once_per_event(self):
+        with self.assertNumQueries(2):
+            created = notify(
+                'task_assigned', [self.user, self.user.pk, self.colleague, self.admin, None],
+                'Title', 'Message', sender=self.admin, related_object=self.task,
+            )
+        # Duplicates and the acting user are left out
+        self.assertEqual(len(created), 2)
+        self.assertEqual(self.recipients('task_assigned'), {'worker', 'colleague'})
+        self.assertEqual(
+            set(Notification.objects.values_list('related_object_type', 'related_object_id')), {('task', self.task.pk)}
+        )
+
+    def test_repeated_events_are_coalesced(self):
+        notify_task_completed(self.task, sender=self.admin)
+        self.assertEqual(notify_task_completed(self.task, sender=self.admin), [])
+        # Reading a notification lets the next event through
+        Notification.objects.filter(recipient=self.user).update(is_read=True)
+        self.assertEqual([n.recipient_id for n in notify_task_completed(self.task, sender=self.admin)], [self.user.pk])
+        with override_settings(NOTIFICATION_COALESCE_MINUTES=0):
+            self.assertEqual(len(notify_task_completed(self.task, sender=self.admin)), 2)
+
+    def test_comment_mentions_replace_the_watcher_notification(self):
+        comment = Comment.objects.create(task=self.task, user=self.colleague, content='Ping @admin and @nobody')
+        notify_task_comment(comment)
+        self.assertEqual(self.recipients('mention'), {'admin'})
+        self.assertEqual(self.recipients('task_comment'), {'worker'})
+
+    def test_internal_comments_only_reach_admins(self):
+        comment = Comment.objects.create(task=self.task, user=self.colleague, content='@worker look', is_internal=True)
+        notify_task_comment(comment)
+        self.assertEqual(self.recipients('mention'), set())
+        self.assertEqual(self.recipients('task_comment'), {'admin'})
+
+    def test_digests_fold_pending_notifications(self):
+        for n in range(3):
+            notify('task_assigned', [self.user], f'Task {n}', 'Message', coalesce_minutes=0)
+        notify('task_assigned', [self.colleague], 'Task 0', 'Message')
+
+        digests = build_notification_digests(min_count=2, max_lines=2)
+        self.assertEqual([digest.recipient_id for digest in digests], [self.user.pk])
+        self.assertEqual(digests[0].title, 'You have 3 new notifications')
+        self.assertEqual(digests[0].message, '- Task 2\n- Task 1\n...and 1 more')
+        self.assertEqual(Notification.objects.filter(recipient=self.user, is_sent=True).count(), 3)
+        # Below the threshold nothing is folded, and digests are never folded again
+        self.assertFalse(Notification.objects.filter(recipient=self.colleague, is_sent=True).exists())
+        self.assertEqual([digest.recipient_id for digest in build_notification_digests(min_count=1)], [self.colleague.pk])
+
+
+# ----------------------------
+# Email outbox
+# ----------------------------
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('mail server said no')
+
+
+class UnreachableEmailBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionError('connection refused')
+
+    def send_messages(self, email_messages):
+        raise AssertionError('never reached')
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_OUTBOX_RETRY_DELAY=60,
+    EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+    EMAIL_OUTBOX_BATCH_SIZE=10,
+)
+class OutboxTests(TaskTestCase):
+    def make_due(self, email):
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+
+    def test_sends_and_marks_notifications(self):
+        notification = Notification.objects.create(
+            recipient=self.user, title='Assigned', message='You have a task', notification_type='task_assigned'
+        )
+        first = queue_email('worker@example.com', 'Assigned', 'You have a task', notification=notification)
+        second = queue_email('admin@example.com', 'Hello', 'Body')
+
+        self.assertEqual(send_pending_emails(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        for email in (first, second):
+            email.refresh_from_db()
+            self.assertEqual(email.status, 'sent')
+            self.assertIsNotNone(email.sent_at)
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_sent)
+        self.assertEqual(send_pending_emails(), (0, 0))
+
+    def test_retry_delay_doubles(self):
+        self.assertEqual([get_retry_delay(attempts) for attempts in (1, 2, 3)], [60, 120, 240])
+
+    @override_settings(EMAIL_BACKEND='tasks.tests.FailingEmailBackend')
+    def test_failures_back_off_then_give_up(self):
+        email = queue_email('worker@example.com', 'Subject', 'Body')
+        for attempt, delay in [(1, 60), (2, 120)]:
+            started = timezone.now()
+            self.assertEqual(send_pending_emails(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ('pending', attempt))
+            self.assertIn('mail server said no', email.last_error)
+            self.assertGreaterEqual(email.next_attempt_at, started + timedelta(seconds=delay))
+            # Not due again until the backoff has passed
+            self.assertEqual(send_pending_emails(), (0, 0))
+            self.make_due(email)
+
+        self.assertEqual(send_pending_emails(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 3))
+        self.assertEqual(send_pending_emails(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='tasks.tests.UnreachableEmailBackend')
+    def test_unreachable_server_fails_the_whole_batch(self):
+        emails = [queue_email('worker@example.com', f'Subject {n}', 'Body') for n in range(3)]
+        with self.assertLogs('tasks.mailer', 'ERROR') as logs:
+            self.assertEqual(send_pending_emails(), (0, 3))
+        self.assertEqual(logs.output, ['ERROR:tasks.mailer:Email connection failed: connection refused'])
+        for email in emails:
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ('pending', 1))
+
+    def test_stale_claims_are_requeued(self):
+        email = queue_email('worker@example.com', 'Subject', 'Body')
+        OutboundEmail.objects.filter(pk=email.pk).update(
+            status='sending', last_attempt_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(send_pending_emails(), (0, 0))
+        self.assertEqual(requeue_stale_emails(stale_after_minutes=15), 1)
+        self.assertEqual(send_pending_emails(), (1, 0))
+
+
+# ----------------------------
+# Deadline reminders
+# ----------------------------
+
+@override_settings(DEADLINE_REMINDER_HOURS=[24], DEADLINE_REMINDER_WINDOW_MINUTES=60)
+class DeadlineReminderTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.now()
+        # The first run only sets the high-water marks
+        self.assertEqual(send_deadline_reminders(now=self.start), {'due_in_24h': 0, 'overdue': 0})
+
+    def reminders(self, task, notification_type='deadline_reminder'):
+        return Notification.objects.filter(
+            related_object_type='task', related_object_id=task.pk, notification_type=notification_type
+        )
+
+    def test_each_threshold_fires_once(self):
+        task = self.make_task('Report', due_date=self.start + timedelta(hours=25, minutes=30))
+        task.assigned_to.add(self.user)
+
+        self.assertEqual(send_deadline_reminders(now=self.start + timedelta(hours=1)), {'due_in_24h': 0, 'overdue': 0})
+        self.assertEqual(send_deadline_reminders(now=self.start + timedelta(hours=2)), {'due_in_24h': 1, 'overdue': 0})
+        self.assertEqual(list(self.reminders(task).values_list('recipient_id', flat=True)), [self.user.pk])
+        self.assertEqual(
+            ReminderSweep.objects.get(threshold='due_in_24h').swept_until, self.start + timedelta(hours=2)
+        )
+        # Sweeping the same or a later span again sends nothing new
+        self.assertEqual(send_deadline_reminders(now=self.start + timedelta(hours=2)), {'due_in_24h': 0, 'overdue': 0})
+        self.assertEqual(send_deadline_reminders(now=self.start + timedelta(hours=5)), {'due_in_24h': 0, 'overdue': 0})
+
+        self.assertEqual(send_deadline_reminders(now=self.start + timedelta(hours=26)), {'due_in_24h': 0, 'overdue': 1})
+        self.assertEqual(self.reminders(task, 'task_overdue').count(), 1)
+
+    def test_finished_tasks_are_skipped_and_unassigned_ones_remind_the_creator(self):
+        self.make_task('Done', status='completed', due_date=self.start + timedelta(hours=24, minutes=30))
+        unassigned = self.make_task('Unassigned', due_date=self.start + timedelta(hours=24, minutes=30))
+        self.assertEqual(send_deadline_reminders(now=self.start + timedelta(hours=1)), {'due_in_24h': 1, 'overdue': 0})
+        self.assertEqual(list(self.reminders(unassigned).values_list('recipient_id', flat=True)), [self.admin.pk])
+
+    def test_tasks_created_inside_the_threshold_are_reminded_once(self):
+        task = self.make_task('Urgent', due_date=timezone.now() + timedelta(hours=2))
+        task.assigned_to.add(self.user)
+        self.assertEqual(send_deadline_reminders(), {'due_in_24h': 1, 'overdue': 0})
+        self.assertEqual(send_deadline_reminders(), {'due_in_24h': 0, 'overdue': 0})
+
+        # Unrelated edits do not send it again
+        task.title = 'Urgent report'
+        task.save()
+        self.assertEqual(send_deadline_reminders(), {'due_in_24h': 0, 'overdue': 0})
+        self.assertEqual(self.reminders(task).count(), 1)
+
+    def test_rescheduling_into_the_threshold_reminds(self):
+        task = self.make_task('Later', due_date=self.start + timedelta(days=10))
+        send_deadline_reminders()
+        task.due_date = timezone.now() + timedelta(hours=3)
+        task.save()
+        self.assertEqual(send_deadline_reminders(), {'due_in_24h': 1, 'overdue': 0})
+
+    @override_settings(DEADLINE_REMINDER_HOURS=[24, 2])
+    def test_tasks_inside_several_thresholds_get_one_reminder(self):
+        send_deadline_reminders(now=self.start)
+        task = self.make_task('Very urgent', due_date=timezone.now() + timedelta(hours=1))
+        self.assertEqual(sum(send_deadline_reminders().values()), 1)
+        self.assertEqual(self.reminders(task).count(), 1)
+
+    def test_reminders_are_coalesced_and_emailed_like_other_notifications(self):
+        tasks = [self.make_task(f'Report {n}', due_date=self.start + timedelta(hours=24, minutes=30)) for n in range(2)]
+        for task in tasks:
+            task.assigned_to.add(self.user)
+        notify('deadline_reminder', [self.user], 'Due soon', 'Reminder sent by hand', related_object=tasks[0])
+
+        self.assertEqual(send_deadline_reminders(now=self.start + timedelta(hours=1)), {'due_in_24h': 1, 'overdue': 0})
+        self.assertEqual(self.reminders(tasks[0]).count(), 1)
+        self.assertEqual(queue_notification_emails(), 2)
+        self.assertTrue(OutboundEmail.objects.filter(
+            to_email='worker@example.com', subject='Due soon: Report 1', notification__in=self.reminders(tasks[1])
+        ).exists())
+
+
+# ----------------------------
+# Unread notification counters
+# ----------------------------
+
+class UnreadCountTests(TaskTestCase):
+    def send(self, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                notify('task_assigned', [self.user], f'Task {n}', 'Message', coalesce_minutes=0)[0]
+                for n in range(count)
+            ]
+
+    def test_counter_is_read_from_the_cache(self):
+        self.send(2)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_count(self.user), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.pk), 2)
+
+    def test_inserts_and_reads_adjust_the_counter(self):
+        get_unread_count(self.user)
+        first, second, third = self.send(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.mark_as_read()
+            # Reading twice only counts once
+            Notification.objects.get(pk=first.pk).mark_as_read()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_all_read(self.user, notification_ids=[second.pk]), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user), 1)
+
+    def test_mark_all_read_recounts(self):
+        self.send(3)
+        get_unread_count(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_all_read(self.user), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_count(self.user), 0)
+
+    def test_changes_are_applied_on_commit_only(self):
+        get_unread_count(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            notify('task_assigned', [self.user], 'Task', 'Message')
+        self.assertEqual(get_unread_count(self.user), 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_unread_count(self.user), 1)
+
+    def test_context_processor_uses_the_warm_counter(self):
+        self.send(2)
+        get_unread_count(self.user)
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications_context(request)['unread_notification_count'], 2)
+
+    def test_mark_all_read_view(self):
+        self.send(2)
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('notifications_mark_all_read'), HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.json(), {'success': True, 'marked': 2, 'unread_count': 0})
+        self.assertFalse(Notification.objects.filter(recipient=self.user, is_read=False).exists())
+
+
+# ----------------------------
+# Related object resolution
+# ----------------------------
+
+class RelatedObjectResolutionTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(
+            title='Launch', division=self.division, created_by=self.admin, assigned_to_admin=self.admin
+        )
+        self.root = User.objects.create_superuser(
+            username='root', password='x', email='root@example.com', is_active=True
+        )
+
+    def add_notifications(self, count):
+        for n in range(count):
+            task = self.make_task(f'Task {n}')
+            for notification_type, title, related_object in [
+                ('task_assigned', f'Task {n}', task), ('project_update', f'Update {n}', self.project)
+            ]:
+                notify(notification_type, [self.user, self.root], title, 'Message',
+                       related_object=related_object, coalesce_minutes=0)
+            ActivityLog.objects.create(user=self.admin, action='create', object_type='task', object_id=task.pk)
+
+    def test_one_query_per_type(self):
+        self.add_notifications(3)
+        deleted = self.make_task('Deleted')
+        notify('task_assigned', [self.user], 'Deleted', 'Message', related_object=deleted)
+        deleted.delete()
+        notify('system', [self.user], 'System', 'Message')
+
+        notifications = list(Notification.objects.filter(recipient=self.user).order_by('pk'))
+        with self.assertNumQueries(2):
+            resolve_related_objects(notifications)
+        with self.assertNumQueries(0):
+            related = [notification.get_related_object() for notification in notifications]
+        self.assertEqual([str(obj) for obj in related[:2]], [str(Task.objects.get(title='Task 0')), str(self.project)])
+        self.assertEqual(related[-2:], [None, None])
+
+        logs = list(ActivityLog.objects.all())
+        with self.assertNumQueries(1):
+            self.assertEqual(len({log.get_related_object().pk for log in resolve_related_objects(logs)}), 3)
+
+    def test_dropdown_resolves_in_bulk(self):
+        self.add_notifications(3)
+        with self.assertNumQueries(3):
+            notifications = get_recent_notifications(self.user)
+            titles = [(n.title, str(n.get_related_object())) for n in notifications]
+        self.assertEqual(titles[:2], [('Update 2', str(self.project)), ('Task 2', str(Task.objects.get(title='Task 2')))])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('task_list'))
+        self.assertContains(response, reverse('project_detail', args=[self.project.pk]))
+
+    def assertChangelistQueriesConstant(self, url):
+        self.client.force_login(self.root)
+        self.add_notifications(2)
+        # The first request also does one-off session work
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_notifications(6)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertContains(response, str(self.project))
+
+    def test_notification_changelist_queries_are_constant(self):
+        self.assertChangelistQueriesConstant(reverse('admin:tasks_notification_changelist'))
+
+    def test_activity_log_changelist_queries_are_constant(self):
+        ActivityLog.objects.create(user=self.admin, action='update', object_type='project', object_id=self.project.pk)
+        self.assertChangelistQueriesConstant(reverse('admin:tasks_activitylog_changelist'))
+
+
+# ----------------------------
+# Live updates
+# ----------------------------
+
+class LiveUpdateTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = self.make_task('Task')
+        self.dependency = self.make_task('Dependency')
+        self.waiting = self.make_task('Waiting')
+        self.waiting.depends_on.add(self.dependency)
+        patcher = mock.patch('tasks.events.publish')
+        self.publish = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_changes(self):
+        """Change a status, an assignment and comment, then block a task by propagation"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.status = 'in_progress'
+            self.task.save()
+            self.task.assigned_to.add(self.user)
+            Comment.objects.create(task=self.task, user=self.user, content='Started')
+            with HistoryRecorder(self.admin) as history:
+                propagate_blocked_status([self.dependency.pk], history)
+        self.assertEqual(Task.objects.get(pk=self.waiting.pk).status, 'blocked')
+        return [publish_call.args[1] for publish_call in self.publish.call_args_list]
+
+    @override_settings(LIVE_UPDATES=False)
+    def test_nothing_is_published_when_off(self):
+        self.assertEqual(self.make_changes(), [])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('event_stream')).status_code, 204)
+
+    @override_settings(LIVE_UPDATES=True)
+    def test_changes_are_published_when_on(self):
+        self.assertEqual(self.make_changes(), ['task.status', 'task.assigned', 'task.comment', 'task.status'])
+
+
+# ----------------------------
+# Async views
+# ----------------------------
+
+CSRF_TOKEN_RE = re.compile(r'name="csrfmiddlewaretoken" value="[^"]*"')
+
+
+class AsyncViewTests(TaskTestCase):
+    """The async views must return the same pages as their sync counterparts"""
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(
+            title='Launch', division=self.division, created_by=self.admin, assigned_to_admin=self.admin
+        )
+        for n in range(3):
+            task = self.make_task(f'Task {n}', project=self.project if n else None)
+            task.assigned_to.add(self.user)
+
+    def responses(self, view_name, user, **params):
+        sync_request = RequestFactory().get('/', params)
+        async_request = AsyncRequestFactory().get('/', params)
+        for request in (sync_request, async_request):
+            request.user = user
+            request.session = self.client.session
+
+        async def auser():
+            return user
+        async_request.auser = auser
+        return getattr(views, view_name)(sync_request), async_to_sync(getattr(async_views, view_name))(async_request)
+
+    def assertSamePage(self, view_name, user, **params):
+        sync_response, async_response = self.responses(view_name, user, **params)
+        self.assertEqual(sync_response.status_code, 200)
+        self.assertEqual(async_response.status_code, 200)
+        # Every render masks the CSRF token differently
+        self.assertEqual(
+            CSRF_TOKEN_RE.sub('', async_response.content.decode()), CSRF_TOKEN_RE.sub('', sync_response.content.decode())
+        )
+        return async_response
+
+    def test_dashboard(self):
+        for user in (self.admin, self.user):
+            self.assertSamePage('dashboard', user)
+
+    def test_task_list(self):
+        response = self.assertSamePage('task_list', self.admin)
+        self.assertContains(response, 'Task 2')
+        self.assertSamePage('task_list', self.user, status='pending', project=self.project.pk)
+        self.assertSamePage('task_list', self.admin, cursor='')
+
+    def test_project_list(self):
+        for user in (self.admin, self.user):
+            self.assertSamePage('project_list', user)
+
+    def test_get_division_admins(self):
+        root = User.objects.create_user(username='root', password='x', role='super_admin', is_active=True)
+        sync_response, async_response = self.responses('get_division_admins', root, division_id=self.division.pk)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        self.assertEqual(json.loads(async_response.content), {'admins': [{'id': self.admin.pk, 'name': 'admin'}]})
+
+        _sync_response, async_response = self.responses('get_division_admins', self.admin, division_id=self.division.pk)
+        self.assertEqual(async_response.status_code, 403)
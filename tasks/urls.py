@@ -1,8 +1,11 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 from django.conf import settings
 from django.conf.urls.static import static
 
+# Read-heavy views have async versions for ASGI deployments
+read_views = async_views if settings.ASYNC_VIEWS else views
+
 # urls.py - Enhanced URL patterns for project management
 
 from django.urls import path
@@ -15,10 +18,10 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     
     # Dashboard
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', read_views.dashboard, name='dashboard'),
     
     # Task Management
-    path('tasks/', views.task_list, name='task_list'),
+    path('tasks/', read_views.task_list, name='task_list'),
     path('tasks/<int:task_id>/', views.task_detail, name='task_detail'),
     path('tasks/create/', views.task_create, name='task_create'),
     path('tasks/<int:task_id>/edit/', views.task_edit, name='task_edit'),
@@ -26,7 +29,7 @@ urlpatterns = [
     path('tasks/<int:task_id>/update-status/', views.task_update_status, name='task_update_status'),
     
     # Project Management
-    path('projects/', views.project_list, name='project_list'),
+    path('projects/', read_views.project_list, name='project_list'),
     path('projects/create/', views.project_create, name='project_create'),
     path('projects/<int:project_id>/', views.project_detail, name='project_detail'),
     path('projects/<int:project_id>/edit/', views.project_edit, name='project_edit'),
@@ -58,12 +61,17 @@ urlpatterns = [
     path('reports/', views.reports_dashboard, name='reports'),
     path('reports/export/excel/', views.export_tasks_excel, name='export_tasks_excel'),
     path('reports/export/pdf/', views.export_tasks_pdf, name='export_tasks_pdf'),
+    path('reports/exports/<int:job_id>/', views.export_job_detail, name='export_job_detail'),
+    path('reports/exports/<int:job_id>/status/', views.export_job_status, name='export_job_status'),
+    path('reports/exports/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
     
     # AJAX Endpoints
-    path('ajax/get-division-admins/', views.get_division_admins, name='get_division_admins'),
+    path('ajax/get-division-admins/', read_views.get_division_admins, name='get_division_admins'),
     path('download-file/<int:file_id>/', views.download_project_file, name='download_project_file'),
     path('view-file/<int:file_id>/', views.view_project_file, name='view_project_file'),
     path('tasks/<int:task_id>/add-comment/', views.add_comment_ajax, name='add_comment_ajax'),
+    path('notifications/mark-all-read/', views.notifications_mark_all_read, name='notifications_mark_all_read'),
+    path('events/', views.event_stream, name='event_stream'),
     
     # Password Reset URLs
     path('password-reset/', views.CustomPasswordResetView.as_view(), name='password_reset'),
@@ -4,50 +4,52 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, Count
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
+from django.db.models import Q, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.template.loader import get_template
 from django.contrib.auth.views import (
     PasswordResetView, PasswordResetDoneView,
     PasswordResetConfirmView, PasswordResetCompleteView
 )
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.decorators.http import require_http_methods
 
-# External libraries with error handling
-try:
-    from xhtml2pdf import pisa
-    import pdfkit
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
-
-try:
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment
-    import xlsxwriter
-    EXCEL_AVAILABLE = True
-except ImportError:
-    EXCEL_AVAILABLE = False
-
 import json
 import csv
-import html
 import os
-import io
 from datetime import datetime, timedelta
 
 from django.conf import settings
-from django.utils.html import strip_tags
+from django.utils.http import url_has_allowed_host_and_scheme
 
 # Local imports - Fixed spacing
 from .models import (
-    User, Task, Comment, Division, TaskHistory, 
-    Project, ProjectFile  # Fixed: added space before Project
+    User, Task, Comment, Division,
+    Project, ProjectFile, ExportJob,  # Fixed: added space before Project
+    get_dashboard_stats
+)
+from .stats import get_task_stats
+from .pagination import CursorPaginator, use_cursor_pagination
+from .search import search_tasks, search_projects
+from .permissions import resolve_task_permissions
+from .reports import ReportQuery
+from .scheduling import get_project_schedule
+from .dependencies import propagate_blocked_status
+from .history import HistoryRecorder, summarize
+from .archive import get_records
+from .activity import log_activity
+from .events import get_task_channels, get_user_channels, stream_events
+from .notifications import (
+    notify_task_assigned, notify_task_completed, notify_task_comment,
+    notify_project_assigned, notify_file_uploaded, mark_all_read,
+)
+from .exports import (
+    EXCEL_AVAILABLE, PDF_AVAILABLE, XLSX_CONTENT_TYPE, build_tasks_workbook_file, render_tasks_pdf
 )
 from .forms import (
     DivisionForm, TaskForm, CustomUserCreationForm, 
@@ -79,6 +81,7 @@ def login_view(request):
                     messages.warning(request, 'Your account is awaiting admin approval. Please try again later.')
                     return redirect('login')
                 login(request, user)
+                log_activity(request, 'login', obj=user, description=f'{user.username} logged in')
                 messages.success(request, f'Welcome back, {user.first_name}!')
                 return redirect('dashboard')  
         else:
@@ -110,6 +113,8 @@ def register_view(request):
 
 def logout_view(request):
     """User logout view"""
+    if request.user.is_authenticated:
+        log_activity(request, 'logout', obj=request.user, description=f'{request.user.username} logged out')
     logout(request)
     messages.info(request, 'You have been logged out successfully.')
     return redirect('login')
@@ -129,7 +134,7 @@ def dashboard(request):
         if user.is_super_admin():
             # Super admin sees all tasks
             all_tasks = Task.objects.all()
-            managed_projects = Project.objects.all()[:5]  # Show recent 5 projects
+            managed_projects = Project.objects.select_related('division')[:5]  # Show recent 5 projects
         elif user.is_admin():
             # Admin sees tasks in their division
             if user_division:
@@ -137,7 +142,7 @@ def dashboard(request):
                 # Admin sees projects they manage + projects in their division
                 managed_projects = Project.objects.filter(
                     Q(assigned_to_admin=user) | Q(division=user_division)
-                ).distinct()[:5]
+                ).select_related('division').distinct()[:5]
             else:
                 all_tasks = Task.objects.none()
                 managed_projects = Project.objects.none()
@@ -146,20 +151,8 @@ def dashboard(request):
             all_tasks = Task.objects.filter(assigned_to=user)
             managed_projects = Project.objects.none()
         
-        # Task statistics
-        total_tasks = all_tasks.count()
-        pending_tasks = all_tasks.filter(status='pending').count()
-        in_progress_tasks = all_tasks.filter(status='in_progress').count()
-        completed_tasks = all_tasks.filter(status='completed').count()
-        
-        # Safe overdue tasks calculation
-        try:
-            overdue_tasks = all_tasks.filter(
-                due_date__lt=timezone.now(),
-                status__in=['pending', 'in_progress']
-            ).count()
-        except Exception:
-            overdue_tasks = 0
+        # Task statistics - served from the per-user stats cache
+        task_stats = get_dashboard_stats(user)['tasks']
         
         # Recent tasks (for the main section)
         recent_tasks = all_tasks.select_related('created_by', 'division', 'project').prefetch_related('assigned_to').order_by('-created_at')[:5]
@@ -168,11 +161,11 @@ def dashboard(request):
         my_tasks = Task.objects.filter(assigned_to=user).select_related('project').prefetch_related('assigned_to').order_by('-created_at')[:5]
         
         context = {
-            'total_tasks': total_tasks,
-            'pending_tasks': pending_tasks,
-            'in_progress_tasks': in_progress_tasks,
-            'completed_tasks': completed_tasks,
-            'overdue_tasks': overdue_tasks,
+            'total_tasks': task_stats['total'],
+            'pending_tasks': task_stats['pending'],
+            'in_progress_tasks': task_stats['in_progress'],
+            'completed_tasks': task_stats['completed'],
+            'overdue_tasks': task_stats['overdue'],
             'recent_tasks': recent_tasks,
             'my_tasks': my_tasks,
             'managed_projects': managed_projects,
@@ -228,30 +221,27 @@ def task_list(request):
             if filter_form.cleaned_data['date_to']:
                 tasks = tasks.filter(created_at__date__lte=filter_form.cleaned_data['date_to'])
 
-        # Search functionality - UPDATED for M2M
+        # Search functionality - full-text index, best matches first
         search_query = request.GET.get('search')
+        ordering = ['-created_at']
         if search_query:
-            tasks = tasks.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(assigned_to__username__icontains=search_query) |
-                Q(assigned_to__first_name__icontains=search_query) |
-                Q(assigned_to__last_name__icontains=search_query)
-            ).distinct()
+            tasks = search_tasks(tasks, search_query)
+            ordering = ['-search_rank', '-created_at']
 
         # ADDED: Prefetch related to avoid N+1 queries
         tasks = tasks.select_related('created_by', 'division', 'project').prefetch_related('assigned_to')
 
-        # Pagination
-        paginator = Paginator(tasks.order_by('-created_at'), 10)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Pagination - keyset mode avoids COUNT(*) and OFFSET on deep pages
+        if use_cursor_pagination(request):
+            paginator = CursorPaginator(tasks, (*ordering, 'id'), 10, estimate_total=True)
+            page_obj = paginator.get_page(request.GET.get('cursor'))
+        else:
+            paginator = Paginator(tasks.order_by(*ordering), 10)
+            page_number = request.GET.get('page')
+            page_obj = paginator.get_page(page_number)
 
         # ADDED: Add permission data to each task for template
-        for task in page_obj:
-            task.user_can_edit = task.can_user_edit(user)
-            task.user_is_assigned = task.is_assigned_to_user(user)
-            task.user_can_update_status = task.is_assigned_to_user(user) or user.is_admin()
+        resolve_task_permissions(page_obj, user)
 
         context = {
             'page_obj': page_obj,
@@ -278,9 +268,10 @@ def task_detail(request, task_id):
     try:
         task = get_object_or_404(Task, id=task_id)
         user = request.user
+        resolve_task_permissions([task], user)
         
         # Check permissions - CHANGED for M2M
-        if not user.is_admin() and not task.is_assigned_to_user(user):
+        if not user.is_admin() and not task.user_is_assigned:
             messages.error(request, 'You do not have permission to view this task.')
             return redirect('task_list')
         
@@ -288,18 +279,14 @@ def task_detail(request, task_id):
         if request.method == 'POST':
             comment_form = CommentForm(request.POST, user=user)
             if comment_form.is_valid():
-                comment = comment_form.save(commit=False)
-                comment.task = task
-                comment.user = user
-                comment.save()
-                
-                # Create history entry
-                TaskHistory.objects.create(
-                    task=task,
-                    user=user,
-                    action='Comment added',
-                    new_value=comment.content[:100] + '...' if len(comment.content) > 100 else comment.content
-                )
+                with HistoryRecorder.for_request(request) as history:
+                    comment = comment_form.save(commit=False)
+                    comment.task = task
+                    comment.user = user
+                    comment.save()
+                    history.record(task, 'Comment added', new_value=summarize(comment.content), field_changed='comment')
+                notify_task_comment(comment, sender=user)
+                log_activity(request, 'comment', obj=task, description=f'Commented on task "{task.title}"')
                 
                 messages.success(request, 'Comment added successfully!')
                 return redirect('task_detail', task_id=task.id)
@@ -313,20 +300,24 @@ def task_detail(request, task_id):
         
         # Task update form for assigned user or admin - CHANGED for M2M
         update_form = None
-        if task.is_assigned_to_user(user) or user.is_admin():
+        if task.user_can_update_status:
             update_form = TaskUpdateForm(instance=task)
         
         # ADDED: Pass permission checks to template
         context = {
             'task': task,
+            # Latest entries, including months moved to the archive; nothing
+            # predates the task, so older segments are never read
+            'task_history': get_records('task_history', {'task_id': task.pk}, since=task.created_at, limit=5),
             'comments': comments,
             'comment_form': comment_form,
             'update_form': update_form,
-            'user_can_edit': task.can_user_edit(user),
-            'user_is_assigned': task.is_assigned_to_user(user),
-            'user_can_update_status': task.is_assigned_to_user(user) or user.is_admin(),
+            'user_can_edit': task.user_can_edit,
+            'user_is_assigned': task.user_is_assigned,
+            'user_can_update_status': task.user_can_update_status,
         }
         
+        log_activity(request, 'view', obj=task, description=f'Viewed task "{task.title}"')
         return render(request, 'tasks/task_detail.html', context)
         
     except Exception as e:
@@ -380,16 +371,14 @@ def task_create(request, project_id=None):
                     
                     # Save the task - form handles division assignment
                     task = form.save()
+                    log_activity(request, 'create', obj=task, description=f'Created task "{task.title}"')
+                    notify_task_assigned(task, [u.id for u in task.assigned_to.all()], sender=user)
 
                     # Log task creation history
                     try:
                         assignees_names = ", ".join([u.get_display_name() for u in task.assigned_to.all()])
-                        TaskHistory.objects.create(
-                            task=task,
-                            user=user,
-                            action="Task created",
-                            new_value=f'Task "{task.title}" created and assigned to: {assignees_names}'
-                        )
+                        with HistoryRecorder.for_request(request) as history:
+                            history.record(task, "Task created", new_value=f'Task "{task.title}" created and assigned to: {assignees_names}')
                     except Exception as history_error:
                         print(f"History creation error: {history_error}")
 
@@ -456,54 +445,23 @@ def task_edit(request, task_id):
         if request.method == 'POST':
             form = TaskForm(request.POST, instance=task, user=user, project=task.project)
             if form.is_valid():
-                # Store old values for history
+                # is_valid() already copied the cleaned data onto the task, so
+                # diff it against the state loaded from the database
                 old_assignees = list(task.assigned_to.all())
-                old_status = task.status
-                old_priority = task.priority
-                old_title = task.title
-                
-                task = form.save()
-                
-                # Create history entries for changes
-                if old_title != task.title:
-                    TaskHistory.objects.create(
-                        task=task,
-                        user=user,
-                        action='Title changed',
-                        old_value=old_title,
-                        new_value=task.title
-                    )
-                
-                if old_status != task.status:
-                    TaskHistory.objects.create(
-                        task=task,
-                        user=user,
-                        action='Status changed',
-                        old_value=old_status,
-                        new_value=task.status
-                    )
-                
-                if old_priority != task.priority:
-                    TaskHistory.objects.create(
-                        task=task,
-                        user=user,
-                        action='Priority changed',
-                        old_value=old_priority,
-                        new_value=task.priority
-                    )
-                
-                # Check for assignee changes
-                new_assignees = list(task.assigned_to.all())
-                if set(old_assignees) != set(new_assignees):
-                    old_names = ", ".join([u.get_display_name() for u in old_assignees])
-                    new_names = ", ".join([u.get_display_name() for u in new_assignees])
-                    TaskHistory.objects.create(
-                        task=task,
-                        user=user,
-                        action='Assignees changed',
-                        old_value=old_names,
-                        new_value=new_names
-                    )
+
+                with HistoryRecorder.for_request(request) as history:
+                    changed_fields = history.record_changes(task)
+                    task = form.save()
+                    new_assignees = list(task.assigned_to.all())
+                    history.record_assignees(task, old_assignees, new_assignees)
+                    if 'status' in changed_fields:
+                        propagate_blocked_status([task.id], history)
+
+                notify_task_assigned(task, {u.id for u in new_assignees} - {u.id for u in old_assignees}, sender=user)
+                if 'status' in changed_fields and task.status == 'completed':
+                    notify_task_completed(task, sender=user)
+                log_activity(request, 'update', obj=task, description=f'Updated task "{task.title}"',
+                             extra_data={'changed_fields': changed_fields})
                 
                 messages.success(request, 'Task updated successfully!')
                 return redirect('task_detail', task_id=task.id)
@@ -554,18 +512,20 @@ def task_update_status(request, task_id):
         actual_hours = data.get('actual_hours')
         
         if new_status in dict(Task.STATUS_CHOICES):
-            task.status = new_status
-            if actual_hours:
-                task.actual_hours = actual_hours
-            task.save()
-            
-            # Create history entry
-            TaskHistory.objects.create(
-                task=task,
-                user=user,
-                action='Status changed',
-                old_value=old_status,
-                new_value=new_status
+            with HistoryRecorder.for_request(request) as history:
+                task.status = new_status
+                if actual_hours:
+                    task.actual_hours = actual_hours
+                history.record_changes(task, fields={'status': 'Status changed'})
+                task.save()
+                if old_status != new_status:
+                    propagate_blocked_status([task.id], history)
+            if old_status != new_status and new_status == 'completed':
+                notify_task_completed(task, sender=user)
+            log_activity(
+                request, 'complete' if new_status == 'completed' else 'update', obj=task,
+                description=f'Changed status of task "{task.title}" to {task.get_status_display()}',
+                extra_data={'old_status': old_status, 'new_status': new_status},
             )
             
             return JsonResponse({'success': True})
@@ -611,29 +571,34 @@ def user_management(request):
             Q(email__icontains=search_query)
         )
 
-    # Pagination
-    paginator = Paginator(users.order_by('username'), 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Statistics
-    total_users = users.count()
-    admin_count = users.filter(role='admin').count()
-    active_users_count = users.filter(is_active=True).count()
+    # Pagination - keyset mode avoids COUNT(*) and OFFSET on deep pages
+    if use_cursor_pagination(request):
+        paginator = CursorPaginator(users, ('username', 'id'), 10, estimate_total=True)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        paginator = Paginator(users.order_by('username'), 10)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
 
+    # Statistics in a single aggregate query
     now_date = timezone.now()
-    new_users_this_month = users.filter(
-        date_joined__year=now_date.year,
-        date_joined__month=now_date.month
-    ).count()
+    user_stats = users.order_by().aggregate(
+        total=Count('pk'),
+        admins=Count('pk', filter=Q(role='admin')),
+        active=Count('pk', filter=Q(is_active=True)),
+        new_this_month=Count('pk', filter=Q(
+            date_joined__year=now_date.year,
+            date_joined__month=now_date.month
+        )),
+    )
 
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
-        'total_users': total_users,
-        'admin_count': admin_count,
-        'new_users_this_month': new_users_this_month,
-        'active_users_count': active_users_count,
+        'total_users': user_stats['total'],
+        'admin_count': user_stats['admins'],
+        'new_users_this_month': user_stats['new_this_month'],
+        'active_users_count': user_stats['active'],
         'user_can_see_all': request.user.is_super_admin(),  # For template logic
     }
 
@@ -676,6 +641,7 @@ def user_edit(request, user_id):
                     })
             
             form.save()
+            log_activity(request, 'update', obj=user_to_edit, description=f'Updated user {user_to_edit.username}')
             messages.success(request, f'User {user_to_edit.username} updated successfully!')
             return redirect('user_management')
     else:
@@ -697,106 +663,29 @@ def user_edit(request, user_id):
 # Reporting Views
 from django.http import HttpResponse
 from django.db.models import Q, Count, Avg
-from datetime import datetime, timedelta
-import xlsxwriter
-import io
 from django.utils import timezone
 
 @login_required
 def reports_dashboard(request):
     """Reports dashboard with various filters and export options"""
-    # Get filter parameters
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
-    division_id = request.GET.get('division')
-    selected_statuses = request.GET.getlist('status')  # CHANGED: get list for multiple statuses
-    project_id = request.GET.get('project')
-    assigned_to = request.GET.get('assigned_to')
-    
-    # Base queryset with proper relationships - ADDED: prefetch comments
-    tasks = Task.objects.select_related('created_by', 'division', 'project').prefetch_related('assigned_to', 'comments__user')
-    
-    # Apply filters based on user role
-    if request.user.role == 'user':
-        tasks = tasks.filter(Q(assigned_to=request.user) | Q(created_by=request.user)).distinct()
-    elif request.user.role == 'admin':
-        if request.user.division:
-            tasks = tasks.filter(division=request.user.division)
-        else:
-            tasks = tasks.none()
-    # Super admin can see all tasks
-    
-    # Apply date filters
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-            tasks = tasks.filter(created_at__date__gte=date_from_obj)
-        except ValueError:
-            pass
-    
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-            tasks = tasks.filter(created_at__date__lte=date_to_obj)
-        except ValueError:
-            pass
-    
-    # Apply other filters
-    if division_id:
-        tasks = tasks.filter(division_id=division_id)
-    
-    # CHANGED: Apply multiple status filters
-    if selected_statuses:
-        tasks = tasks.filter(status__in=selected_statuses)
-    
-    # Apply project filter
-    if project_id:
-        if project_id == 'no_project':
-            tasks = tasks.filter(project__isnull=True)
-        else:
-            tasks = tasks.filter(project_id=project_id)
-    
-    if assigned_to:
-        tasks = tasks.filter(assigned_to_id=assigned_to)
-    
-    # Calculate statistics
-    total_tasks = tasks.count()
-    completed_tasks = tasks.filter(status='completed').count()
-    pending_tasks = tasks.filter(status='pending').count()
-    in_progress_tasks = tasks.filter(status='in_progress').count()
-    overdue_tasks = tasks.filter(
-        due_date__lt=timezone.now(),
-        status__in=['pending', 'in_progress']
-    ).count()
-    
-    # Task distribution by division
-    division_stats = tasks.values('division__name').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Task distribution by project
-    project_stats = tasks.values('project__title').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Task distribution by status
-    status_stats = tasks.values('status').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    # Parse filters once; the same compiled query drives the exports
+    report = ReportQuery.from_params(request.user, request.GET)
+    for error in report.errors:
+        messages.warning(request, error)
+
+    # Base queryset with proper relationships
+    tasks = report.queryset().select_related('created_by', 'division', 'project').prefetch_related('assigned_to')
     
-    # Average completion time for completed tasks
-    completed_tasks_with_time = tasks.filter(
-        status='completed',
-        completed_at__isnull=False
-    )
+    # Statistics and distributions are cached per filter set
+    task_stats = report.task_stats()
+    division_stats = report.distribution('division__name')
+    project_stats = report.distribution('project__title')
+    status_stats = report.distribution('status')
     
-    avg_completion_time = None
-    if completed_tasks_with_time.exists():
-        total_time = sum([
-            (task.completed_at - task.created_at).total_seconds() / 3600
-            for task in completed_tasks_with_time
-        ])
-        avg_completion_time = total_time / completed_tasks_with_time.count()
+    # Completion time statistics, aggregated in the database
+    completion_overall = report.completion_stats()
+    completion_stats = completion_overall[0] if completion_overall else None
+    avg_completion_time = completion_stats['mean'] if completion_stats else None
     
     # Recent activity (last 30 days)
     thirty_days_ago = timezone.now() - timedelta(days=30)
@@ -817,39 +706,28 @@ def reports_dashboard(request):
     else:
         projects = Project.objects.all().order_by('title')
     
-    # ADDED: Process tasks to add latest comment for in_progress tasks
-    tasks_list = list(tasks.order_by('-created_at')[:20])
-    for task in tasks_list:
-        if task.status == 'in_progress':
-            # Get the latest comment for this task
-            latest_comment = task.comments.filter(
-                is_internal=False  # Only public comments
-            ).order_by('-created_at').first()
-            task.latest_comment = latest_comment
-        else:
-            task.latest_comment = None
+    # ADDED: Latest public comment for in_progress tasks, in one query
+    tasks_list = Comment.attach_latest_public(list(tasks.order_by('-created_at')[:20]))
     
     context = {
         'tasks': tasks_list,  # Latest 20 tasks for preview with comments
-        'total_tasks': total_tasks,
-        'completed_tasks': completed_tasks,
-        'pending_tasks': pending_tasks,
-        'in_progress_tasks': in_progress_tasks,
-        'overdue_tasks': overdue_tasks,
+        'total_tasks': task_stats['total'],
+        'completed_tasks': task_stats['completed'],
+        'pending_tasks': task_stats['pending'],
+        'in_progress_tasks': task_stats['in_progress'],
+        'overdue_tasks': task_stats['overdue'],
         'division_stats': division_stats,
         'project_stats': project_stats,
         'status_stats': status_stats,
         'avg_completion_time': avg_completion_time,
+        'completion_stats': completion_stats,
+        'completion_by_division': report.completion_stats('division__name'),
+        'completion_by_project': report.completion_stats('project__title'),
         'recent_tasks_count': recent_tasks.count(),
         'divisions': Division.objects.all(),
         'projects': projects,
         'users': User.objects.filter(is_active=True),
-        'date_from': date_from,
-        'date_to': date_to,
-        'selected_division': division_id,
-        'selected_statuses': selected_statuses,  # CHANGED: list of statuses
-        'selected_project': project_id,
-        'selected_assigned_to': assigned_to,
+        **report.get_filter_context(),
     }
     
     return render(request, 'tasks/reports.html', context)
@@ -858,168 +736,22 @@ def reports_dashboard(request):
 def export_tasks_excel(request):
     """Export filtered tasks to Excel format with comment support."""
     try:
-        # Get filters
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
-        division_id = request.GET.get('division')
-        selected_statuses = request.GET.getlist('status')  # CHANGED: multiple statuses
-        project_id = request.GET.get('project')
-        assigned_to = request.GET.get('assigned_to')
-
-        # Queryset with proper prefetch for M2M and comments
-        tasks = Task.objects.select_related('created_by', 'division', 'project').prefetch_related('assigned_to', 'comments__user')
-
-        # Role-based filter
-        if request.user.role == 'user':
-            tasks = tasks.filter(Q(assigned_to=request.user) | Q(created_by=request.user)).distinct()
-        elif request.user.role == 'admin':
-            if request.user.division:
-                tasks = tasks.filter(division=request.user.division)
-            else:
-                tasks = tasks.none()
-
-        # Apply filters
-        if date_from:
-            try:
-                tasks = tasks.filter(created_at__date__gte=datetime.strptime(date_from, '%Y-%m-%d').date())
-            except ValueError:
-                pass
-        if date_to:
-            try:
-                tasks = tasks.filter(created_at__date__lte=datetime.strptime(date_to, '%Y-%m-%d').date())
-            except ValueError:
-                pass
-        if division_id:
-            tasks = tasks.filter(division_id=division_id)
-        
-        # CHANGED: Apply multiple status filters
-        if selected_statuses:
-            tasks = tasks.filter(status__in=selected_statuses)
-        
-        # Apply project filter
-        if project_id:
-            if project_id == 'no_project':
-                tasks = tasks.filter(project__isnull=True)
-            else:
-                tasks = tasks.filter(project_id=project_id)
-        
-        if assigned_to:
-            tasks = tasks.filter(assigned_to_id=assigned_to)
-
         # Check if xlsxwriter is available
         if not EXCEL_AVAILABLE:
             messages.error(request, 'Excel export is not available. Please contact administrator.')
             return redirect('reports_dashboard')
 
-        # Prepare Excel workbook
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True, 'remove_timezone': True})
-        tasks_sheet = workbook.add_worksheet('Tasks')
-        summary_sheet = workbook.add_worksheet('Summary')
-
-        # Formats
-        header_format = workbook.add_format({'bold': True, 'bg_color': '#4f46e5', 'font_color': 'white', 'border': 1})
-        cell_format = workbook.add_format({'border': 1, 'text_wrap': True})
-        date_format = workbook.add_format({'border': 1, 'num_format': 'yyyy-mm-dd hh:mm'})
-        comment_format = workbook.add_format({'border': 1, 'text_wrap': True, 'bg_color': '#f0f9ff'})
-
-        # Headers - UPDATED: Comments instead of Created Date
-        tasks_headers = [
-            'ID', 'Title', 'Description', 'Status', 'Project', 'Division',
-            'Created By', 'Assigned To', 'Team Size', 'Due Date',
-            'Latest Comment', 'Estimated Hours', 'Actual Hours'
-        ]
-        for col, header in enumerate(tasks_headers):
-            tasks_sheet.write(0, col, header, header_format)
-
-        # Data rows
-        for row, task in enumerate(tasks.order_by('-created_at'), 1):
-            try:
-                # Clean description
-                cleaned_description = html.unescape(strip_tags(task.description or ''))
-                
-                # Get assignees safely
-                assignees = task.assigned_to.all()
-                if assignees.exists():
-                    assignee_names = ", ".join([
-                        user.get_full_name() or user.username 
-                        for user in assignees
-                    ])
-                    team_size = assignees.count()
-                else:
-                    assignee_names = 'Unassigned'
-                    team_size = 0
-
-                # Get latest comment for in_progress tasks
-                latest_comment_text = ''
-                if task.status == 'in_progress':
-                    latest_comment = task.comments.filter(is_internal=False).order_by('-created_at').first()
-                    if latest_comment:
-                        comment_user = latest_comment.user.get_full_name() or latest_comment.user.username
-                        comment_content = html.unescape(strip_tags(latest_comment.content))
-                        latest_comment_text = f"{comment_user}: {comment_content[:200]}..."
-                    else:
-                        latest_comment_text = 'No comments yet'
-                elif task.status in ['completed', 'pending', 'cancelled']:
-                    latest_comment_text = '-'
-
-                # Write row data
-                tasks_sheet.write(row, 0, task.id, cell_format)
-                tasks_sheet.write(row, 1, task.title, cell_format)
-                tasks_sheet.write(row, 2, cleaned_description[:500] + '...' if len(cleaned_description) > 500 else cleaned_description, cell_format)
-                tasks_sheet.write(row, 3, task.get_status_display(), cell_format)
-                tasks_sheet.write(row, 4, task.project.title if task.project else 'Individual Task', cell_format)
-                tasks_sheet.write(row, 5, task.division.name if task.division else 'N/A', cell_format)
-                tasks_sheet.write(row, 6, task.created_by.get_full_name() if task.created_by else 'N/A', cell_format)
-                tasks_sheet.write(row, 7, assignee_names, cell_format)
-                tasks_sheet.write(row, 8, team_size, cell_format)
-                tasks_sheet.write(row, 9, task.due_date if task.due_date else 'N/A', date_format)
-                tasks_sheet.write(row, 10, latest_comment_text, comment_format if task.status == 'in_progress' else cell_format)
-                tasks_sheet.write(row, 11, task.estimated_hours if task.estimated_hours else 'N/A', cell_format)
-                tasks_sheet.write(row, 12, task.actual_hours if task.actual_hours else 'N/A', cell_format)
-                
-            except Exception as e:
-                print(f"Error processing task {task.id}: {e}")
-                continue
-
-        # Column widths - UPDATED: Adjusted for comment column
-        column_widths = [8, 30, 50, 12, 25, 15, 20, 30, 10, 18, 40, 15, 15]
-        for col, width in enumerate(column_widths):
-            tasks_sheet.set_column(col, col, width)
-
-        # Summary Sheet
-        summary_data = [
-            ['Metric', 'Value'],
-            ['Total Tasks', tasks.count()],
-            ['Completed Tasks', tasks.filter(status='completed').count()],
-            ['Pending Tasks', tasks.filter(status='pending').count()],
-            ['In Progress Tasks', tasks.filter(status='in_progress').count()],
-            ['Overdue Tasks', tasks.filter(due_date__lt=timezone.now(), status__in=['pending', 'in_progress']).count()],
-        ]
-        
-        for row, (metric, value) in enumerate(summary_data):
-            if row == 0:
-                summary_sheet.write(row, 0, metric, header_format)
-                summary_sheet.write(row, 1, value, header_format)
-            else:
-                summary_sheet.write(row, 0, metric, cell_format)
-                summary_sheet.write(row, 1, value, cell_format)
-
-        summary_sheet.set_column('A:A', 20)
-        summary_sheet.set_column('B:B', 15)
+        # Large reports are generated by the export worker
+        if settings.EXPORT_BACKGROUND_JOBS:
+            return queue_export_job(request, 'excel')
 
-        workbook.close()
-        output.seek(0)
-
-        # Response
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        # Written to a temp file in constant-memory mode and streamed back,
+        # so memory does not grow with the number of tasks
+        report = ReportQuery.from_params(request.user, request.GET)
+        output = build_tasks_workbook_file(report)
         filename = f'tasks_report_{timezone.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-        return response
+        log_activity(request, 'download', object_type='report', object_name=filename, description='Exported tasks to Excel')
+        return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
         
     except Exception as e:
         import logging
@@ -1093,6 +825,7 @@ def toggle_user_status(request, user_id):
 
         # Log the action
         logger.info(f'User {request.user.username} {action} user {user_to_toggle.username}')
+        log_activity(request, 'update', obj=user_to_toggle, description=f'{action.capitalize()} user {user_to_toggle.username}')
 
         return JsonResponse({
             'success': True,
@@ -1165,6 +898,7 @@ def delete_user(request, user_id):
         created_tasks_count = user_to_delete.created_tasks.count()
 
         # Delete the user
+        log_activity(request, 'delete', obj=user_to_delete, description=f'Deleted user {username}')
         user_to_delete.delete()
 
         # Log the action
@@ -1205,7 +939,8 @@ def create_division(request):
     if request.method == 'POST':
         form = DivisionForm(request.POST)
         if form.is_valid():
-            form.save()
+            division = form.save()
+            log_activity(request, 'create', obj=division, description=f'Created division {division.name}')
             messages.success(request, "Division created successfully.")
             return redirect('division_list')
     else:
@@ -1218,6 +953,7 @@ def edit_division(request, pk):
         form = DivisionForm(request.POST, instance=division)
         if form.is_valid():
             form.save()
+            log_activity(request, 'update', obj=division, description=f'Updated division {division.name}')
             messages.success(request, "Division updated successfully.")
             return redirect('division_list')
     else:
@@ -1227,6 +963,7 @@ def edit_division(request, pk):
 def delete_division(request, pk):
     division = get_object_or_404(Division, pk=pk)
     if request.method == 'POST':
+        log_activity(request, 'delete', obj=division, description=f'Deleted division {division.name}')
         division.delete()
         messages.success(request, "Division deleted successfully.")
         return redirect('division_list')
@@ -1241,174 +978,14 @@ def export_tasks_pdf(request):
             messages.error(request, 'PDF export is not available. Please contact administrator.')
             return redirect('reports_dashboard')
 
-        # Extract filters
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
-        division_id = request.GET.get('division')
-        selected_statuses = request.GET.getlist('status')  # CHANGED: multiple statuses
-        project_id = request.GET.get('project')
-        assigned_to = request.GET.get('assigned_to')
-
-        # Base queryset with proper relationships and comments
-        tasks_qs = Task.objects.select_related('created_by', 'division', 'project').prefetch_related('assigned_to', 'comments__user')
-
-        # Role-based filtering
-        if request.user.role == 'user':
-            tasks_qs = tasks_qs.filter(Q(assigned_to=request.user) | Q(created_by=request.user)).distinct()
-        elif request.user.role == 'admin':
-            if request.user.division:
-                tasks_qs = tasks_qs.filter(division=request.user.division)
-            else:
-                tasks_qs = tasks_qs.none()
-
-        # Apply filters with error handling
-        try:
-            if date_from:
-                tasks_qs = tasks_qs.filter(created_at__date__gte=datetime.strptime(date_from, '%Y-%m-%d').date())
-            if date_to:
-                tasks_qs = tasks_qs.filter(created_at__date__lte=datetime.strptime(date_to, '%Y-%m-%d').date())
-        except ValueError as e:
-            messages.error(request, f'Invalid date format: {str(e)}')
-            return redirect('reports_dashboard')
-
-        if division_id:
-            tasks_qs = tasks_qs.filter(division_id=division_id)
-        
-        # CHANGED: Apply multiple status filters
-        if selected_statuses:
-            tasks_qs = tasks_qs.filter(status__in=selected_statuses)
-        
-        # Apply project filter
-        if project_id:
-            if project_id == 'no_project':
-                tasks_qs = tasks_qs.filter(project__isnull=True)
-            else:
-                tasks_qs = tasks_qs.filter(project_id=project_id)
-        
-        if assigned_to:
-            tasks_qs = tasks_qs.filter(assigned_to_id=assigned_to)
-
-        # Convert queryset to list AFTER filtering
-        tasks = list(tasks_qs.order_by('-created_at'))
-
-        # Process tasks for template
-        collaborative_count = 0
-        total_assignees = 0
-        
-        for task in tasks:
-            try:
-                # Clean description
-                task.description_clean = html.unescape(strip_tags(task.description or ''))
-                
-                # Get assignees and calculate stats
-                assignees = list(task.assigned_to.all())
-                task.assignee_count = len(assignees)
-                total_assignees += task.assignee_count
-                
-                # Check if collaborative (more than 1 assignee)
-                task.is_collaborative = task.assignee_count > 1
-                if task.is_collaborative:
-                    collaborative_count += 1
-                
-                # Prepare assignee names
-                if assignees:
-                    task.assignee_names = ", ".join([
-                        user.get_full_name() or user.username 
-                        for user in assignees
-                    ])
-                else:
-                    task.assignee_names = "Unassigned"
-                
-                # ADDED: Get latest comment for in_progress tasks
-                if task.status == 'in_progress':
-                    latest_comment = task.comments.filter(is_internal=False).order_by('-created_at').first()
-                    task.latest_comment = latest_comment
-                else:
-                    task.latest_comment = None
-                    
-            except Exception as e:
-                print(f"Error processing task {task.id}: {e}")
-                # Set safe defaults
-                task.description_clean = "Error loading description"
-                task.assignee_names = "Error loading assignees"
-                task.assignee_count = 0
-                task.is_collaborative = False
-                task.latest_comment = None
-
-        # Get division and project information
-        selected_division_obj = None
-        if division_id:
-            try:
-                selected_division_obj = Division.objects.get(id=division_id)
-            except Division.DoesNotExist:
-                pass
-
-        selected_project_obj = None
-        if project_id and project_id != 'no_project':
-            try:
-                selected_project_obj = Project.objects.get(id=project_id)
-            except Project.DoesNotExist:
-                pass
-
-        # Prepare logo path with better error handling
-        logo_path = None
-        try:
-            static_logo_path = os.path.join(settings.STATIC_ROOT or settings.BASE_DIR, 'static', 'images', 'logo.png')
-            if os.path.exists(static_logo_path):
-                logo_path = f'file:///{static_logo_path.replace(os.sep, "/")}'
-            else:
-                base_logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')
-                if os.path.exists(base_logo_path):
-                    logo_path = f'file:///{base_logo_path.replace(os.sep, "/")}'
-                else:
-                    logo_path = None
-        except Exception as e:
-            print(f"Logo path error: {e}")
-            logo_path = None
-
-        # Render HTML template
-        template = get_template('tasks/pdf_template.html')
-        context = {
-            'tasks': tasks,
-            'generated_at': timezone.now(),
-            'logo_path': logo_path,
-            'user': request.user,
-            'divisions': Division.objects.all(),
-            'projects': Project.objects.all(),
-            'selected_division': division_id,
-            'selected_division_obj': selected_division_obj,
-            'selected_project': project_id,
-            'selected_project_obj': selected_project_obj,
-            'selected_statuses': selected_statuses,  # CHANGED: list of statuses
-            'date_from': date_from,
-            'date_to': date_to,
-            'selected_assigned_to': assigned_to,
-            'collaborative_count': collaborative_count,
-            'total_assignees': total_assignees,
-        }
-        
-        rendered_html = template.render(context)
+        # wkhtmltopdf runs for tens of seconds on large reports, so it is
+        # handed to the export worker instead of holding this request
+        if settings.EXPORT_BACKGROUND_JOBS:
+            return queue_export_job(request, 'pdf')
 
         # PDF generation with error handling
         try:
-            if hasattr(settings, 'WKHTMLTOPDF_PATH') and settings.WKHTMLTOPDF_PATH:
-                config = pdfkit.configuration(wkhtmltopdf=settings.WKHTMLTOPDF_PATH)
-            else:
-                config = None
-                
-            options = {
-                'enable-local-file-access': None,
-                'encoding': 'UTF-8',
-                'quiet': '',
-                'no-outline': None,
-                'margin-top': '0.75in',
-                'margin-right': '0.75in',
-                'margin-bottom': '0.75in',
-                'margin-left': '0.75in',
-            }
-
-            pdf = pdfkit.from_string(rendered_html, False, options=options, configuration=config)
-
+            pdf, _task_count = render_tasks_pdf(ReportQuery.from_params(request.user, request.GET))
         except Exception as pdf_error:
             print(f"PDF generation error: {pdf_error}")
             messages.error(request, f'Error generating PDF: {str(pdf_error)}')
@@ -1429,6 +1006,68 @@ def export_tasks_pdf(request):
         return redirect('reports_dashboard')
 
 
+# ----------------------------
+# Background export jobs
+# ----------------------------
+
+def queue_export_job(request, export_format):
+    """Queue a report export for the worker and send the user to its status page"""
+    for error in ReportQuery.from_params(request.user, request.GET).errors:
+        messages.warning(request, error)
+
+    job = ExportJob.objects.create(
+        requested_by=request.user,
+        export_format=export_format,
+        query_string=request.GET.urlencode(),
+    )
+    messages.info(request, 'Your report is being generated. It will be ready to download shortly.')
+    return redirect('export_job_detail', job_id=job.id)
+
+
+def get_export_job_for_user(user, job_id):
+    """Get an export job the user may see (their own, or any for super admins)"""
+    jobs = ExportJob.objects.all()
+    if not user.is_super_admin():
+        jobs = jobs.filter(requested_by=user)
+    return get_object_or_404(jobs, id=job_id)
+
+
+@login_required
+def export_job_detail(request, job_id):
+    """Status page for a queued export; polls until the file is ready"""
+    job = get_export_job_for_user(request.user, job_id)
+    recent_jobs = ExportJob.objects.filter(requested_by=job.requested_by).exclude(id=job.id)[:5]
+    return render(request, 'tasks/export_job.html', {'job': job, 'recent_jobs': recent_jobs})
+
+
+@login_required
+def export_job_status(request, job_id):
+    """AJAX status of an export job"""
+    job = get_export_job_for_user(request.user, job_id)
+    return JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finished': job.is_finished(),
+        'row_count': job.row_count,
+        'error': job.error if job.status == 'failed' else '',
+        'download_url': reverse('export_job_download', args=[job.id]) if job.is_downloadable() else None,
+    })
+
+
+@login_required
+def export_job_download(request, job_id):
+    """Download the result file of a completed export job"""
+    job = get_export_job_for_user(request.user, job_id)
+    if not job.is_downloadable():
+        messages.error(request, 'This export is not available for download.')
+        return redirect('export_job_detail', job_id=job.id)
+
+    content_type = XLSX_CONTENT_TYPE if job.export_format == 'excel' else 'application/pdf'
+    log_activity(request, 'download', obj=job, object_name=job.get_filename(), description=f'Downloaded {job.get_export_format_display()} report')
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.get_filename(), content_type=content_type)
+
+
 @login_required
 def delete_task(request, task_id):
     """Delete task - FIXED with proper error handling"""
@@ -1441,7 +1080,13 @@ def delete_task(request, task_id):
 
         task_title = task.title
         project = task.project
+        dependent_ids = list(task.dependent_tasks.values_list('id', flat=True))
+        log_activity(request, 'delete', obj=task, description=f'Deleted task "{task_title}"')
         task.delete()
+
+        # Tasks waiting only on this one can start now
+        with HistoryRecorder.for_request(request) as history:
+            propagate_blocked_status(dependent_ids, history, include_tasks=True)
         
         messages.success(request, f'Task "{task_title}" deleted successfully.')
         
@@ -1498,41 +1143,26 @@ def project_list(request):
         # Apply search filter BEFORE adding attributes
         search_query = request.GET.get("search")
         if search_query:
-            projects = projects.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(assigned_to_admin__username__icontains=search_query) |
-                Q(assigned_to_admin__first_name__icontains=search_query) |
-                Q(assigned_to_admin__last_name__icontains=search_query) |
-                Q(division__name__icontains=search_query)
-            ).distinct()
+            projects = search_projects(projects, search_query).order_by('-search_rank', '-created_at')
+
+        # Per-user task counts come from a correlated subquery so the whole
+        # page is a constant number of queries
+        projects = projects.select_related('division', 'assigned_to_admin')
+        if not user.is_super_admin():
+            my_tasks_count = Task.objects.filter(
+                project=OuterRef('pk'), assigned_to=user
+            ).order_by().values('project').annotate(count=Count('pk')).values('count')
+            projects = projects.annotate(my_tasks_count=Coalesce(Subquery(my_tasks_count), 0))
 
         # Convert to list to avoid repeated queries
-        projects_list = list(projects.select_related('division', 'assigned_to_admin').prefetch_related('tasks__assigned_to'))
+        projects_list = list(projects)
 
-        # Add project statistics AFTER getting the list
+        # Add project statistics from the stored rollup counters
         for project in projects_list:
-            try:
-                # Safely calculate statistics
-                all_tasks = project.tasks.all()
-                project.total_tasks = all_tasks.count()
-                project.completed_tasks = all_tasks.filter(status='completed').count()
-                
-                if not user.is_super_admin():
-                    project.my_tasks = all_tasks.filter(assigned_to=user).count()
-                else:
-                    project.my_tasks = 0
-                
-                # Use the model method
-                project.progress = project.get_progress_percentage()
-                
-            except Exception as e:
-                # Fallback values if there's an error
-                project.total_tasks = 0
-                project.completed_tasks = 0
-                project.my_tasks = 0
-                project.progress = 0
-                print(f"Error calculating stats for project {project.id}: {e}")
+            project.total_tasks = project.task_count
+            project.completed_tasks = project.completed_task_count
+            project.my_tasks = getattr(project, 'my_tasks_count', 0)
+            project.progress = project.get_progress_percentage()
 
         # Pagination
         paginator = Paginator(projects_list, 12)
@@ -1564,6 +1194,8 @@ def project_create(request):
                 project = form.save(commit=False)
                 project.created_by = request.user
                 project.save()
+                log_activity(request, 'create', obj=project, description=f"Created project '{project.title}'")
+                notify_project_assigned(project, sender=request.user)
                 messages.success(request, f"Project '{project.title}' created successfully!")
                 return redirect("project_detail", project_id=project.id)
             else:
@@ -1636,6 +1268,9 @@ def project_detail(request, project_id):
                     project_file.filename = project_file.file.name
                     project_file.file_size = project_file.file.size
                     project_file.save()
+                    log_activity(request, 'upload', obj=project_file, object_name=project_file.filename,
+                                 description=f"Uploaded a file to project '{project.title}'")
+                    notify_file_uploaded(project_file, sender=user)
                     messages.success(request, "File uploaded successfully!")
                     return redirect("project_detail", project_id=project.id)
                 except Exception as e:
@@ -1645,19 +1280,13 @@ def project_detail(request, project_id):
                 file_form = ProjectFileForm()
 
         # Project statistics
-        total_tasks = tasks.count()
-        completed_tasks = tasks.filter(status='completed').count()
-        pending_tasks = tasks.filter(status='pending').count()
-        in_progress_tasks = tasks.filter(status='in_progress').count()
+        project_stats = get_task_stats(tasks)
         
         # User-specific stats
         if not user.is_super_admin():
-            user_tasks = tasks.filter(assigned_to=user)
+            user_stats = get_task_stats(tasks.filter(assigned_to=user))
         else:
-            user_tasks = tasks
-            
-        user_completed = user_tasks.filter(status='completed').count()
-        user_pending = user_tasks.filter(status='pending').count()
+            user_stats = project_stats
 
         context = {
             "project": project,
@@ -1676,15 +1305,22 @@ def project_detail(request, project_id):
             "user_is_super_admin": user.is_super_admin(),
             
             # Statistics
-            "total_tasks": total_tasks,
-            "completed_tasks": completed_tasks,
-            "pending_tasks": pending_tasks,
-            "in_progress_tasks": in_progress_tasks,
-            "user_tasks_count": user_tasks.count(),
-            "user_completed": user_completed,
-            "user_pending": user_pending,
-            "progress_percentage": project.get_progress_percentage(),
+            "total_tasks": project_stats['total'],
+            "completed_tasks": project_stats['completed'],
+            "pending_tasks": project_stats['pending'],
+            "in_progress_tasks": project_stats['in_progress'],
+            "user_tasks_count": user_stats['total'],
+            "user_completed": user_stats['completed'],
+            "user_pending": user_stats['pending'],
+            "progress_percentage": (
+                round(project_stats['completed'] / project_stats['total'] * 100, 1)
+                if project_stats['total'] else 0
+            ),
+
+            # Critical-path forecast
+            "schedule": get_project_schedule(project),
         }
+        log_activity(request, 'view', obj=project, description=f"Viewed project '{project.title}'")
         return render(request, "tasks/project_detail.html", context)
         
     except Exception as e:
@@ -1703,9 +1339,13 @@ def project_edit(request, project_id):
             return redirect("project_detail", project_id=project.id)
 
         if request.method == "POST":
+            old_admin_id = project.assigned_to_admin_id
             form = ProjectForm(request.POST, instance=project, user=request.user)
             if form.is_valid():
                 form.save()
+                log_activity(request, 'update', obj=project, description=f"Updated project '{project.title}'")
+                if project.assigned_to_admin_id != old_admin_id:
+                    notify_project_assigned(project, sender=request.user)
                 messages.success(request, "Project updated successfully!")
                 return redirect("project_detail", project_id=project.id)
             else:
@@ -1731,6 +1371,7 @@ def project_delete(request, project_id):
     try:
         project = get_object_or_404(Project, id=project_id)
         project_title = project.title
+        log_activity(request, 'delete', obj=project, description=f"Deleted project '{project_title}'")
         project.delete()
         messages.success(request, f"Project '{project_title}' deleted successfully!")
     except Exception as e:
@@ -1753,6 +1394,7 @@ def project_file_delete(request, file_id):
 
         project_id = project_file.project.id
         filename = project_file.filename
+        log_activity(request, 'delete', obj=project_file, object_name=filename, description=f"Deleted file '{filename}'")
         project_file.delete()
         messages.success(request, f"File '{filename}' deleted successfully!")
         return redirect("project_detail", project_id=project_id)
@@ -1886,6 +1528,8 @@ def download_project_file(request, file_id):
                 as_attachment=True,
                 filename=smart_str(project_file.filename)
             )
+            log_activity(request, 'download', obj=project_file, object_name=project_file.filename,
+                         description=f"Downloaded file '{project_file.filename}'")
             return response
         except IOError:
             messages.error(request, "Error reading file from server.")
@@ -1944,6 +1588,8 @@ def view_project_file(request, file_id):
                 as_attachment=False,  # View inline, not download
                 filename=smart_str(project_file.filename)
             )
+            log_activity(request, 'view', obj=project_file, object_name=project_file.filename,
+                         description=f"Viewed file '{project_file.filename}'")
             return response
         except IOError:
             messages.error(request, "Error reading file from server.")
@@ -1977,20 +1623,16 @@ def add_comment_ajax(request, task_id):
             return JsonResponse({'success': False, 'error': 'Comment content is required'})
         
         # Create the comment
-        comment = Comment.objects.create(
-            task=task,
-            user=user,
-            content=content,
-            is_internal=False  # Status change comments are always public
-        )
-        
-        # Create history entry
-        TaskHistory.objects.create(
-            task=task,
-            user=user,
-            action='Comment added (status change)',
-            new_value=content[:100] + '...' if len(content) > 100 else content
-        )
+        with HistoryRecorder.for_request(request) as history:
+            comment = Comment.objects.create(
+                task=task,
+                user=user,
+                content=content,
+                is_internal=False  # Status change comments are always public
+            )
+            history.record(task, 'Comment added (status change)', new_value=summarize(content), field_changed='comment')
+        log_activity(request, 'comment', obj=task, description=f'Commented on task "{task.title}"')
+        notify_task_comment(comment, sender=user)
         
         return JsonResponse({
             'success': True, 
@@ -1999,4 +1641,53 @@ def add_comment_ajax(request, task_id):
         })
     
     except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
\ No newline at end of file
+        return JsonResponse({'success': False, 'error': str(e)})
+
+
+@login_required
+@require_POST
+def notifications_mark_all_read(request):
+    """Mark every unread notification of the user as read (AJAX or form post)"""
+    marked = mark_all_read(request.user)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'success': True, 'marked': marked, 'unread_count': 0})
+    messages.success(request, f'{marked} notification{"s" if marked != 1 else ""} marked as read.')
+    referer = request.META.get('HTTP_REFERER')
+    if referer and url_has_allowed_host_and_scheme(referer, allowed_hosts={request.get_host()}):
+        return redirect(referer)
+    return redirect('dashboard')
+
+
+@login_required
+async def event_stream(request):
+    """
+    Server-sent events with live updates for the dashboard, or for one task
+    page with ``?task=<id>``. Meant to be served by the ASGI application.
+
+    Under WSGI the stream would be read to the end before anything is sent,
+    holding a server thread forever, so it answers 204 instead (browsers do
+    not reconnect after a 204).
+    """
+    if not settings.LIVE_UPDATES or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    task_id = request.GET.get('task')
+    if task_id:
+        if not task_id.isdigit() or not await Task.objects.filter(id=task_id).aexists():
+            raise Http404("Task not found")
+        if not user.is_admin() and not await user.assigned_tasks.filter(id=task_id).aexists():
+            return HttpResponse(status=403)
+        channels = get_task_channels(int(task_id), user)
+    else:
+        channels = get_user_channels(user)
+
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    response = StreamingHttpResponse(
+        stream_events(channels, int(last_event_id) if last_event_id.isdigit() else None),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (nginx) from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
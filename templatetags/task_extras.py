@@ -4,6 +4,10 @@ from django import template
 
 register = template.Library()
 
+# The model checks reuse the assignment cache filled by
+# tasks.permissions.resolve_task_permissions, so on resolved pages these
+# filters add no queries.
+
 @register.filter
 def is_assigned_to(task, user):
     """Check if a user is assigned to a task"""
@@ -16,4 +20,4 @@ def can_edit_task(task, user):
     """Check if user can edit the task"""
     if hasattr(task, 'can_user_edit'):
         return task.can_user_edit(user)
-    return False
\ No newline at end of file
+    return False